@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from telegram import Update
+from telegram.ext import Application
+
+from bot import metrics
+from bot.dedup import UpdateDeduplicator
+from bot.logging_config import log_context
+from bot.tracing import start_trace
+
+
+def _update_kind(update: Update) -> str:
+    if update.message_reaction is not None:
+        return "message_reaction"
+    if update.message is not None:
+        return "message"
+    if update.callback_query is not None:
+        return "callback_query"
+    return "other"
+
+
+class BotApplication(Application):
+    """
+    Application with per-update instrumentation.
+
+    Every update is processed inside a root trace span so handler, service, SQL and
+    Bot API spans can be attributed to the update that caused them, and with its
+    update/chat ids attached to every log record.
+
+    When a deduplicator is attached, redelivered updates (same update_id) are dropped
+    before any handler or database work runs.
+    """
+
+    deduplicator: UpdateDeduplicator | None = None
+
+    async def process_update(self, update: object) -> None:
+        if not isinstance(update, Update):
+            await super().process_update(update)
+            return
+
+        if self.deduplicator is not None and self.deduplicator.seen(update.update_id):
+            metrics.incr("updates.duplicate")
+            return
+
+        chat = update.effective_chat
+        chat_id = chat.id if chat else None
+        with log_context(update_id=update.update_id, chat_id=chat_id), start_trace(
+            f"update.{_update_kind(update)}", update_id=update.update_id, chat_id=chat_id
+        ):
+            await super().process_update(update)
@@ -0,0 +1,137 @@
+"""
+In-process caches of per-chat state.
+
+- settings: chat_id -> EffectiveChatSettings, or None for a chat that is not set up
+- admins: chat_id -> telegram user ids of cached admins
+- posts: chat_id -> PostIndex of tracked message ids
+- links: chat_id -> url_hash -> (message_id, created_at) of recently tracked links
+
+A missing key always means "unknown, ask the database". Entries are filled lazily by
+the services and in bulk by the startup warm-up (bot.warmup); writers invalidate the
+affected chat. The cache lives in this process only, so it is only authoritative as
+long as this process is the only writer for its chats.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from bot.services.chat_service import EffectiveChatSettings
+
+# Recent links remembered per chat for duplicate detection; older ones ask the DB.
+LINKS_PER_CHAT = 1000
+
+
+class PostIndex:
+    """
+    Tracked message ids of one chat.
+
+    Message ids grow monotonically within a chat and every new post is added here, so
+    for message_id >= floor the set is complete: a miss means "not a tracked post"
+    without asking the database. Below the floor the index knows nothing.
+    """
+
+    __slots__ = ("floor", "message_ids")
+
+    def __init__(self, floor: int, message_ids: Iterable[int] = ()) -> None:
+        self.floor = floor
+        self.message_ids = set(message_ids)
+
+    def lookup(self, message_id: int) -> bool | None:
+        """True/False if known, None if the database has to be asked."""
+        if message_id in self.message_ids:
+            return True
+        if message_id >= self.floor:
+            return False
+        return None
+
+
+@dataclass
+class ChatCache:
+    settings: dict[int, "EffectiveChatSettings | None"] = field(default_factory=dict)
+    admins: dict[int, frozenset[int]] = field(default_factory=dict)
+    posts: dict[int, PostIndex] = field(default_factory=dict)
+    links: dict[int, OrderedDict[int, tuple[int, datetime]]] = field(default_factory=dict)
+    # True once a bulk load (warm-up or snapshot) has been installed.
+    loaded: bool = False
+
+    # Chats invalidated while a bulk load was running; the load must not overwrite them.
+    _dirty: set[int] | None = None
+    # Posts added while a bulk load was running, merged in when it is installed.
+    _added_posts: dict[int, set[int]] | None = None
+
+    def invalidate_chat(self, chat_id: int) -> None:
+        self.settings.pop(chat_id, None)
+        if self._dirty is not None:
+            self._dirty.add(chat_id)
+
+    def set_admins(self, chat_id: int, telegram_user_ids: Iterable[int]) -> None:
+        self.admins[chat_id] = frozenset(telegram_user_ids)
+        if self._dirty is not None:
+            self._dirty.add(chat_id)
+
+    def post_known(self, chat_id: int, message_id: int) -> bool | None:
+        index = self.posts.get(chat_id)
+        return index.lookup(message_id) if index is not None else None
+
+    def add_posts(self, chat_id: int, message_ids: Iterable[int]) -> None:
+        index = self.posts.get(chat_id)
+        if index is not None:
+            index.message_ids.update(message_ids)
+        if self._added_posts is not None:
+            self._added_posts.setdefault(chat_id, set()).update(message_ids)
+
+    def remove_posts(self, chat_id: int, message_ids: Iterable[int]) -> None:
+        index = self.posts.get(chat_id)
+        if index is not None:
+            index.message_ids.difference_update(message_ids)
+
+    def recent_link(self, chat_id: int, url_hash: int, since: datetime) -> int | None:
+        """Message id of a post of this link created since `since`, if cached."""
+        entry = self.links.get(chat_id, {}).get(url_hash)
+        if entry is None or entry[1] < since:
+            return None
+        return entry[0]
+
+    def add_link(self, chat_id: int, url_hash: int, message_id: int, created_at: datetime) -> None:
+        links = self.links.setdefault(chat_id, OrderedDict())
+        links[url_hash] = (message_id, created_at)
+        links.move_to_end(url_hash)
+        if len(links) > LINKS_PER_CHAT:
+            links.popitem(last=False)
+
+    def begin_load(self) -> None:
+        self._dirty = set()
+        self._added_posts = {}
+
+    def abort_load(self) -> None:
+        self._dirty = None
+        self._added_posts = None
+
+    def install(
+        self,
+        settings: dict[int, "EffectiveChatSettings"],
+        admins: dict[int, set[int]],
+        posts: dict[int, PostIndex],
+    ) -> None:
+        """Install bulk-loaded state, keeping anything that changed during the load."""
+        dirty = self._dirty or set()
+        added_posts = self._added_posts or {}
+        for chat_id, chat_settings in settings.items():
+            if chat_id not in dirty:
+                self.settings.setdefault(chat_id, chat_settings)
+        for chat_id, admin_ids in admins.items():
+            if chat_id not in dirty:
+                self.admins[chat_id] = frozenset(admin_ids)
+        for chat_id, index in posts.items():
+            index.message_ids.update(added_posts.get(chat_id, ()))
+            self.posts[chat_id] = index
+        self.loaded = True
+        self.abort_load()
+
+
+chat_cache = ChatCache()
@@ -0,0 +1,160 @@
+"""
+Restart catch-up.
+
+After downtime Telegram holds a backlog of pending updates. Before polling starts we
+drain it page by page: hashtag posts and reactions are grouped by chat and applied with
+one session and bulk statements per chat (tracking_service.track_batch), while anything
+else (commands, ...) goes through the normal per-update path in its original position.
+Once a page comes back smaller than the backlog threshold, the rest is left to regular
+polling. With worker processes the front fetches the pages and each worker applies its
+chats' share of them with process_backlog_page (see bot.workers).
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from typing import Sequence
+
+from telegram import Update
+
+from bot import metrics
+from bot.application import BotApplication
+from bot.config import get_config
+from bot.handlers.message import TRACKED_MESSAGES
+from bot.journal import get_journal
+from bot.logging_config import log_context
+from bot.services.tracking_service import (
+    TrackedEvent,
+    post_event_from_update,
+    reaction_event_from_update,
+    track_batch,
+)
+from bot.tracing import start_trace
+from db.database import get_session
+
+logger = logging.getLogger(__name__)
+
+# Telegram returns at most 100 updates per getUpdates call.
+PAGE_SIZE = 100
+
+
+def _batchable_event(update: Update) -> TrackedEvent | None:
+    if update.message_reaction is not None:
+        return reaction_event_from_update(update)
+    if update.message is not None and TRACKED_MESSAGES.check_update(update):
+        return post_event_from_update(update)
+    return None
+
+
+async def _flush(
+    application: BotApplication, chat_id: int, run: list[tuple[Update, TrackedEvent]]
+) -> None:
+    """
+    Apply a run of one chat's events in one batch. Their updates count as processed
+    only once the batch has committed; if it fails they go through the normal
+    per-update path instead, which journals them if the database is unavailable.
+    """
+    if not run:
+        return
+    events = [event for _update, event in run]
+    try:
+        with log_context(chat_id=chat_id), start_trace(
+            "catchup.batch", chat_id=chat_id, size=len(events)
+        ):
+            async with get_session() as session:
+                posts, reactions = await track_batch(session, chat_id, events)
+    except Exception as exc:
+        logger.warning(
+            "Catch-up batch for chat %s failed (%s); processing its updates one by one",
+            chat_id,
+            exc,
+        )
+        for update, _event in run:
+            await application.process_update(update)
+    else:
+        if application.deduplicator is not None:
+            for update, _event in run:
+                application.deduplicator.mark(update.update_id)
+        logger.debug(
+            "Catch-up batch for chat %s: %s events, %s posts, %s reactions",
+            chat_id,
+            len(events),
+            posts,
+            reactions,
+        )
+    run.clear()
+
+
+async def process_backlog_page(application: BotApplication, updates: Sequence[Update]) -> int:
+    """Process one page of the backlog; returns how many updates went through batches."""
+    deduplicator = application.deduplicator
+    groups: dict[int | None, list[tuple[Update, TrackedEvent | None]]] = {}
+    for update in updates:
+        event = _batchable_event(update)
+        if (
+            event is not None
+            and deduplicator is not None
+            and deduplicator.is_seen(update.update_id)
+        ):
+            continue
+        chat = update.effective_chat
+        groups.setdefault(chat.id if chat else None, []).append((update, event))
+
+    batched = 0
+    for chat_id, items in groups.items():
+        run: list[tuple[Update, TrackedEvent]] = []
+        for update, event in items:
+            if event is None:
+                # Keep ordering within the chat: apply what we have, then the update.
+                await _flush(application, chat_id, run)
+                await application.process_update(update)
+            else:
+                run.append((update, event))
+                batched += 1
+        await _flush(application, chat_id, run)
+    return batched
+
+
+async def catch_up(
+    application: BotApplication,
+    started_at: float,
+    threshold: int,
+    allowed_updates: list[str],
+) -> None:
+    """Process a startup backlog in batches; returns once fewer than `threshold` remain."""
+    threshold = min(threshold, PAGE_SIZE)
+    # Events journaled during an outage are older than anything in the backlog.
+    journal = get_journal()
+    if journal.pending:
+        await journal.replay(get_config().journal_replay_batch)
+        if journal.pending:
+            logger.warning("Journal could not be replayed, skipping catch-up")
+            return
+
+    bot = application.bot
+    updates = await bot.get_updates(limit=PAGE_SIZE, timeout=0, allowed_updates=allowed_updates)
+    if len(updates) < threshold:
+        logger.info("No update backlog (%s pending), skipping catch-up", len(updates))
+        return
+
+    logger.info("Update backlog detected, catching up in batches")
+    total = batched = 0
+    while len(updates) >= threshold:
+        batched += await process_backlog_page(application, updates)
+        total += len(updates)
+        # Fetching with a higher offset confirms the page we just processed.
+        updates = await bot.get_updates(
+            offset=updates[-1].update_id + 1,
+            limit=PAGE_SIZE,
+            timeout=0,
+            allowed_updates=allowed_updates,
+        )
+        logger.info("Catch-up progress: %s updates processed", total)
+
+    elapsed = time.monotonic() - started_at
+    metrics.set_gauge("catchup.seconds", elapsed)
+    metrics.incr("catchup.updates", total)
+    logger.info(
+        "Caught up on %s updates (%s batched) %.1f s after startup", total, batched, elapsed
+    )
@@ -1,5 +1,73 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+
+from bot.logging_config import parse_sample_rates
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number") from None
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer") from None
+
+
+@dataclass(frozen=True)
+class HTTPPoolSettings:
+    """Connection pool and timeout settings for one Bot API HTTP client."""
+
+    pool_size: int
+    connect_timeout: float
+    read_timeout: float
+    write_timeout: float
+    pool_timeout: float
+    http_version: str = "1.1"
+    keepalive_expiry: float = 30.0
+
+    @classmethod
+    def from_env(cls, prefix: str, defaults: "HTTPPoolSettings") -> "HTTPPoolSettings":
+        http_version = os.environ.get(f"{prefix}_HTTP_VERSION", defaults.http_version)
+        if http_version not in ("1.1", "2"):
+            raise ValueError(f"{prefix}_HTTP_VERSION must be '1.1' or '2'")
+        return cls(
+            pool_size=_env_int(f"{prefix}_POOL_SIZE", defaults.pool_size),
+            connect_timeout=_env_float(f"{prefix}_CONNECT_TIMEOUT", defaults.connect_timeout),
+            read_timeout=_env_float(f"{prefix}_READ_TIMEOUT", defaults.read_timeout),
+            write_timeout=_env_float(f"{prefix}_WRITE_TIMEOUT", defaults.write_timeout),
+            pool_timeout=_env_float(f"{prefix}_POOL_TIMEOUT", defaults.pool_timeout),
+            http_version=http_version,
+            keepalive_expiry=_env_float(f"{prefix}_KEEPALIVE_EXPIRY", defaults.keepalive_expiry),
+        )
+
+
+# Regular Bot API calls (replies, DMs, get_chat_member, ...).
+DEFAULT_API_HTTP = HTTPPoolSettings(
+    pool_size=32, connect_timeout=5.0, read_timeout=10.0, write_timeout=10.0, pool_timeout=3.0
+)
+# Long-polling getUpdates holds one connection open; the poll timeout is added to
+# read_timeout by python-telegram-bot.
+DEFAULT_UPDATES_HTTP = HTTPPoolSettings(
+    pool_size=2, connect_timeout=5.0, read_timeout=5.0, write_timeout=5.0, pool_timeout=1.0
+)
 
 
 @dataclass
@@ -9,6 +77,85 @@ class Config:
     default_hashtag: str
     default_reaction_emoji: str
 
+    # Local state (trace exports, journals, snapshots) lives under this directory.
+    data_dir: str = "data"
+
+    # Fraction of updates that get a trace (0 disables tracing entirely).
+    trace_sample_rate: float = 0.0
+    trace_export_path: str = ""
+
+    # "text" or "json"; records are written from a background thread either way.
+    log_format: str = "text"
+    log_level: str = "INFO"
+    # Per-logger sampling of DEBUG records, e.g. {"bot.handlers.reaction": 0.1}.
+    log_sample_rates: dict[str, float] = field(default_factory=dict)
+    # Seconds between metrics summary log lines (bot.metrics); 0 disables them.
+    metrics_log_interval: float = 300.0
+
+    # Worker processes; with more than one, a front process polls Telegram and routes
+    # every update to the worker owning its chat (see bot.workers).
+    workers: int = 1
+
+    # Run on uvloop instead of the default asyncio loop (requires the uvloop package).
+    use_uvloop: bool = False
+    # Loop lag monitor; a threshold of 0 disables it.
+    loop_monitor_interval: float = 0.5
+    loop_lag_threshold: float = 0.1
+
+    # Optional read replica for stats/leaderboards/exports, used while it lags the
+    # primary by at most read_replica_max_lag seconds (checked every check_interval).
+    database_read_url: str = ""
+    read_replica_max_lag: float = 10.0
+    read_replica_check_interval: float = 5.0
+
+    # Separate HTTP clients so long polling never competes with outgoing calls.
+    api_http: HTTPPoolSettings = DEFAULT_API_HTTP
+    updates_http: HTTPPoolSettings = DEFAULT_UPDATES_HTTP
+
+    # Fail fast when Postgres is unreachable and journal tracked events locally.
+    db_pool_timeout: float = 5.0
+    db_connect_timeout: float = 5.0
+    db_unavailable_cooldown: float = 15.0
+    journal_path: str = ""
+    journal_fsync_interval: float = 0.2
+    journal_fsync_batch: int = 64
+    journal_replay_interval: float = 10.0
+    journal_replay_batch: int = 200
+
+    # Recently processed update_ids kept for duplicate detection.
+    dedup_capacity: int = 10_000
+    dedup_state_path: str = ""
+
+    # Pending updates at startup that trigger batched catch-up (0 disables it).
+    catchup_threshold: int = 50
+    warmup_timeout: float = 60.0
+    warmup_posts_per_chat: int = 5000
+    snapshot_path: str = ""
+
+    # telegram_id -> users.id mappings kept in memory (0 disables the cache).
+    user_cache_size: int = 100_000
+
+    # Seconds between retention runs (0 disables them) and rows deleted per batch.
+    retention_interval: float = 21_600.0
+    retention_batch: int = 5000
+
+    # Seconds between checks for chats due for points decay (0 disables decay).
+    decay_check_interval: float = 600.0
+
+    # How far back /todo looks for posts not reacted to yet.
+    todo_horizon_days: int = 7
+
+    # A post repeating a link posted in the chat within this many hours is rejected
+    # (0 disables the check).
+    duplicate_window_hours: float = 24.0
+
+    # Weekly digest DMs: weekday (0 = Monday, -1 disables) and hour (UTC) of the run,
+    # DMs per second and DMs in flight.
+    digest_weekday: int = 0
+    digest_hour: int = 9
+    digest_rate: float = 20.0
+    digest_concurrency: int = 8
+
     @classmethod
     def from_env(cls) -> "Config":
         bot_token = os.environ.get("BOT_TOKEN")
@@ -23,14 +170,132 @@ class Config:
         if database_url.startswith("postgres://"):
             database_url = database_url.replace("postgres://", "postgresql://", 1)
 
+        database_read_url = os.environ.get("DATABASE_READ_URL", "")
+        if database_read_url.startswith("postgres://"):
+            database_read_url = database_read_url.replace("postgres://", "postgresql://", 1)
+        read_replica_max_lag = _env_float("READ_REPLICA_MAX_LAG", 10.0)
+        read_replica_check_interval = _env_float("READ_REPLICA_CHECK_INTERVAL", 5.0)
+
         default_hashtag = os.environ.get("HASHTAG", "#repost")
         default_reaction_emoji = os.environ.get("REACTION_EMOJI", "👍")
 
+        data_dir = os.environ.get("DATA_DIR", "data")
+
+        trace_sample_rate = _env_float("TRACE_SAMPLE_RATE", 0.0)
+        if not 0.0 <= trace_sample_rate <= 1.0:
+            raise ValueError("TRACE_SAMPLE_RATE must be between 0 and 1")
+        trace_export_path = os.environ.get(
+            "TRACE_EXPORT_PATH", os.path.join(data_dir, "traces.jsonl")
+        )
+
+        log_format = os.environ.get("LOG_FORMAT", "text").lower()
+        if log_format not in ("text", "json"):
+            raise ValueError("LOG_FORMAT must be 'text' or 'json'")
+        log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
+        log_sample_rates = parse_sample_rates(os.environ.get("LOG_SAMPLE_RATES", ""))
+        metrics_log_interval = _env_float("METRICS_LOG_INTERVAL", 300.0)
+        if metrics_log_interval < 0:
+            raise ValueError("METRICS_LOG_INTERVAL must not be negative")
+
+        workers = _env_int("WORKERS", 1)
+        if workers < 1:
+            raise ValueError("WORKERS must be at least 1")
+
+        use_uvloop = _env_bool("USE_UVLOOP", False)
+        loop_monitor_interval = _env_float("LOOP_MONITOR_INTERVAL_MS", 500) / 1000
+        loop_lag_threshold = _env_float("LOOP_LAG_THRESHOLD_MS", 100) / 1000
+
+        api_http = HTTPPoolSettings.from_env("BOT_API", DEFAULT_API_HTTP)
+        updates_http = HTTPPoolSettings.from_env("GET_UPDATES", DEFAULT_UPDATES_HTTP)
+
+        db_pool_timeout = _env_float("DB_POOL_TIMEOUT", 5.0)
+        db_connect_timeout = _env_float("DB_CONNECT_TIMEOUT", 5.0)
+        db_unavailable_cooldown = _env_float("DB_UNAVAILABLE_COOLDOWN", 15.0)
+        journal_path = os.environ.get("JOURNAL_PATH", os.path.join(data_dir, "journal.jsonl"))
+        journal_fsync_interval = _env_float("JOURNAL_FSYNC_INTERVAL_MS", 200) / 1000
+        journal_fsync_batch = _env_int("JOURNAL_FSYNC_BATCH", 64)
+        journal_replay_interval = _env_float("JOURNAL_REPLAY_INTERVAL", 10.0)
+        journal_replay_batch = _env_int("JOURNAL_REPLAY_BATCH", 200)
+
+        dedup_capacity = _env_int("DEDUP_CAPACITY", 10_000)
+        dedup_state_path = os.environ.get(
+            "DEDUP_STATE_PATH", os.path.join(data_dir, "update_high_water")
+        )
+
+        catchup_threshold = _env_int("CATCHUP_THRESHOLD", 50)
+        warmup_timeout = _env_float("WARMUP_TIMEOUT", 60.0)
+        warmup_posts_per_chat = _env_int("WARMUP_POSTS_PER_CHAT", 5000)
+        snapshot_path = os.environ.get("SNAPSHOT_PATH", os.path.join(data_dir, "cache.snapshot"))
+
+        user_cache_size = _env_int("USER_CACHE_SIZE", 100_000)
+
+        retention_interval = _env_float("RETENTION_INTERVAL", 21_600.0)
+        retention_batch = _env_int("RETENTION_BATCH", 5000)
+        if retention_batch < 1:
+            raise ValueError("RETENTION_BATCH must be at least 1")
+
+        decay_check_interval = _env_float("DECAY_CHECK_INTERVAL", 600.0)
+        todo_horizon_days = _env_int("TODO_HORIZON_DAYS", 7)
+        duplicate_window_hours = _env_float("DUPLICATE_WINDOW_HOURS", 24.0)
+
+        digest_weekday = _env_int("DIGEST_WEEKDAY", 0)
+        if not -1 <= digest_weekday <= 6:
+            raise ValueError("DIGEST_WEEKDAY must be between 0 (Monday) and 6, or -1")
+        digest_hour = _env_int("DIGEST_HOUR", 9)
+        if not 0 <= digest_hour <= 23:
+            raise ValueError("DIGEST_HOUR must be between 0 and 23")
+        digest_rate = _env_float("DIGEST_RATE", 20.0)
+        if digest_rate <= 0:
+            raise ValueError("DIGEST_RATE must be positive")
+        digest_concurrency = _env_int("DIGEST_CONCURRENCY", 8)
+        if digest_concurrency < 1:
+            raise ValueError("DIGEST_CONCURRENCY must be at least 1")
+
         return cls(
             bot_token=bot_token,
             database_url=database_url,
+            database_read_url=database_read_url,
+            read_replica_max_lag=read_replica_max_lag,
+            read_replica_check_interval=read_replica_check_interval,
             default_hashtag=default_hashtag,
             default_reaction_emoji=default_reaction_emoji,
+            data_dir=data_dir,
+            trace_sample_rate=trace_sample_rate,
+            trace_export_path=trace_export_path,
+            log_format=log_format,
+            log_level=log_level,
+            log_sample_rates=log_sample_rates,
+            metrics_log_interval=metrics_log_interval,
+            workers=workers,
+            use_uvloop=use_uvloop,
+            loop_monitor_interval=loop_monitor_interval,
+            loop_lag_threshold=loop_lag_threshold,
+            api_http=api_http,
+            updates_http=updates_http,
+            db_pool_timeout=db_pool_timeout,
+            db_connect_timeout=db_connect_timeout,
+            db_unavailable_cooldown=db_unavailable_cooldown,
+            journal_path=journal_path,
+            journal_fsync_interval=journal_fsync_interval,
+            journal_fsync_batch=journal_fsync_batch,
+            journal_replay_interval=journal_replay_interval,
+            journal_replay_batch=journal_replay_batch,
+            dedup_capacity=dedup_capacity,
+            dedup_state_path=dedup_state_path,
+            catchup_threshold=catchup_threshold,
+            warmup_timeout=warmup_timeout,
+            warmup_posts_per_chat=warmup_posts_per_chat,
+            snapshot_path=snapshot_path,
+            user_cache_size=user_cache_size,
+            retention_interval=retention_interval,
+            retention_batch=retention_batch,
+            decay_check_interval=decay_check_interval,
+            todo_horizon_days=todo_horizon_days,
+            duplicate_window_hours=duplicate_window_hours,
+            digest_weekday=digest_weekday,
+            digest_hour=digest_hour,
+            digest_rate=digest_rate,
+            digest_concurrency=digest_concurrency,
         )
 
 
@@ -42,3 +307,9 @@ def get_config() -> Config:
     if config is None:
         config = Config.from_env()
     return config
+
+
+def set_config(new_config: Config) -> None:
+    """Replace the process-wide config (worker processes adjust their file paths)."""
+    global config
+    config = new_config
@@ -0,0 +1,40 @@
+"""
+Scheduled points decay (see /setdecay).
+
+The job checks every DECAY_CHECK_INTERVAL seconds which chats are due and applies
+one decay step to each, in its own transaction. Missed steps (e.g. while the bot was
+down) are not made up: the next step is due one interval after the last one applied.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+
+from telegram.ext import ContextTypes
+
+from bot.services.decay_service import chats_due_for_decay, decay_chat_points
+from bot.sharding import owns_chat
+from db.database import db_available, get_session
+
+logger = logging.getLogger(__name__)
+
+
+async def decay_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback applying due decay steps."""
+    if not db_available():
+        return
+    now = datetime.utcnow()
+    async with get_session() as session:
+        chat_ids = await chats_due_for_decay(session, now)
+    for chat_id in chat_ids:
+        if not owns_chat(chat_id):
+            continue
+        try:
+            async with get_session() as session:
+                changed = await decay_chat_points(session, chat_id, now)
+        except Exception:
+            logger.exception("Points decay for chat %s failed", chat_id)
+            continue
+        if changed is not None:
+            logger.info("Decayed points of %s members in chat %s", changed, chat_id)
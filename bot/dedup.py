@@ -0,0 +1,91 @@
+"""
+Drop redelivered updates by update_id.
+
+Recent ids are kept in a bounded ring (deque + set, O(1) per check). Ids that fall out
+of the ring raise a floor below which everything counts as already processed, and the
+highest id seen is persisted so the floor survives restarts and redeploys.
+
+Telegram picks a new random starting update_id after a week without updates, so a
+persisted mark older than that is ignored.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Telegram may restart update_id numbering after a week of inactivity.
+HIGH_WATER_MAX_AGE = 7 * 24 * 3600
+
+
+class UpdateDeduplicator:
+    def __init__(self, state_path: str, capacity: int = 10_000, persist_every: int = 100) -> None:
+        self.state_path = state_path
+        self.capacity = capacity
+        self.persist_every = persist_every
+        self._ring: deque[int] = deque()
+        self._ids: set[int] = set()
+        self._floor = self._load()
+        self._high_water = self._floor
+        self._since_persist = 0
+
+    @property
+    def high_water(self) -> int:
+        return self._high_water
+
+    def _load(self) -> int:
+        try:
+            with open(self.state_path, encoding="utf-8") as fh:
+                high_water, saved_at = (int(v) for v in fh.read().split())
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            logger.warning("Ignoring corrupt update high-water mark in %s", self.state_path)
+            return 0
+        if time.time() - saved_at > HIGH_WATER_MAX_AGE:
+            logger.info("Ignoring stale update high-water mark %s", high_water)
+            return 0
+        return high_water
+
+    def is_seen(self, update_id: int) -> bool:
+        """Whether update_id was already processed (without recording it)."""
+        return update_id <= self._floor or update_id in self._ids
+
+    def seen(self, update_id: int) -> bool:
+        """Return True if update_id was already processed; otherwise record it."""
+        if self.is_seen(update_id):
+            return True
+        self.mark(update_id)
+        return False
+
+    def mark(self, update_id: int) -> None:
+        """Record update_id as processed."""
+        if self.is_seen(update_id):
+            return
+        self._ring.append(update_id)
+        self._ids.add(update_id)
+        if len(self._ring) > self.capacity:
+            evicted = self._ring.popleft()
+            self._ids.discard(evicted)
+            if evicted > self._floor:
+                self._floor = evicted
+
+        if update_id > self._high_water:
+            self._high_water = update_id
+            self._since_persist += 1
+            if self._since_persist >= self.persist_every:
+                self.persist()
+
+    def persist(self) -> None:
+        self._since_persist = 0
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(f"{self._high_water} {int(time.time())}")
+        os.replace(tmp, self.state_path)
@@ -0,0 +1,170 @@
+"""
+Weekly digest DMs: every member active in a chat over the past week gets their stats
+and the number of posts they still owe a repost.
+
+Each chat's stats come from one bulk query. Members are then handled in chunks of
+CLAIM_CHUNK: a short transaction claims their deliveries, the DMs go out through a
+DigestSender that keeps a global rate (Bot API flood limits apply to the bot as a
+whole) and a bounded number of requests in flight, and a second transaction records
+the outcomes. Claims are keyed by the day of the week's scheduled run, which makes a
+run resumable: after a restart, any day of that week, the run only sends to members
+not handled yet. The unsent rest of a chunk cut off by the restart
+is not retried (a missed digest is better than a duplicate one).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta
+
+from telegram import Bot
+from telegram.error import Forbidden, RetryAfter, TelegramError
+from telegram.ext import ContextTypes
+
+from bot.config import get_config
+from bot.services.digest_service import (
+    DigestEntry,
+    claim_digests,
+    digest_chats,
+    finish_digests,
+    get_digest_entries,
+)
+from db.database import db_available, get_read_session, get_session
+
+logger = logging.getLogger(__name__)
+
+SENT, BLOCKED, FAILED = "sent", "blocked", "failed"
+# Attempts per DM when Telegram asks to retry later.
+MAX_ATTEMPTS = 3
+CLAIM_CHUNK = 200
+
+
+class DigestSender:
+    """Sends DMs at most `rate` per second with at most `concurrency` in flight."""
+
+    def __init__(self, bot: Bot, rate: float, concurrency: int) -> None:
+        self.bot = bot
+        self._interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._slot_lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(concurrency)
+
+    async def _wait_for_slot(self) -> None:
+        async with self._slot_lock:
+            now = time.monotonic()
+            slot = max(self._next_slot, now)
+            self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def send(self, telegram_id: int, text: str) -> str:
+        """Returns SENT, BLOCKED (bot blocked or never started) or FAILED."""
+        async with self._in_flight:
+            for _attempt in range(MAX_ATTEMPTS):
+                await self._wait_for_slot()
+                try:
+                    await self.bot.send_message(chat_id=telegram_id, text=text)
+                    return SENT
+                except RetryAfter as e:
+                    delay = e.retry_after
+                    if isinstance(delay, timedelta):
+                        delay = delay.total_seconds()
+                    logger.warning("Digest DMs throttled by Telegram; waiting %s s", delay)
+                    # Hold back every sender, not just this one.
+                    async with self._slot_lock:
+                        self._next_slot = max(self._next_slot, time.monotonic() + delay)
+                except Forbidden:
+                    return BLOCKED
+                except TelegramError as e:
+                    logger.warning("Digest DM to %s failed: %s", telegram_id, e)
+                    return FAILED
+            return FAILED
+
+
+def digest_week(now: datetime, weekday: int, hour: int) -> date:
+    """
+    Day of the latest scheduled run at or before `now` (UTC): the key of that week's
+    claims, and the end of the 7 days its stats cover.
+    """
+    day = now.date() - timedelta(days=(now.weekday() - weekday) % 7)
+    if day == now.date() and now.hour < hour:
+        day -= timedelta(days=7)
+    return day
+
+
+def render_digest(title: str | None, entry: DigestEntry) -> str:
+    lines = [
+        f"Your week in {title or 'the chat'}:\n",
+        f"Reposts made: {entry.reposts_made}",
+        f"Reposts received: {entry.reposts_received}",
+        f"Points this week: {entry.week_points:+.1f} (total {entry.points:.1f})",
+    ]
+    if entry.owed:
+        lines.append(
+            f"\nYou still owe {entry.owed} repost{'s' if entry.owed != 1 else ''} - "
+            "run /todo in the chat to see them."
+        )
+    return "\n".join(lines)
+
+
+async def send_chat_digests(
+    sender: DigestSender, week: date, chat_id: int, title: str | None
+) -> dict[str, int]:
+    """Send one chat's digests for `week`; returns the number of DMs per outcome."""
+    owed_since = datetime.utcnow() - timedelta(days=get_config().todo_horizon_days)
+    async with get_read_session() as session:
+        entries = await get_digest_entries(session, chat_id, week, owed_since)
+
+    counts = {SENT: 0, BLOCKED: 0, FAILED: 0}
+    for start in range(0, len(entries), CLAIM_CHUNK):
+        chunk = entries[start : start + CLAIM_CHUNK]
+        async with get_session() as session:
+            claimed = await claim_digests(session, week, chat_id, [e.user_id for e in chunk])
+        chunk = [entry for entry in chunk if entry.user_id in claimed]
+        if not chunk:
+            continue
+
+        outcomes = await asyncio.gather(
+            *(sender.send(entry.telegram_id, render_digest(title, entry)) for entry in chunk)
+        )
+        by_outcome: dict[str, list[int]] = {SENT: [], BLOCKED: [], FAILED: []}
+        for entry, outcome in zip(chunk, outcomes):
+            by_outcome[outcome].append(entry.user_id)
+        async with get_session() as session:
+            await finish_digests(
+                session, week, chat_id, by_outcome[SENT], by_outcome[BLOCKED], by_outcome[FAILED]
+            )
+        for outcome, user_ids in by_outcome.items():
+            counts[outcome] += len(user_ids)
+    return counts
+
+
+async def digest_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback sending this week's digests (also used to resume a run)."""
+    if not db_available():
+        logger.warning("Database unavailable; weekly digest skipped")
+        return
+    config = get_config()
+    week = digest_week(datetime.utcnow(), config.digest_weekday, config.digest_hour)
+    sender = DigestSender(context.bot, config.digest_rate, config.digest_concurrency)
+    async with get_session() as session:
+        chats = await digest_chats(session)
+
+    totals = {SENT: 0, BLOCKED: 0, FAILED: 0}
+    for chat_id, title in chats:
+        try:
+            counts = await send_chat_digests(sender, week, chat_id, title)
+        except Exception:
+            logger.exception("Weekly digest for chat %s failed", chat_id)
+            continue
+        for outcome, count in counts.items():
+            totals[outcome] += count
+    logger.info(
+        "Weekly digest %s: %s sent, %s blocked, %s failed",
+        week,
+        totals[SENT],
+        totals[BLOCKED],
+        totals[FAILED],
+    )
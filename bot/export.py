@@ -0,0 +1,289 @@
+"""
+Export per-chat stats to CSV or Parquet.
+
+    python -m bot.export users     [--chat ID] [--since DATE] [--until DATE] [-o FILE]
+    python -m bot.export posts     [--chat ID] [--since DATE] [--until DATE] [-o FILE]
+    python -m bot.export reactions [--chat ID] [--since DATE] [--until DATE] [-o FILE]
+
+`users` is one row per chat member with points, weight and the reposts made/received
+in the date range (all time includes reposts archived by retention); `posts` and
+`reactions` are the raw rows created in the range.
+Dates are ISO dates or datetimes (UTC); --until is exclusive.
+
+Rows are streamed through a server-side cursor and written chunk by chunk, so memory
+use does not depend on table size. The output format follows the file extension
+(.csv or .parquet) unless --format is given; Parquet needs the optional pyarrow
+package. Without -o, CSV is written to stdout.
+
+Uses the bot's environment (BOT_TOKEN, DATABASE_URL).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import csv
+import sys
+from datetime import datetime
+from typing import Any, Sequence
+
+from sqlalchemy import Select, func, select
+
+from db.database import close_db, get_read_session
+from db.models import ChatUser, Post, Reaction, User
+
+STREAM_CHUNK = 5000
+
+# Column name -> type, used for the Parquet schema.
+Columns = Sequence[tuple[str, str]]
+
+USER_COLUMNS: Columns = (
+    ("chat_id", "int"),
+    ("telegram_id", "int"),
+    ("username", "str"),
+    ("points", "float"),
+    ("weight", "float"),
+    ("reposts_made", "int"),
+    ("reposts_received", "int"),
+)
+POST_COLUMNS: Columns = (
+    ("chat_id", "int"),
+    ("message_id", "int"),
+    ("topic_id", "int"),
+    ("owner_telegram_id", "int"),
+    ("owner_username", "str"),
+    ("created_at", "datetime"),
+)
+REACTION_COLUMNS: Columns = (
+    ("chat_id", "int"),
+    ("message_id", "int"),
+    ("owner_telegram_id", "int"),
+    ("reactor_telegram_id", "int"),
+    ("reactor_username", "str"),
+    ("multiplier", "float"),
+    ("created_at", "datetime"),
+)
+
+
+def _in_range(column, since: datetime | None, until: datetime | None) -> list:
+    criteria = []
+    if since is not None:
+        criteria.append(column >= since)
+    if until is not None:
+        criteria.append(column < until)
+    return criteria
+
+
+def users_query(chat_id: int | None, since: datetime | None, until: datetime | None) -> Select:
+    credited = (
+        select(Post.chat_id, Post.user_id.label("owner_id"), Reaction.reactor_user_id)
+        .join(Post, Post.id == Reaction.post_id)
+        .where(
+            Reaction.reactor_user_id != Post.user_id,
+            *_in_range(Reaction.created_at, since, until),
+        )
+    )
+    if chat_id is not None:
+        credited = credited.where(Post.chat_id == chat_id)
+    credited = credited.subquery("credited")
+    made = (
+        select(
+            credited.c.chat_id,
+            credited.c.reactor_user_id.label("user_id"),
+            func.count().label("n"),
+        )
+        .group_by(credited.c.chat_id, credited.c.reactor_user_id)
+        .subquery("made")
+    )
+    received = (
+        select(credited.c.chat_id, credited.c.owner_id.label("user_id"), func.count().label("n"))
+        .group_by(credited.c.chat_id, credited.c.owner_id)
+        .subquery("received")
+    )
+    made_count = func.coalesce(made.c.n, 0)
+    received_count = func.coalesce(received.c.n, 0)
+    if since is None:
+        # Reactions deleted by retention are all older than any kept one.
+        made_count = made_count + ChatUser.archived_reposts_made
+        received_count = received_count + ChatUser.archived_reposts_received
+    stmt = (
+        select(
+            ChatUser.chat_id,
+            User.telegram_id,
+            User.username,
+            ChatUser.points,
+            ChatUser.weight,
+            made_count,
+            received_count,
+        )
+        .join(User, User.id == ChatUser.user_id)
+        .outerjoin(
+            made, (made.c.chat_id == ChatUser.chat_id) & (made.c.user_id == ChatUser.user_id)
+        )
+        .outerjoin(
+            received,
+            (received.c.chat_id == ChatUser.chat_id) & (received.c.user_id == ChatUser.user_id),
+        )
+        .order_by(ChatUser.chat_id, ChatUser.points.desc())
+    )
+    if chat_id is not None:
+        stmt = stmt.where(ChatUser.chat_id == chat_id)
+    return stmt
+
+
+def posts_query(chat_id: int | None, since: datetime | None, until: datetime | None) -> Select:
+    stmt = (
+        select(
+            Post.chat_id,
+            Post.message_id,
+            Post.topic_id,
+            User.telegram_id,
+            User.username,
+            Post.created_at,
+        )
+        .join(User, User.id == Post.user_id)
+        .where(*_in_range(Post.created_at, since, until))
+        .order_by(Post.id)
+    )
+    if chat_id is not None:
+        stmt = stmt.where(Post.chat_id == chat_id)
+    return stmt
+
+
+def reactions_query(chat_id: int | None, since: datetime | None, until: datetime | None) -> Select:
+    reactor = User.__table__.alias("reactor")
+    stmt = (
+        select(
+            Post.chat_id,
+            Post.message_id,
+            User.telegram_id,
+            reactor.c.telegram_id,
+            reactor.c.username,
+            Reaction.multiplier,
+            Reaction.created_at,
+        )
+        .join(Post, Post.id == Reaction.post_id)
+        .join(User, User.id == Post.user_id)
+        .join(reactor, reactor.c.id == Reaction.reactor_user_id)
+        .where(*_in_range(Reaction.created_at, since, until))
+        .order_by(Reaction.id)
+    )
+    if chat_id is not None:
+        stmt = stmt.where(Post.chat_id == chat_id)
+    return stmt
+
+
+DATASETS = {
+    "users": (users_query, USER_COLUMNS),
+    "posts": (posts_query, POST_COLUMNS),
+    "reactions": (reactions_query, REACTION_COLUMNS),
+}
+
+
+class CsvWriter:
+    def __init__(self, path: str | None, columns: Columns) -> None:
+        self._fh = open(path, "w", newline="", encoding="utf-8") if path else sys.stdout
+        self._writer = csv.writer(self._fh)
+        self._writer.writerow([name for name, _type in columns])
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        self._writer.writerows(
+            [value.isoformat() if isinstance(value, datetime) else value for value in row]
+            for row in rows
+        )
+
+    def close(self) -> None:
+        if self._fh is not sys.stdout:
+            self._fh.close()
+
+
+class ParquetWriter:
+    """One row group per chunk."""
+
+    def __init__(self, path: str, columns: Columns) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet export needs pyarrow: pip install pyarrow") from None
+        types = {
+            "int": pa.int64(),
+            "float": pa.float64(),
+            "str": pa.string(),
+            "datetime": pa.timestamp("us"),
+        }
+        self._pa = pa
+        self._schema = pa.schema([(name, types[kind]) for name, kind in columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: Sequence[Sequence[Any]]) -> None:
+        arrays = [
+            self._pa.array([row[i] for row in rows], type=field.type)
+            for i, field in enumerate(self._schema)
+        ]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+async def export(
+    dataset: str,
+    output: str | None,
+    fmt: str,
+    chat_id: int | None,
+    since: datetime | None,
+    until: datetime | None,
+    chunk_size: int = STREAM_CHUNK,
+) -> int:
+    build_query, columns = DATASETS[dataset]
+    writer = ParquetWriter(output, columns) if fmt == "parquet" else CsvWriter(output, columns)
+    rows = 0
+    try:
+        async with get_read_session() as session:
+            result = await session.stream(
+                build_query(chat_id, since, until).execution_options(yield_per=chunk_size)
+            )
+            async for partition in result.partitions():
+                writer.write(partition)
+                rows += len(partition)
+    finally:
+        writer.close()
+    return rows
+
+
+def _datetime(value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not an ISO date: {value!r}") from None
+
+
+async def _run(args: argparse.Namespace, fmt: str) -> None:
+    try:
+        rows = await export(args.dataset, args.output, fmt, args.chat, args.since, args.until)
+    finally:
+        await close_db()
+    print(f"Exported {rows} {args.dataset} rows", file=sys.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("-o", "--output", help="output file (default: CSV to stdout)")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="default: from the file name")
+    parser.add_argument("--chat", type=int, default=None, help="limit to one chat id")
+    parser.add_argument("--since", type=_datetime, default=None, help="from this date/time")
+    parser.add_argument("--until", type=_datetime, default=None, help="up to this date/time")
+    args = parser.parse_args()
+
+    fmt = args.format or (
+        "parquet" if args.output and args.output.endswith(".parquet") else "csv"
+    )
+    if fmt == "parquet" and not args.output:
+        parser.error("Parquet output needs -o FILE")
+    asyncio.run(_run(args, fmt))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,95 @@
 import logging
-
-from telegram import Update
+import time
+from datetime import datetime, timedelta
+
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    LinkPreviewOptions,
+    Update,
+    User as TgUser,
+)
 from telegram.ext import ContextTypes
 
+from bot.config import get_config
+from bot.links import message_link
+
+from bot.services.analytics_service import (
+    chat_reciprocity,
+    get_matrix,
+    member_balances,
+    top_partners,
+)
 from bot.services.chat_service import (
+    MAX_HASHTAG_LENGTH,
+    add_chat_hashtags,
     create_or_update_chat,
+    get_chat_settings,
     is_chat_admin_hybrid,
     is_telegram_admin,
+    is_valid_hashtag,
+    normalize_hashtag,
+    normalize_reaction_emoji,
+    remove_chat_hashtags,
+    remove_chat_reaction_emoji,
     require_chat,
+    set_chat_reaction_emoji,
+    set_chat_decay,
+    set_chat_retention,
     set_chat_topic,
     sync_admins_from_telegram,
 )
-from bot.services.stats_service import get_leaderboard, get_user_stats
+from bot.services.points_service import count_chat_reactions, recompute_chat_points
+from bot.services.post_service import get_unreacted_posts
+from bot.services.stats_service import (
+    get_leaderboard,
+    get_user_stats,
+    get_window_leaderboard,
+)
 from bot.services.user_service import (
+    clear_dm_blocked,
     get_or_create_chat_user,
+    get_or_create_user,
     get_user_by_username,
+    get_users_by_id,
     set_chat_user_weight,
 )
-from db.database import get_session
+from db.database import get_read_session, get_session
+from db.models import User
 
 logger = logging.getLogger(__name__)
 
+# /leaderboard windows, in days
+LEADERBOARD_WINDOWS = {"week": 7, "month": 30}
+
+# Chats with a /reweight job scheduled or running.
+_reweights_running: set[int] = set()
+
+TODO_PAGE_SIZE = 10
+# Callback data of the /todo "More" button: todo:<chat_id>:<created_at µs>:<post_id>
+TODO_CALLBACK_PREFIX = "todo:"
+
+# /balance: rows per list, and reposts a member must have received to be ranked
+# as a freeloader (a single unreturned repost says little).
+BALANCE_TOP = 10
+BALANCE_MIN_RECEIVED = 5
+
+
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/start in DM: (re)enables DMs from the bot, e.g. after unblocking it."""
+    if not update.message or not update.message.from_user or not update.effective_chat:
+        return
+    if update.effective_chat.type != "private":
+        return
+
+    async with get_session() as session:
+        await clear_dm_blocked(session, update.message.from_user.id)
+
+    await update.message.reply_text(
+        "Hi! I'll send your stats, leaderboards and the weekly digest here.\n"
+        "Use /stats, /leaderboard or /todo in your group chat."
+    )
+
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /stats command - sends stats via DM."""
@@ -48,6 +117,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         user, _chat_user = await get_or_create_chat_user(
             session, chat_id, telegram_user.id, telegram_user.username
         )
+    async with get_read_session() as session:
         stats = await get_user_stats(session, chat_id, user)
 
         stats_message = (
@@ -68,7 +138,7 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
             except Exception:
                 pass
     except Exception as e:
-        logger.error(f"Failed to send DM to user {telegram_user.id}: {e}")
+        logger.error("Failed to send DM to user %s: %s", telegram_user.id, e)
         # If DM fails, notify in chat
         await update.message.reply_text(
             "Please start a private chat with me first to receive your stats."
@@ -91,7 +161,12 @@ async def leaderboard_command(
     telegram_user = update.message.from_user
     chat_id = update.effective_chat.id
 
-    async with get_session() as session:
+    window = (context.args or [""])[0].lower()
+    if window and window not in LEADERBOARD_WINDOWS:
+        await update.message.reply_text("Usage: /leaderboard [week|month]")
+        return
+
+    async with get_read_session() as session:
         try:
             await require_chat(session, chat_id)
         except Exception:
@@ -100,12 +175,18 @@ async def leaderboard_command(
             )
             return
 
-        leaderboard = await get_leaderboard(session, chat_id, limit=10)
+        if window:
+            days = LEADERBOARD_WINDOWS[window]
+            leaderboard = await get_window_leaderboard(session, chat_id, days, limit=10)
+            title = f"Leaderboard (Top 10, last {days} days):\n"
+        else:
+            leaderboard = await get_leaderboard(session, chat_id, limit=10)
+            title = "Leaderboard (Top 10):\n"
 
         if not leaderboard:
             message = "No users in leaderboard yet."
         else:
-            lines = ["Leaderboard (Top 10):\n"]
+            lines = [title]
             for i, (user, stats) in enumerate(leaderboard, 1):
                 display_name = f"@{user.username}" if user.username else f"User {user.telegram_id}"
                 medal = ""
@@ -131,12 +212,236 @@ async def leaderboard_command(
             except Exception:
                 pass
     except Exception as e:
-        logger.error(f"Failed to send DM to user {telegram_user.id}: {e}")
+        logger.error("Failed to send DM to user %s: %s", telegram_user.id, e)
         await update.message.reply_text(
             "Please start a private chat with me first to receive the leaderboard."
         )
 
 
+async def _todo_page(
+    chat_id: int, telegram_user: TgUser, before: tuple[datetime, int] | None
+) -> tuple[str, InlineKeyboardMarkup | None]:
+    """Text and "More" button of one /todo page."""
+    horizon = get_config().todo_horizon_days
+    since = datetime.utcnow() - timedelta(days=horizon)
+    async with get_session() as session:
+        user = await get_or_create_user(session, telegram_user.id, telegram_user.username)
+    async with get_read_session() as session:
+        posts = await get_unreacted_posts(
+            session, chat_id, user.id, since, before, limit=TODO_PAGE_SIZE + 1
+        )
+
+    if not posts:
+        if before is None:
+            return f"You've reposted everything from the last {horizon} days.", None
+        return "No more posts to repost.", None
+
+    page = posts[:TODO_PAGE_SIZE]
+    lines = [f"Posts you haven't reposted yet (last {horizon} days):\n"]
+    for post in page:
+        owner = f"@{post.user.username}" if post.user.username else f"User {post.user.telegram_id}"
+        link = message_link(chat_id, post.message_id) or f"message {post.message_id}"
+        lines.append(f"• {owner}: {link}")
+
+    markup = None
+    if len(posts) > TODO_PAGE_SIZE:
+        last = page[-1]
+        cursor = (last.created_at - datetime(1970, 1, 1)) // timedelta(microseconds=1)
+        markup = InlineKeyboardMarkup(
+            [
+                [
+                    InlineKeyboardButton(
+                        "More",
+                        callback_data=f"{TODO_CALLBACK_PREFIX}{chat_id}:{cursor}:{last.id}",
+                    )
+                ]
+            ]
+        )
+    return "\n".join(lines), markup
+
+
+async def todo_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /todo - sends the posts the caller has not reposted yet via DM."""
+    if not update.message or not update.message.from_user or not update.effective_chat:
+        return
+
+    if update.effective_chat.type == "private":
+        await update.message.reply_text("Please run /todo in the group chat you want posts for.")
+        return
+
+    telegram_user = update.message.from_user
+    chat_id = update.effective_chat.id
+
+    async with get_session() as session:
+        try:
+            await require_chat(session, chat_id)
+        except Exception:
+            await update.message.reply_text(
+                "This chat is not set up yet. Ask a chat admin to run /setup."
+            )
+            return
+
+    text, markup = await _todo_page(chat_id, telegram_user, None)
+
+    # Send via DM
+    try:
+        await context.bot.send_message(
+            chat_id=telegram_user.id,
+            text=text,
+            reply_markup=markup,
+            link_preview_options=LinkPreviewOptions(is_disabled=True),
+        )
+        # Delete the command message from group to keep it clean
+        try:
+            await update.message.delete()
+        except Exception:
+            pass
+    except Exception as e:
+        logger.error("Failed to send DM to user %s: %s", telegram_user.id, e)
+        await update.message.reply_text(
+            "Please start a private chat with me first to receive your list."
+        )
+
+
+async def todo_more_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle the "More" button under a /todo page."""
+    query = update.callback_query
+    if not query or not query.data or not query.from_user:
+        return
+
+    try:
+        chat_id, cursor, post_id = (
+            int(part) for part in query.data[len(TODO_CALLBACK_PREFIX) :].split(":")
+        )
+    except ValueError:
+        await query.answer()
+        return
+    before = (datetime(1970, 1, 1) + timedelta(microseconds=cursor), post_id)
+
+    text, markup = await _todo_page(chat_id, query.from_user, before)
+    await query.answer()
+    await query.edit_message_text(
+        text, reply_markup=markup, link_preview_options=LinkPreviewOptions(is_disabled=True)
+    )
+
+
+def _display_name(user: User) -> str:
+    return f"@{user.username}" if user.username else f"User {user.telegram_id}"
+
+
+async def balance_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Who reposts for whom (admin only) - sent via DM."""
+    if not update.message or not update.message.from_user or not update.effective_chat:
+        return
+
+    if update.effective_chat.type == "private":
+        await update.message.reply_text("Run /balance in the group chat.")
+        return
+
+    chat_id = update.effective_chat.id
+    telegram_user = update.message.from_user
+    args = context.args or []
+
+    async with get_session() as session:
+        try:
+            await require_chat(session, chat_id)
+        except Exception:
+            await update.message.reply_text("This chat is not set up yet. Run /setup first.")
+            return
+
+        if not await is_chat_admin_hybrid(session, context.bot, chat_id, telegram_user.id):
+            await update.message.reply_text("You don't have permission to use this command.")
+            return
+
+        # Built on the primary: the matrix is cached and only kept up to date from
+        # here on, so it must not miss what a lagging replica has not replayed yet.
+        matrix = await get_matrix(session, chat_id)
+
+    async with get_read_session() as session:
+        target = None
+        if args:
+            target = await get_user_by_username(session, args[0], chat_id=chat_id)
+            if target is None:
+                await update.message.reply_text(f"User {args[0]} not found in this chat.")
+                return
+
+        balances = {balance.user_id: balance for balance in member_balances(matrix)}
+
+        if target is not None:
+            gave, got = top_partners(matrix, target.id, limit=BALANCE_TOP)
+            names = await get_users_by_id(
+                session, [user_id for user_id, _count in gave + got]
+            )
+            balance = balances.get(target.id)
+            lines = [f"Balance of {_display_name(target)}:\n"]
+            if balance is None:
+                lines.append("No reposts yet.")
+            else:
+                reciprocity = (
+                    "-" if balance.reciprocity is None else f"{balance.reciprocity:.0%}"
+                )
+                lines.append(
+                    f"{balance.made} made, {balance.received} received "
+                    f"(net {balance.net:+d}), {reciprocity} returned"
+                )
+            for title, partners in (("Reposted for", gave), ("Reposted by", got)):
+                if partners:
+                    lines.append(f"\n{title}:")
+                    lines.extend(
+                        f"{_display_name(names[user_id])}: {count}"
+                        for user_id, count in partners
+                        if user_id in names
+                    )
+        else:
+            ranked = list(balances.values())
+            freeloaders = sorted(
+                (b for b in ranked if b.received >= BALANCE_MIN_RECEIVED and b.net < 0),
+                key=lambda b: b.freeloader_score,
+                reverse=True,
+            )[:BALANCE_TOP]
+            givers = sorted(
+                (b for b in ranked if b.net > 0), key=lambda b: b.net, reverse=True
+            )[:BALANCE_TOP]
+            names = await get_users_by_id(
+                session, [b.user_id for b in freeloaders + givers]
+            )
+            reciprocity = chat_reciprocity(matrix)
+            lines = [
+                f"Reciprocity in this chat: {len(ranked)} members, "
+                f"{sum(b.made for b in ranked)} reposts, "
+                + ("-" if reciprocity is None else f"{reciprocity:.0%} returned")
+            ]
+            if freeloaders:
+                lines.append("\nTaking more than giving:")
+                lines.extend(
+                    f"{_display_name(names[b.user_id])}: {b.made} made, "
+                    f"{b.received} received, score {b.freeloader_score:.1f}"
+                    for b in freeloaders
+                    if b.user_id in names
+                )
+            if givers:
+                lines.append("\nGiving more than taking:")
+                lines.extend(
+                    f"{_display_name(names[b.user_id])}: net {b.net:+d} "
+                    f"({b.made} made, {b.received} received)"
+                    for b in givers
+                    if b.user_id in names
+                )
+        message = "\n".join(lines)
+
+    try:
+        await context.bot.send_message(chat_id=telegram_user.id, text=message)
+        try:
+            await update.message.delete()
+        except Exception:
+            pass
+    except Exception as e:
+        logger.error("Failed to send DM to user %s: %s", telegram_user.id, e)
+        await update.message.reply_text(
+            "Please start a private chat with me first to receive the balance."
+        )
+
+
 async def setweight_command(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
@@ -216,7 +521,10 @@ async def setweight_command(
                     )
                     message = f"Set weight for {display} to {weight:.1f}x (this chat only)"
                 else:
-                    target_user = await get_user_by_username(session, target_username or "")
+                    # Prefer a member of this chat; fall back to anyone we have seen.
+                    target_user = await get_user_by_username(
+                        session, target_username or "", chat_id
+                    ) or await get_user_by_username(session, target_username or "")
                     if not target_user:
                         message = (
                             f"User {target_username} not found. "
@@ -239,10 +547,89 @@ async def setweight_command(
             except Exception:
                 pass
     except Exception as e:
-        logger.error(f"Failed to send DM to admin {telegram_user.id}: {e}")
+        logger.error("Failed to send DM to admin %s: %s", telegram_user.id, e)
         await update.message.reply_text(message)
 
 
+async def reweight_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Recompute this chat's points from the full history with current weights (admin only)."""
+    if not update.message or not update.message.from_user or not update.effective_chat:
+        return
+
+    if update.effective_chat.type == "private":
+        await update.message.reply_text("Run /reweight in the group chat.")
+        return
+
+    chat_id = update.effective_chat.id
+    telegram_user = update.message.from_user
+
+    async with get_session() as session:
+        try:
+            await require_chat(session, chat_id)
+        except Exception:
+            await update.message.reply_text("This chat is not set up yet. Run /setup first.")
+            return
+
+        if not await is_chat_admin_hybrid(session, context.bot, chat_id, telegram_user.id):
+            await update.message.reply_text("You don't have permission to use this command.")
+            return
+
+    if chat_id in _reweights_running:
+        await update.message.reply_text("Points are already being recomputed for this chat.")
+        return
+
+    _reweights_running.add(chat_id)
+    context.job_queue.run_once(
+        reweight_job,
+        0,
+        data={"chat_id": chat_id, "admin_id": telegram_user.id},
+        name=f"reweight:{chat_id}",
+    )
+    await update.message.reply_text(
+        "Recomputing everyone's points with the current weights. "
+        "I'll send you the progress in a private message."
+    )
+
+
+async def reweight_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Background part of /reweight."""
+    chat_id = context.job.data["chat_id"]
+    admin_id = context.job.data["admin_id"]
+
+    async def notify(text: str) -> None:
+        try:
+            await context.bot.send_message(chat_id=admin_id, text=text)
+        except Exception as e:
+            logger.error("Failed to send DM to admin %s: %s", admin_id, e)
+
+    started = time.monotonic()
+    try:
+        async with get_session() as session:
+            reactions = await count_chat_reactions(session, chat_id)
+        await notify(f"Recomputing points for chat {chat_id} from {reactions} reactions...")
+        async with get_session() as session:
+            changed = await recompute_chat_points(session, chat_id)
+    except Exception:
+        logger.exception("Recomputing points for chat %s failed", chat_id)
+        await notify("Recomputing points failed; nothing was changed.")
+        return
+    finally:
+        _reweights_running.discard(chat_id)
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        "Recomputed points for chat %s: %s members changed, %s reactions, %.1f s",
+        chat_id,
+        changed,
+        reactions,
+        elapsed,
+    )
+    await notify(
+        f"Done: points of {changed} members changed "
+        f"({reactions} reactions, {elapsed:.1f} s)."
+    )
+
+
 async def setup_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Enable the bot in this chat and sync admins from Telegram."""
     if not update.message or not update.message.from_user or not update.effective_chat:
@@ -266,7 +653,7 @@ async def setup_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         await create_or_update_chat(session, chat_id, chat_title, topic_id=topic_id)
         await sync_admins_from_telegram(session, context.bot, chat_id)
 
-    msg = "Setup complete. Admins synced."
+    msg = f"Setup complete. Admins synced. Chat id: {chat_id}"
     if topic_id is not None:
         msg += (
             f" Topic restriction set to this topic ({topic_id}). "
@@ -367,3 +754,219 @@ async def cleartopic_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await set_chat_topic(session, chat_id, None)
 
     await update.message.reply_text("Topic restriction cleared (all topics allowed).")
+
+
+async def setretention_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Set how many days of posts and reactions this chat keeps (admin only)."""
+    if not update.message or not update.message.from_user or not update.effective_chat:
+        return
+
+    if update.effective_chat.type == "private":
+        await update.message.reply_text("Run /setretention in the group chat.")
+        return
+
+    chat_id = update.effective_chat.id
+    telegram_user = update.message.from_user
+
+    if not context.args:
+        await update.message.reply_text("Usage: /setretention <days|off>")
+        return
+
+    if context.args[0].lower() == "off":
+        days = None
+    else:
+        try:
+            days = int(context.args[0])
+        except ValueError:
+            await update.message.reply_text("days must be a number or 'off'.")
+            return
+        if days < 1:
+            await update.message.reply_text("days must be at least 1.")
+            return
+
+    async with get_session() as session:
+        try:
+            await require_chat(session, chat_id)
+        except Exception:
+            await update.message.reply_text("This chat is not set up yet. Run /setup first.")
+            return
+
+        if not await is_chat_admin_hybrid(session, context.bot, chat_id, telegram_user.id):
+            await update.message.reply_text("You don't have permission to use this command.")
+            return
+
+        await set_chat_retention(session, chat_id, days)
+
+    if days is None:
+        await update.message.reply_text("Retention disabled; all posts and reactions are kept.")
+    else:
+        await update.message.reply_text(
+            f"Posts and reactions older than {days} days will be archived. "
+            "Repost counts and points are kept."
+        )
+
+
+async def setdecay_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Set this chat's points decay: a percentage every N hours (admin only)."""
+    if not update.message or not update.message.from_user or not update.effective_chat:
+        return
+
+    if update.effective_chat.type == "private":
+        await update.message.reply_text("Run /setdecay in the group chat.")
+        return
+
+    chat_id = update.effective_chat.id
+    telegram_user = update.message.from_user
+
+    if not context.args:
+        await update.message.reply_text("Usage: /setdecay <percent> <hours> or /setdecay off")
+        return
+
+    if context.args[0].lower() == "off":
+        percent, hours = None, None
+    else:
+        try:
+            percent = float(context.args[0].rstrip("%"))
+            hours = int(context.args[1]) if len(context.args) > 1 else 24
+        except ValueError:
+            await update.message.reply_text("percent and hours must be numbers.")
+            return
+        if not 0 < percent <= 100 or hours < 1:
+            await update.message.reply_text(
+                "percent must be between 0 and 100 and hours at least 1."
+            )
+            return
+
+    async with get_session() as session:
+        try:
+            await require_chat(session, chat_id)
+        except Exception:
+            await update.message.reply_text("This chat is not set up yet. Run /setup first.")
+            return
+
+        if not await is_chat_admin_hybrid(session, context.bot, chat_id, telegram_user.id):
+            await update.message.reply_text("You don't have permission to use this command.")
+            return
+
+        await set_chat_decay(
+            session, chat_id, percent / 100 if percent is not None else None, hours
+        )
+
+    if percent is None:
+        await update.message.reply_text("Points decay disabled.")
+    else:
+        await update.message.reply_text(
+            f"Everyone's points will shrink by {percent:g}% every {hours} hours."
+        )
+
+
+async def hashtag_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """List, add or remove the hashtags tracked in this chat (admin only)."""
+    if not update.message or not update.message.from_user or not update.effective_chat:
+        return
+
+    if update.effective_chat.type == "private":
+        await update.message.reply_text("Run /hashtag in the group chat.")
+        return
+
+    chat_id = update.effective_chat.id
+    telegram_user = update.message.from_user
+
+    args = context.args or []
+    action = args[0].lower() if args else "list"
+    tags = [normalize_hashtag(tag) for tag in args[1:]]
+    if action not in ("list", "add", "remove") or (action != "list" and not tags):
+        await update.message.reply_text("Usage: /hashtag [add|remove] #tag ...")
+        return
+    if action == "add" and not all(is_valid_hashtag(tag) for tag in tags):
+        await update.message.reply_text(
+            f"Hashtags are letters, digits and underscores, "
+            f"at most {MAX_HASHTAG_LENGTH} characters."
+        )
+        return
+
+    async with get_session() as session:
+        try:
+            await require_chat(session, chat_id)
+        except Exception:
+            await update.message.reply_text("This chat is not set up yet. Run /setup first.")
+            return
+
+        if not await is_chat_admin_hybrid(session, context.bot, chat_id, telegram_user.id):
+            await update.message.reply_text("You don't have permission to use this command.")
+            return
+
+        if action == "add":
+            await add_chat_hashtags(session, chat_id, tags)
+        elif action == "remove":
+            await remove_chat_hashtags(session, chat_id, tags)
+
+    # Read back once committed (never through the uncommitted session: it would cache
+    # settings that may still roll back).
+    async with get_session() as session:
+        settings = await get_chat_settings(session, chat_id)
+    await update.message.reply_text(
+        "Tracked hashtags: " + " ".join(f"#{tag}" for tag in sorted(settings.hashtags))
+    )
+
+
+async def emoji_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """List, add or remove the reaction emojis tracked in this chat (admin only)."""
+    if not update.message or not update.message.from_user or not update.effective_chat:
+        return
+
+    if update.effective_chat.type == "private":
+        await update.message.reply_text("Run /emoji in the group chat.")
+        return
+
+    chat_id = update.effective_chat.id
+    telegram_user = update.message.from_user
+
+    usage = "Usage: /emoji [add <emoji> [multiplier] | remove <emoji>]"
+    args = context.args or []
+    action = args[0].lower() if args else "list"
+    if action not in ("list", "add", "remove") or (action != "list" and len(args) < 2):
+        await update.message.reply_text(usage)
+        return
+    emoji = args[1] if len(args) > 1 else ""
+    if action == "add":
+        emoji = normalize_reaction_emoji(emoji) or ""
+        if not emoji:
+            await update.message.reply_text("That is not an emoji Telegram allows as a reaction.")
+            return
+    elif action == "remove":
+        # Anything else stored before emojis were checked can still be removed.
+        emoji = normalize_reaction_emoji(emoji) or emoji
+    multiplier = 1.0
+    if action == "add" and len(args) > 2:
+        try:
+            multiplier = float(args[2].lstrip("x×"))
+        except ValueError:
+            await update.message.reply_text(usage)
+            return
+        if not 0 < multiplier <= 100:
+            await update.message.reply_text("multiplier must be between 0 and 100.")
+            return
+
+    async with get_session() as session:
+        try:
+            await require_chat(session, chat_id)
+        except Exception:
+            await update.message.reply_text("This chat is not set up yet. Run /setup first.")
+            return
+
+        if not await is_chat_admin_hybrid(session, context.bot, chat_id, telegram_user.id):
+            await update.message.reply_text("You don't have permission to use this command.")
+            return
+
+        if action == "add":
+            await set_chat_reaction_emoji(session, chat_id, emoji, multiplier)
+        elif action == "remove":
+            await remove_chat_reaction_emoji(session, chat_id, emoji)
+
+    async with get_session() as session:
+        settings = await get_chat_settings(session, chat_id)
+    await update.message.reply_text(
+        "Tracked reactions: "
+        + ", ".join(f"{emoji} ×{multiplier:g}" for emoji, multiplier in settings.reaction_emojis)
+    )
@@ -0,0 +1,74 @@
+import logging
+import os
+import tempfile
+
+from telegram import Update
+from telegram.ext import ContextTypes, filters
+
+from bot.services.chat_service import is_chat_admin_hybrid, require_chat
+from bot.services.import_service import import_weights
+from db.database import get_session
+
+logger = logging.getLogger(__name__)
+
+WEIGHT_IMPORT_DOCUMENTS = filters.ChatType.PRIVATE & (
+    filters.Document.FileExtension("csv")
+    | filters.Document.FileExtension("tsv")
+    | filters.Document.FileExtension("txt")
+)
+
+# Bot API limit for getFile downloads.
+MAX_IMPORT_BYTES = 20 * 1024 * 1024
+
+USAGE = (
+    "To import weights, send a CSV or TSV file with rows `user, weight` "
+    "(user is a @username or Telegram id) and the chat id as caption.\n"
+    "Add `dry` after the chat id to only check the file: `-1001234567890 dry`\n"
+    "The chat id is shown by /setup."
+)
+
+
+async def handle_weight_import(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle a weight CSV/TSV sent in DM by a chat admin."""
+    message = update.message
+    if not message or not message.from_user or not message.document:
+        return
+
+    caption = (message.caption or "").split()
+    try:
+        chat_id = int(caption[0])
+    except (IndexError, ValueError):
+        await message.reply_text(USAGE)
+        return
+    dry_run = len(caption) > 1 and caption[1].lower() in ("dry", "dry-run", "dryrun")
+
+    if message.document.file_size and message.document.file_size > MAX_IMPORT_BYTES:
+        await message.reply_text("The file is too large (20 MB max).")
+        return
+
+    async with get_session() as session:
+        try:
+            await require_chat(session, chat_id)
+        except Exception:
+            await message.reply_text("That chat is not set up yet. Run /setup there first.")
+            return
+        if not await is_chat_admin_hybrid(session, context.bot, chat_id, message.from_user.id):
+            await message.reply_text("You don't have permission to import weights for that chat.")
+            return
+
+    # Stream the file from disk instead of holding it in memory.
+    fd, path = tempfile.mkstemp(prefix="weights-", suffix=".csv")
+    os.close(fd)
+    try:
+        telegram_file = await message.document.get_file()
+        await telegram_file.download_to_drive(path)
+        async with get_session() as session:
+            with open(path, encoding="utf-8-sig", newline="") as fh:
+                report = await import_weights(session, chat_id, fh, dry_run)
+    except UnicodeDecodeError:
+        await message.reply_text("The file must be UTF-8 text.")
+        return
+    finally:
+        os.unlink(path)
+
+    await message.reply_text(report.summary())
@@ -1,80 +1,81 @@
 import logging
 
 from telegram import Update
-from telegram.ext import ContextTypes
+from telegram.ext import ContextTypes, filters
 
-from bot.services.chat_service import get_effective_settings, require_chat
-from bot.services.post_service import create_post
+from bot.journal import get_journal, should_journal
+from bot.links import message_link
 from bot.services.stats_service import get_user_stats
-from bot.services.user_service import get_or_create_chat_user
-from db.database import get_session
+from bot.services.tracking_service import DuplicateLink, post_event_from_update, track_post
+from db.database import get_session, is_db_unavailable_error, mark_db_unavailable
 
 logger = logging.getLogger(__name__)
 
+# Messages that may be hashtag posts (also used by catch-up to pick batchable updates).
+TRACKED_MESSAGES = filters.TEXT & ~filters.COMMAND
+
 
 async def handle_hashtag_message(
     update: Update, context: ContextTypes.DEFAULT_TYPE
 ) -> None:
-    if not update.message:
+    event = post_event_from_update(update)
+    if event is None:
         return
 
     message = update.message
-    content = (message.text or message.caption or "").strip()
-    if not content:
-        return
-
-    chat_id = message.chat_id
-
     telegram_user = message.from_user
-    if not telegram_user:
-        return
-
-    async with get_session() as session:
-        # Require chat setup; if not set up, ignore silently (avoid spam).
-        try:
-            await require_chat(session, chat_id)
-        except Exception:
-            return
-
-        settings = await get_effective_settings(session, chat_id)
 
-        # Check if message contains the hashtag
-        if settings.hashtag.lower() not in content.lower():
-            return
+    # Without the database we cannot check the chat's hashtag; journal anything that
+    # could be a hashtag post and let the replayer apply the real checks.
+    if should_journal():
+        if "#" in event.content:
+            get_journal().append(event)
+        return
 
-        # Check if we're in the correct topic (if configured)
-        if settings.topic_id is not None:
-            message_topic_id = getattr(message, "message_thread_id", None)
-            if message_topic_id != settings.topic_id:
+    try:
+        async with get_session() as session:
+            # Ignores chats that are not set up, non-matching messages and other topics.
+            tracked = await track_post(session, event)
+            if tracked is None:
                 return
+            if not isinstance(tracked, DuplicateLink):
+                user, _post = tracked
+
+                # Get user stats
+                stats = await get_user_stats(session, event.chat_id, user)
+    except Exception as exc:
+        if not is_db_unavailable_error(exc):
+            raise
+        mark_db_unavailable()
+        if "#" in event.content:
+            get_journal().append(event)
+        logger.warning("Database unavailable, journaled message %s: %s", message.message_id, exc)
+        return
 
-        # Get or create user
-        user, _chat_user = await get_or_create_chat_user(
-            session, chat_id, telegram_user.id, telegram_user.username
+    if isinstance(tracked, DuplicateLink):
+        original = message_link(event.chat_id, tracked.original_message_id)
+        await message.reply_text(
+            "This link was already posted here recently"
+            + (f": {original}" if original else ".")
+            + "\nReact to the original post instead; this one is not tracked."
         )
-
-        # Create the post
-        await create_post(
-            session,
-            user,
-            message.message_id,
-            chat_id,
-            getattr(message, "message_thread_id", None),
+        logger.info(
+            "Rejected duplicate link from user %s (original message %s)",
+            telegram_user.id,
+            tracked.original_message_id,
         )
+        return
 
-        # Get user stats
-        stats = await get_user_stats(session, chat_id, user)
-
-        # Format username for display
-        display_name = f"@{telegram_user.username}" if telegram_user.username else telegram_user.first_name
+    # Format username for display
+    display_name = f"@{telegram_user.username}" if telegram_user.username else telegram_user.first_name
 
-        # Reply publicly with stats
-        stats_message = (
-            f"{display_name} stats:\n"
-            f"Reposts made: {stats.reposts_made}\n"
-            f"Reposts received: {stats.reposts_received}\n"
-            f"Points: {stats.points:.1f}"
-        )
+    # Reply publicly with stats
+    stats_message = (
+        f"{display_name} stats:\n"
+        f"Reposts made: {stats.reposts_made}\n"
+        f"Reposts received: {stats.reposts_received}\n"
+        f"Points: {stats.points:.1f}"
+    )
 
-        await message.reply_text(stats_message)
-        logger.info(f"Tracked post from user {telegram_user.id}")
+    await message.reply_text(stats_message)
+    logger.info("Tracked post from user %s", telegram_user.id)
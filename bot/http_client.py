@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any
+
+import httpx
+from telegram.error import TimedOut
+
+from bot import metrics
+from bot.config import Config, HTTPPoolSettings
+from bot.tracing import TracedHTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+# Seconds between pool exhaustion warnings of one pool (the rest are only counted).
+POOL_WARNING_INTERVAL = 60.0
+
+
+class BotAPIRequest(TracedHTTPXRequest):
+    """
+    Bot API HTTP client with explicit pool/keep-alive settings.
+
+    Pool exhaustion (all connections busy for longer than pool_timeout) is counted as
+    ``http.<name>.pool_exhausted`` (in the metrics summary) and logged as a warning at
+    most every POOL_WARNING_INTERVAL seconds, so undersized pools show up without
+    flooding the log while saturated.
+    """
+
+    def __init__(self, name: str, settings: HTTPPoolSettings) -> None:
+        # Read by _build_client(), which HTTPXRequest.__init__ calls.
+        self._pool_name = name
+        self._keepalive_expiry = settings.keepalive_expiry
+        self._exhausted_unreported = 0
+        self._next_warning_at = 0.0
+        super().__init__(
+            connection_pool_size=settings.pool_size,
+            connect_timeout=settings.connect_timeout,
+            read_timeout=settings.read_timeout,
+            write_timeout=settings.write_timeout,
+            pool_timeout=settings.pool_timeout,
+            http_version=settings.http_version,
+        )
+
+    def _build_client(self) -> httpx.AsyncClient:
+        limits: httpx.Limits = self._client_kwargs["limits"]
+        self._client_kwargs["limits"] = httpx.Limits(
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=self._keepalive_expiry,
+        )
+        return super()._build_client()
+
+    async def do_request(self, url: str, method: str, *args: Any, **kwargs: Any):
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        except TimedOut as exc:
+            if isinstance(exc.__cause__, httpx.PoolTimeout):
+                metrics.incr(f"http.{self._pool_name}.pool_exhausted")
+                self._warn_pool_exhausted(url.rsplit("/", 1)[-1])
+            raise
+
+    def _warn_pool_exhausted(self, method: str) -> None:
+        self._exhausted_unreported += 1
+        now = time.monotonic()
+        if now < self._next_warning_at:
+            return
+        logger.warning(
+            "Bot API %s pool exhausted calling %s (pool timeouts since the last warning: "
+            "%s); consider a larger pool",
+            self._pool_name,
+            method,
+            self._exhausted_unreported,
+        )
+        self._exhausted_unreported = 0
+        self._next_warning_at = now + POOL_WARNING_INTERVAL
+
+
+def build_requests(config: Config) -> tuple[BotAPIRequest, BotAPIRequest]:
+    """Return (request, get_updates_request) for Application.builder()."""
+    return (
+        BotAPIRequest("api", config.api_http),
+        BotAPIRequest("updates", config.updates_http),
+    )
@@ -0,0 +1,247 @@
+"""
+Append-only local journal for tracked events that could not reach the database.
+
+Events are appended as JSON lines and fsync'ed in batches off the event loop. The
+replayer moves the journal aside, applies it in batches once the database is back, and
+records its progress in an offset file so a crash mid-replay resumes where it stopped.
+Applying an event is idempotent (see bot.services.tracking_service), so a batch that
+was committed but not yet recorded in the offset file is harmlessly re-applied.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from typing import IO
+
+from telegram.ext import ContextTypes
+
+from bot import metrics
+from bot.config import get_config
+from bot.services.tracking_service import (
+    PostEvent,
+    TrackedEvent,
+    event_from_dict,
+    group_by_chat,
+    track_batch,
+    track_post,
+    track_reaction,
+)
+from db.database import db_available, get_session, is_db_unavailable_error, mark_db_unavailable
+
+logger = logging.getLogger(__name__)
+
+
+def _fsync(fd: int) -> None:
+    try:
+        os.fsync(fd)
+    except OSError:
+        # The file was closed (and synced) in the meantime.
+        pass
+
+
+class UpdateJournal:
+    def __init__(self, path: str, fsync_interval: float = 0.2, fsync_batch: int = 64) -> None:
+        self.path = path
+        self.replay_path = path + ".replay"
+        self.offset_path = path + ".replay.offset"
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self._fh: IO[str] | None = None
+        self._unsynced = 0
+        self._sync_handle: asyncio.TimerHandle | None = None
+        self._replay_lock = asyncio.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._pending = os.path.exists(self.replay_path) or (
+            os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        )
+
+    @property
+    def pending(self) -> bool:
+        """True while there are journaled events that have not been replayed yet."""
+        return self._pending
+
+    def _file(self) -> IO[str]:
+        if self._fh is None:
+            self._fh = open(self.path, "a", encoding="utf-8")
+        return self._fh
+
+    def append(self, event: TrackedEvent) -> None:
+        fh = self._file()
+        fh.write(json.dumps(event.to_dict(), ensure_ascii=False) + "\n")
+        fh.flush()
+        self._pending = True
+        metrics.incr("journal.appended")
+
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_batch:
+            self._sync_now()
+        elif self._sync_handle is None:
+            self._sync_handle = asyncio.get_running_loop().call_later(
+                self.fsync_interval, self._sync_now
+            )
+
+    def _sync_now(self) -> None:
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        if self._fh is None or self._unsynced == 0:
+            return
+        self._unsynced = 0
+        fd = self._fh.fileno()
+        asyncio.get_running_loop().run_in_executor(None, _fsync, fd)
+
+    def close(self) -> None:
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        if self._fh is not None:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._fh.close()
+            self._fh = None
+        self._unsynced = 0
+
+    def _rotate(self) -> None:
+        """Move the live journal aside so new appends go to a fresh file."""
+        if os.path.exists(self.replay_path):
+            return
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        self.close()
+        os.replace(self.path, self.replay_path)
+
+    def _read_offset(self) -> int:
+        try:
+            with open(self.offset_path, encoding="utf-8") as fh:
+                return int(fh.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, offset: int) -> None:
+        tmp = self.offset_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(str(offset))
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, self.offset_path)
+
+    async def replay(self, batch_size: int = 200) -> int:
+        """
+        Apply journaled events to the database. Returns the number of events replayed.
+        Stops early (keeping its position) if the database becomes unavailable.
+        """
+        async with self._replay_lock:
+            replayed = 0
+            while True:
+                self._rotate()
+                if not os.path.exists(self.replay_path):
+                    self._pending = False
+                    break
+
+                offset = self._read_offset()
+                with open(self.replay_path, encoding="utf-8") as fh:
+                    fh.seek(offset)
+                    while True:
+                        lines = []
+                        for _ in range(batch_size):
+                            line = fh.readline()
+                            if not line:
+                                break
+                            lines.append(line)
+                        if not lines:
+                            break
+
+                        events = []
+                        for line in lines:
+                            try:
+                                events.append(event_from_dict(json.loads(line)))
+                            except (ValueError, KeyError, TypeError):
+                                logger.error("Skipping malformed journal line: %r", line)
+
+                        if not await _apply_batch(events):
+                            return replayed
+                        replayed += len(events)
+                        offset = fh.tell()
+                        self._write_offset(offset)
+
+                os.remove(self.replay_path)
+                if os.path.exists(self.offset_path):
+                    os.remove(self.offset_path)
+
+            if replayed:
+                metrics.incr("journal.replayed", replayed)
+                logger.info("Replayed %s journaled events", replayed)
+            return replayed
+
+
+async def _apply_event(session, event: TrackedEvent) -> None:
+    if isinstance(event, PostEvent):
+        await track_post(session, event)
+    else:
+        await track_reaction(session, event)
+
+
+async def _apply_batch(events: list[TrackedEvent]) -> bool:
+    """
+    Apply a batch in one session, with bulk statements per chat. Returns False if the
+    database is unavailable.
+    If the batch fails for any other reason, events are retried one by one and the
+    ones that still fail are logged and dropped so a bad record cannot wedge replay.
+    """
+    try:
+        async with get_session() as session:
+            for chat_id, chat_events in group_by_chat(events).items():
+                await track_batch(session, chat_id, chat_events)
+        return True
+    except Exception as exc:
+        if is_db_unavailable_error(exc):
+            mark_db_unavailable()
+            return False
+        logger.warning("Journal batch failed (%s); retrying events individually", exc)
+
+    for event in events:
+        try:
+            async with get_session() as session:
+                await _apply_event(session, event)
+        except Exception as exc:
+            if is_db_unavailable_error(exc):
+                mark_db_unavailable()
+                return False
+            logger.error("Dropping journaled event %s: %s", event, exc)
+    return True
+
+
+_journal: UpdateJournal | None = None
+
+
+def get_journal() -> UpdateJournal:
+    global _journal
+    if _journal is None:
+        cfg = get_config()
+        _journal = UpdateJournal(
+            cfg.journal_path, cfg.journal_fsync_interval, cfg.journal_fsync_batch
+        )
+    return _journal
+
+
+def should_journal() -> bool:
+    """
+    Events go to the journal while the database is down, and also while older events
+    are still waiting to be replayed so that ordering is preserved (a reaction must not
+    be applied before the post it refers to).
+    """
+    return not db_available() or get_journal().pending
+
+
+async def replay_journal_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback that drains the journal once the database is reachable."""
+    journal = get_journal()
+    if not journal.pending or not db_available():
+        return
+    await journal.replay(get_config().journal_replay_batch)
@@ -0,0 +1,135 @@
+"""
+Maintenance tool for the point_events ledger.
+
+    python -m bot.ledger check [--chat CHAT_ID]
+    python -m bot.ledger rebuild [--chat CHAT_ID] [--batch 1000]
+
+`check` compares chat_users.points with the sum of each member's ledger events and
+lists the members that differ. `rebuild` overwrites chat_users.points with the ledger
+sums. Both aggregate in the database and stream the per-member rows through a
+server-side cursor, so memory use does not grow with the number of members. Stop
+the bot before a rebuild so no reaction is applied halfway through it.
+
+Uses the bot's environment (BOT_TOKEN, DATABASE_URL).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from typing import AsyncIterator
+
+from sqlalchemy import BigInteger, Float, Integer, column, func, select, update, values
+
+from db.database import close_db, get_session
+from db.models import ChatUser, PointEvent
+
+# Differences below this are float noise from summing many weighted deltas.
+TOLERANCE = 1e-6
+STREAM_CHUNK = 1000
+
+
+def _projection(chat_id: int | None):
+    """(chat_id, user_id, stored points, ledger points) for every member."""
+    sums = select(
+        PointEvent.chat_id, PointEvent.user_id, func.sum(PointEvent.delta).label("points")
+    ).group_by(PointEvent.chat_id, PointEvent.user_id)
+    members = select(ChatUser.chat_id, ChatUser.user_id, ChatUser.points)
+    if chat_id is not None:
+        sums = sums.where(PointEvent.chat_id == chat_id)
+        members = members.where(ChatUser.chat_id == chat_id)
+    sums = sums.subquery("ledger")
+    members = members.subquery("members")
+    return (
+        select(
+            members.c.chat_id,
+            members.c.user_id,
+            members.c.points,
+            func.coalesce(sums.c.points, 0.0),
+        )
+        .outerjoin(
+            sums, (sums.c.chat_id == members.c.chat_id) & (sums.c.user_id == members.c.user_id)
+        )
+        .order_by(members.c.chat_id, members.c.user_id)
+    )
+
+
+async def _differences(
+    chat_id: int | None, batch_size: int
+) -> AsyncIterator[list[tuple[int, int, float, float]]]:
+    """Yield batches of members whose stored points differ from the ledger."""
+    async with get_session() as session:
+        result = await session.stream(
+            _projection(chat_id).execution_options(yield_per=batch_size)
+        )
+        async for partition in result.partitions():
+            batch = [
+                (row_chat_id, user_id, stored, projected)
+                for row_chat_id, user_id, stored, projected in partition
+                if abs(stored - projected) > TOLERANCE
+            ]
+            if batch:
+                yield batch
+
+
+async def check(chat_id: int | None, batch_size: int) -> int:
+    per_chat: dict[int, int] = {}
+    async for batch in _differences(chat_id, batch_size):
+        for row_chat_id, user_id, stored, projected in batch:
+            per_chat[row_chat_id] = per_chat.get(row_chat_id, 0) + 1
+            print(
+                f"chat {row_chat_id} user {user_id}: stored {stored:.4f}, "
+                f"ledger {projected:.4f} (diff {stored - projected:+.4f})"
+            )
+    for row_chat_id, count in sorted(per_chat.items()):
+        print(f"chat {row_chat_id}: {count} members differ")
+    if not per_chat:
+        print("All stored points match the ledger.")
+    return sum(per_chat.values())
+
+
+async def rebuild(chat_id: int | None, batch_size: int) -> int:
+    table = ChatUser.__table__
+    fixed = 0
+    async for batch in _differences(chat_id, batch_size):
+        rows = values(
+            column("chat_id", BigInteger),
+            column("user_id", Integer),
+            column("points", Float),
+            name="projected",
+        ).data([(row_chat_id, user_id, projected) for row_chat_id, user_id, _, projected in batch])
+        # Written from a second connection while the first one keeps the cursor open.
+        async with get_session() as session:
+            await session.execute(
+                update(table)
+                .where(table.c.chat_id == rows.c.chat_id, table.c.user_id == rows.c.user_id)
+                .values(points=rows.c.points)
+            )
+        fixed += len(batch)
+        print(f"{fixed} members rebuilt...")
+    print(f"Rebuilt points of {fixed} members from the ledger.")
+    return fixed
+
+
+async def _run(args: argparse.Namespace) -> int:
+    try:
+        if args.command == "check":
+            return 1 if await check(args.chat, args.batch) else 0
+        await rebuild(args.chat, args.batch)
+        return 0
+    finally:
+        await close_db()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["check", "rebuild"])
+    parser.add_argument("--chat", type=int, default=None, help="limit to one chat id")
+    parser.add_argument("--batch", type=int, default=STREAM_CHUNK, help="rows per batch")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
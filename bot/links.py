@@ -0,0 +1,93 @@
+"""
+Links in and to messages.
+
+Posted links are reduced to a canonical form, so the same reel shared twice is
+detected even when the copies differ in tracking parameters, host aliases or
+trailing slashes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+URL_RE = re.compile(r"https?://[^\s<>\"']+", re.IGNORECASE)
+
+HOST_ALIASES = {
+    "instagr.am": "instagram.com",
+    "youtu.be": "youtube.com",
+    "vm.tiktok.com": "tiktok.com",
+    "fb.watch": "facebook.com",
+    "twitter.com": "x.com",
+}
+# Hosts whose query string never identifies the content; other hosts keep the
+# parameters that are not known trackers.
+QUERYLESS_HOSTS = {"instagram.com", "tiktok.com", "x.com", "threads.net"}
+TRACKING_PARAMS = {
+    "fbclid",
+    "gclid",
+    "igsh",
+    "igshid",
+    "feature",
+    "si",
+    "s",
+    "t",
+    "ref",
+    "share_id",
+    "_r",
+    "_t",
+}
+# Punctuation that usually ends a sentence rather than the URL.
+TRAILING = ".,;:!?)]}"
+
+
+def extract_url(text: str) -> str | None:
+    """The first http(s) URL in the text, if any."""
+    match = URL_RE.search(text)
+    return match.group(0).rstrip(TRAILING) if match else None
+
+
+def canonical_url(url: str) -> str:
+    """
+    Normalize a URL: https, lowercase host without www./m., known host aliases,
+    no tracking parameters, sorted query, no fragment or trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    for prefix in ("www.", "m.", "mobile."):
+        if host.startswith(prefix):
+            host = host[len(prefix) :]
+            break
+    path = re.sub(r"/{2,}", "/", parts.path).rstrip("/")
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=False)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith("utm_")
+    ]
+
+    if host == "youtu.be" and path:
+        query = [("v", path.lstrip("/"))] + [(k, v) for k, v in query if k != "v"]
+        path = "/watch"
+    host = HOST_ALIASES.get(host, host)
+    if host == "instagram.com":
+        # /reels/<id> and /p/<id> are the same post as /reel/<id>.
+        path = re.sub(r"^/(?:reels|p|tv)/", "/reel/", path)
+    if host in QUERYLESS_HOSTS:
+        query = []
+
+    return urlunsplit(("https", host, path, urlencode(sorted(query)), ""))
+
+
+def message_link(chat_id: int, message_id: int) -> str | None:
+    """t.me link to a supergroup message (opens for members of the chat)."""
+    text = str(chat_id)
+    if text.startswith("-100"):
+        return f"https://t.me/c/{text[4:]}/{message_id}"
+    return None
+
+
+def url_hash(url: str) -> int:
+    """Signed 64-bit hash of the canonical URL (fits a BIGINT column)."""
+    digest = hashlib.blake2b(canonical_url(url).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
@@ -0,0 +1,99 @@
+"""
+Event-loop lag monitor.
+
+A coroutine sleeps for a fixed interval and measures how late it wakes up; that delay
+is the time the loop spent running something else without yielding. A watchdog thread
+watches the coroutine's heartbeat, and when the loop has been stuck for longer than
+the threshold it captures the stack of the loop thread while the stall is still in
+progress, so the log shows the code that was actually blocking.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from bot import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.5, threshold: float = 0.1) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_thread_id: int | None = None
+        self._heartbeat = time.monotonic()
+        self._stall_reported = False
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._run(), name="loop-lag-monitor")
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-lag-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        logger.info(
+            "Loop lag monitor started (interval %.0f ms, threshold %.0f ms)",
+            self.interval * 1000,
+            self.threshold * 1000,
+        )
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.interval + self.threshold)
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - started - self.interval
+            self._heartbeat = time.monotonic()
+            self._stall_reported = False
+
+            metrics.set_gauge("loop.lag_ms", lag * 1000)
+            metrics.max_gauge("loop.max_lag_ms", lag * 1000)
+            if lag > self.threshold:
+                metrics.incr("loop.stalls")
+                logger.warning("Event loop lag %.0f ms", lag * 1000)
+
+    def _watch(self) -> None:
+        deadline = self.interval + self.threshold
+        while not self._stopped.wait(self.threshold / 2):
+            stalled_for = time.monotonic() - self._heartbeat
+            if stalled_for < deadline or self._stall_reported:
+                continue
+            self._stall_reported = True
+            self._report_stall(stalled_for - self.interval)
+
+    def _report_stall(self, stalled_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>"
+        task = asyncio.current_task(self._loop) if self._loop is not None else None
+        logger.warning(
+            "Event loop blocked for at least %.0f ms in task %s:\n%s",
+            stalled_for * 1000,
+            task.get_name() if task is not None else "<none>",
+            stack,
+        )
@@ -1,78 +1,248 @@
+import asyncio
 import logging
+import time
+from datetime import time as dtime, timedelta, timezone
 
 from telegram.ext import (
     Application,
+    CallbackQueryHandler,
     CommandHandler,
     MessageHandler,
     MessageReactionHandler,
-    filters,
 )
 
-from bot.config import get_config
+from bot.application import BotApplication
+from bot.catchup import catch_up
+from bot.config import Config, get_config
+from bot.decay import decay_job
+from bot.dedup import UpdateDeduplicator
+from bot.digest import digest_job
 from bot.handlers.commands import (
+    TODO_CALLBACK_PREFIX,
+    balance_command,
     cleartopic_command,
+    emoji_command,
+    hashtag_command,
     leaderboard_command,
+    reweight_command,
+    setdecay_command,
+    setretention_command,
     settopic_command,
     setweight_command,
     setup_command,
+    start_command,
     stats_command,
     syncadmins_command,
+    todo_command,
+    todo_more_callback,
 )
-from bot.handlers.message import handle_hashtag_message
+from bot.handlers.document import WEIGHT_IMPORT_DOCUMENTS, handle_weight_import
+from bot.handlers.message import TRACKED_MESSAGES, handle_hashtag_message
 from bot.handlers.reaction import handle_reaction
-from db.database import close_db, init_db
+from bot.http_client import build_requests
+from bot.journal import get_journal, replay_journal_job
+from bot.logging_config import configure_logging, stop_logging
+from bot.loop_monitor import LoopLagMonitor
+from bot.metrics import log_summary, metrics_log_job
+from bot.retention import retention_job
+from bot.sharding import is_lead_worker
+from bot.snapshot import restore_snapshot, write_snapshot
+from bot.tracing import configure_tracing, shutdown_tracing
+from bot.warmup import warm_up
+from bot.workers import run_front
+from db.database import close_db, db_available, init_db
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-)
 logger = logging.getLogger(__name__)
 
+ALLOWED_UPDATES = ["message", "message_reaction", "callback_query"]
+
+_loop_monitor: LoopLagMonitor | None = None
+_warmup_task: asyncio.Task | None = None
+_started_at = time.monotonic()
+
 
 async def post_init(application: Application) -> None:
     """Initialize database after application starts."""
+    global _loop_monitor, _warmup_task
+    config = get_config()
+    if config.loop_lag_threshold > 0:
+        _loop_monitor = LoopLagMonitor(
+            interval=config.loop_monitor_interval, threshold=config.loop_lag_threshold
+        )
+        _loop_monitor.start()
+
     await init_db()
     logger.info("Database initialized")
 
+    # Restore chat caches from the last shutdown, or preload them in the background;
+    # polling does not wait for the warm-up.
+    restored = bool(config.snapshot_path) and await restore_snapshot(config.snapshot_path)
+    if not restored and config.warmup_timeout > 0:
+        _warmup_task = asyncio.create_task(
+            warm_up(config.warmup_timeout, config.warmup_posts_per_chat)
+        )
+
+    # Work through updates that piled up while we were down before polling starts
+    # (not in worker processes: the front routes the backlog to them in batches).
+    if (
+        config.catchup_threshold > 0
+        and isinstance(application, BotApplication)
+        and application.updater is not None
+    ):
+        await catch_up(application, _started_at, config.catchup_threshold, ALLOWED_UPDATES)
+
+    # Drain events journaled while the database was unavailable (also on startup).
+    application.job_queue.run_repeating(
+        replay_journal_job, interval=config.journal_replay_interval, first=0
+    )
+    if config.retention_interval > 0:
+        application.job_queue.run_repeating(
+            retention_job, interval=config.retention_interval, first=config.retention_interval
+        )
+    if config.decay_check_interval > 0:
+        application.job_queue.run_repeating(
+            decay_job, interval=config.decay_check_interval, first=config.decay_check_interval
+        )
+    if config.metrics_log_interval > 0:
+        application.job_queue.run_repeating(
+            metrics_log_job,
+            interval=config.metrics_log_interval,
+            first=config.metrics_log_interval,
+        )
+    if config.digest_weekday >= 0 and is_lead_worker():
+        schedule_digest(application, config.digest_weekday, config.digest_hour)
+
+
+def schedule_digest(application: Application, weekday: int, hour: int) -> None:
+    """
+    Weekly digest at `hour` UTC on `weekday` (0 = Monday). The latest week's run also
+    starts shortly after startup: it resumes an interrupted run or makes up for one
+    missed while the bot was down, and sends nothing if the run had finished (members
+    already handled are skipped).
+    """
+    run_at = dtime(hour=hour, tzinfo=timezone.utc)
+    # JobQueue days count from Sunday = 0.
+    application.job_queue.run_daily(digest_job, time=run_at, days=((weekday + 1) % 7,))
+    application.job_queue.run_once(digest_job, when=timedelta(minutes=1))
+
 
 async def post_shutdown(application: Application) -> None:
     """Clean up database connections."""
+    global _loop_monitor, _warmup_task
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+        _warmup_task = None
+    if _loop_monitor is not None:
+        await _loop_monitor.stop()
+        _loop_monitor = None
+    log_summary()
+
+    if isinstance(application, BotApplication) and application.deduplicator is not None:
+        application.deduplicator.persist()
+    get_journal().close()
+    config = get_config()
+    if config.snapshot_path and db_available():
+        await write_snapshot(config.snapshot_path)
     await close_db()
     logger.info("Database connections closed")
+    shutdown_tracing()
 
 
-def main() -> None:
-    config = get_config()
-
-    # Build application
-    application = (
-        Application.builder()
-        .token(config.bot_token)
-        .post_init(post_init)
-        .post_shutdown(post_shutdown)
-        .build()
-    )
-
+def register_handlers(application: Application) -> None:
     # Add command handlers
+    application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("stats", stats_command))
     application.add_handler(CommandHandler("leaderboard", leaderboard_command))
+    application.add_handler(CommandHandler("todo", todo_command))
+    application.add_handler(
+        CallbackQueryHandler(todo_more_callback, pattern=f"^{TODO_CALLBACK_PREFIX}")
+    )
+    application.add_handler(CommandHandler("balance", balance_command))
     application.add_handler(CommandHandler("setweight", setweight_command))
+    application.add_handler(CommandHandler("reweight", reweight_command))
     application.add_handler(CommandHandler("setup", setup_command))
     application.add_handler(CommandHandler("syncadmins", syncadmins_command))
     application.add_handler(CommandHandler("settopic", settopic_command))
     application.add_handler(CommandHandler("cleartopic", cleartopic_command))
+    application.add_handler(CommandHandler("setretention", setretention_command))
+    application.add_handler(CommandHandler("setdecay", setdecay_command))
+    application.add_handler(CommandHandler("hashtag", hashtag_command))
+    application.add_handler(CommandHandler("emoji", emoji_command))
+
+    # Weight CSV/TSV imports sent to the bot in DM
+    application.add_handler(MessageHandler(WEIGHT_IMPORT_DOCUMENTS, handle_weight_import))
 
     # Add message handler for hashtag detection
     application.add_handler(
-        MessageHandler(filters.TEXT & ~filters.COMMAND, handle_hashtag_message)
+        MessageHandler(TRACKED_MESSAGES, handle_hashtag_message)
     )
 
     # Add reaction handler
     application.add_handler(MessageReactionHandler(handle_reaction))
 
+
+def install_uvloop() -> bool:
+    """Make uvloop the event loop policy; returns False if it is not installed."""
+    try:
+        import uvloop
+    except ImportError:
+        logger.warning("USE_UVLOOP is set but uvloop is not installed; using asyncio")
+        return False
+    uvloop.install()
+    logger.info("Using uvloop event loop")
+    return True
+
+
+def build_application(config: Config, polling: bool = True) -> BotApplication:
+    """The bot's Application; without polling (worker processes) it has no updater."""
+    request, get_updates_request = build_requests(config)
+    builder = (
+        Application.builder()
+        .application_class(BotApplication)
+        .token(config.bot_token)
+        .request(request)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if polling:
+        builder = builder.get_updates_request(get_updates_request)
+    else:
+        builder = builder.updater(None)
+    application = builder.build()
+
+    application.deduplicator = UpdateDeduplicator(
+        config.dedup_state_path, capacity=config.dedup_capacity
+    )
+    register_handlers(application)
+    return application
+
+
+def main() -> None:
+    global _started_at
+    _started_at = time.monotonic()
+    config = get_config()
+    configure_logging(config.log_format, config.log_level, config.log_sample_rates)
+    if config.workers > 1:
+        logger.info("Starting bot with %s workers...", config.workers)
+        try:
+            run_front(config, ALLOWED_UPDATES)
+        finally:
+            stop_logging()
+        return
+
+    configure_tracing(config.trace_sample_rate, config.trace_export_path)
+    if config.use_uvloop:
+        install_uvloop()
+
+    # Build application
+    application = build_application(config)
+
     # Run the bot
     logger.info("Starting bot...")
-    application.run_polling(allowed_updates=["message", "message_reaction"])
+    try:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
+    finally:
+        stop_logging()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,58 @@
+"""
+Process-local counters and gauges.
+
+Kept deliberately tiny: values can be incremented from any thread and are logged as
+one summary line every METRICS_LOG_INTERVAL seconds (metrics_log_job).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import Counter
+
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_counters: Counter[str] = Counter()
+_gauges: dict[str, float] = {}
+
+
+def incr(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def max_gauge(name: str, value: float) -> None:
+    """Keep the maximum value seen for a gauge."""
+    with _lock:
+        if value > _gauges.get(name, float("-inf")):
+            _gauges[name] = value
+
+
+def snapshot() -> dict[str, float]:
+    with _lock:
+        return {**_counters, **_gauges}
+
+
+def log_summary() -> None:
+    """Log every counter and gauge (counters since startup) on one line."""
+    values = snapshot()
+    if not values:
+        return
+    logger.info(
+        "Metrics: %s",
+        " ".join(f"{name}={value:g}" for name, value in sorted(values.items())),
+    )
+
+
+async def metrics_log_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback logging the metrics summary."""
+    log_summary()
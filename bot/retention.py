@@ -0,0 +1,70 @@
+"""
+Scheduled retention of old posts and reactions (see /setretention).
+
+Posts whose reactions are all older than a chat's retention period are deleted with
+those reactions, which are folded into the members' archived repost counters. A post
+with a recent reaction keeps all of its reactions until that one expires too. Every
+batch runs in its own short transaction so the job never holds row
+locks for long and live reactions keep flowing while it runs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from telegram.ext import ContextTypes
+
+from bot.cache import chat_cache
+from bot.config import get_config
+from bot.services.analytics_service import invalidate_matrix
+from bot.services.retention_service import archive_posts, chats_with_retention
+from bot.sharding import owns_chat
+from db.database import db_available, get_session
+
+logger = logging.getLogger(__name__)
+
+
+async def apply_retention(chat_id: int, days: int, batch_size: int) -> tuple[int, int]:
+    """Archive and delete one chat's rows older than `days`; returns (reactions, posts)."""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    reactions = posts = 0
+    while True:
+        async with get_session() as session:
+            deleted, message_ids = await archive_posts(session, chat_id, cutoff, batch_size)
+        chat_cache.remove_posts(chat_id, message_ids)
+        reactions += deleted
+        posts += len(message_ids)
+        if len(message_ids) < batch_size:
+            break
+        await asyncio.sleep(0)
+    if reactions:
+        # The deleted reactions' pairs are not archived; rebuild without them.
+        invalidate_matrix(chat_id)
+    return reactions, posts
+
+
+async def retention_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """JobQueue callback applying every chat's retention policy."""
+    if not db_available():
+        return
+    batch_size = get_config().retention_batch
+    async with get_session() as session:
+        policies = await chats_with_retention(session)
+    for chat_id, days in policies:
+        if not owns_chat(chat_id):
+            continue
+        try:
+            reactions, posts = await apply_retention(chat_id, days, batch_size)
+        except Exception:
+            logger.exception("Retention for chat %s failed", chat_id)
+            continue
+        if reactions or posts:
+            logger.info(
+                "Retention for chat %s (%s days): archived %s reactions, deleted %s posts",
+                chat_id,
+                days,
+                reactions,
+                posts,
+            )
@@ -0,0 +1,240 @@
+"""
+Who reposts for whom: a per-chat sparse member x member matrix of reactions and the
+reciprocity stats derived from it.
+
+reposts[i, j] is the number of credited reactions member i made on member j's posts.
+The matrix is built from one aggregated, streamed query, cached per chat and kept up
+to date from apply_reaction_points as its transactions commit, so /balance only pays
+for the vectorized maths.
+Reactions removed by retention are not part of it (their pairs are not archived).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.tracing import traced
+from db.models import Post, Reaction
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK = 10_000
+# Chats whose matrix is kept in memory (least recently used are dropped).
+MAX_CACHED_CHATS = 64
+
+
+@dataclass(frozen=True)
+class MemberBalance:
+    user_id: int
+    made: int
+    received: int
+    # Reposts received from members this member reposted for as often (min per pair).
+    returned: int
+    # returned / received; None without any reposts received.
+    reciprocity: float | None
+    # made - received
+    net: int
+    # Reposts received and never returned, per repost made (+1 to avoid dividing by 0).
+    freeloader_score: float
+
+
+class ReciprocityMatrix:
+    """reposts[i, j]: reactions by member user_ids[i] on posts of member user_ids[j]."""
+
+    def __init__(self, user_ids: np.ndarray, reposts: sparse.csr_matrix, watermark: int) -> None:
+        self.user_ids = user_ids
+        self._index = {int(user_id): i for i, user_id in enumerate(user_ids)}
+        self._reposts = reposts
+        # Highest reaction id included; later reactions are added by record().
+        self.watermark = watermark
+        self._pending_rows: list[int] = []
+        self._pending_cols: list[int] = []
+
+    def _slot(self, user_id: int) -> int:
+        slot = self._index.get(user_id)
+        if slot is None:
+            slot = len(self.user_ids)
+            self._index[user_id] = slot
+            self.user_ids = np.append(self.user_ids, user_id)
+        return slot
+
+    def record(self, reactor_id: int, owner_id: int) -> None:
+        """Count one more repost; applied to the matrix on the next read."""
+        self._pending_rows.append(self._slot(reactor_id))
+        self._pending_cols.append(self._slot(owner_id))
+
+    @property
+    def reposts(self) -> sparse.csr_matrix:
+        size = len(self.user_ids)
+        if self._reposts.shape != (size, size):
+            self._reposts.resize((size, size))
+        if self._pending_rows:
+            added = sparse.csr_matrix(
+                (
+                    np.ones(len(self._pending_rows), dtype=np.int64),
+                    (self._pending_rows, self._pending_cols),
+                ),
+                shape=(size, size),
+            )
+            self._reposts = self._reposts + added
+            self._pending_rows, self._pending_cols = [], []
+        return self._reposts
+
+    def index_of(self, user_id: int) -> int | None:
+        return self._index.get(user_id)
+
+
+@traced
+async def load_matrix(session: AsyncSession, chat_id: int) -> ReciprocityMatrix:
+    """Build a chat's matrix from reactions/posts with one streamed GROUP BY."""
+    stmt = (
+        select(
+            Reaction.reactor_user_id,
+            Post.user_id,
+            func.count(),
+            func.max(Reaction.id),
+        )
+        .join(Post, Post.id == Reaction.post_id)
+        .where(Post.chat_id == chat_id, Reaction.reactor_user_id != Post.user_id)
+        .group_by(Reaction.reactor_user_id, Post.user_id)
+    )
+    reactors: list[np.ndarray] = []
+    owners: list[np.ndarray] = []
+    counts: list[np.ndarray] = []
+    watermark = 0
+    result = await session.stream(stmt.execution_options(yield_per=STREAM_CHUNK))
+    async for partition in result.partitions():
+        rows = np.array([tuple(row) for row in partition], dtype=np.int64)
+        reactors.append(rows[:, 0])
+        owners.append(rows[:, 1])
+        counts.append(rows[:, 2])
+        watermark = max(watermark, int(rows[:, 3].max()))
+
+    if not counts:
+        empty = sparse.csr_matrix((0, 0), dtype=np.int64)
+        return ReciprocityMatrix(np.empty(0, dtype=np.int64), empty, 0)
+    reactor_ids = np.concatenate(reactors)
+    owner_ids = np.concatenate(owners)
+    user_ids, slots = np.unique(np.concatenate((reactor_ids, owner_ids)), return_inverse=True)
+    size = len(user_ids)
+    reposts = sparse.csr_matrix(
+        (np.concatenate(counts), (slots[: len(reactor_ids)], slots[len(reactor_ids) :])),
+        shape=(size, size),
+    )
+    return ReciprocityMatrix(user_ids, reposts, watermark)
+
+
+_matrices: OrderedDict[int, ReciprocityMatrix] = OrderedDict()
+# Reactions recorded while a chat's matrix is being built: (reaction_id, reactor, owner)
+_loading: dict[int, list[tuple[int, int, int]]] = {}
+_build_lock = asyncio.Lock()
+
+
+async def get_matrix(session: AsyncSession, chat_id: int) -> ReciprocityMatrix:
+    """
+    The chat's matrix from the cache, built on first use. Reactions credited during
+    the build are added afterwards unless the build already saw them (by reaction id).
+    `session` must be on the primary, not the read replica: reactions a lagging
+    replica has not replayed yet would be missing from the cached matrix for good.
+    """
+    matrix = _matrices.get(chat_id)
+    if matrix is not None:
+        _matrices.move_to_end(chat_id)
+        return matrix
+
+    async with _build_lock:
+        matrix = _matrices.get(chat_id)
+        if matrix is not None:
+            return matrix
+        _loading[chat_id] = []
+        try:
+            matrix = await load_matrix(session, chat_id)
+            for reaction_id, reactor_id, owner_id in _loading[chat_id]:
+                if reaction_id > matrix.watermark:
+                    matrix.record(reactor_id, owner_id)
+        finally:
+            del _loading[chat_id]
+        _matrices[chat_id] = matrix
+        if len(_matrices) > MAX_CACHED_CHATS:
+            _matrices.popitem(last=False)
+    return matrix
+
+
+def record_reactions(chat_id: int, reactions: Iterable[tuple[int, int, int]]) -> None:
+    """Add (reaction_id, reactor user id, owner user id) to the chat's cached matrix."""
+    if chat_id in _loading:
+        _loading[chat_id].extend(reactions)
+        return
+    matrix = _matrices.get(chat_id)
+    if matrix is None:
+        return
+    for _reaction_id, reactor_id, owner_id in reactions:
+        matrix.record(reactor_id, owner_id)
+
+
+def invalidate_matrix(chat_id: int) -> None:
+    _matrices.pop(chat_id, None)
+
+
+def member_balances(matrix: ReciprocityMatrix) -> list[MemberBalance]:
+    """Per-member stats, computed for all members at once."""
+    reposts = matrix.reposts
+    if reposts.shape[0] == 0:
+        return []
+    made = np.asarray(reposts.sum(axis=1)).ravel()
+    received = np.asarray(reposts.sum(axis=0)).ravel()
+    # min(reposts[i, j], reposts[j, i]) is what each pair did for each other; the
+    # result is symmetric, so its row sums are the reposts each member returned.
+    returned = np.asarray(reposts.minimum(reposts.T).sum(axis=1)).ravel()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        reciprocity = np.where(received > 0, returned / received, np.nan)
+    freeloader = (received - returned) / (made + 1)
+    net = made - received
+    return [
+        MemberBalance(
+            user_id=int(matrix.user_ids[i]),
+            made=int(made[i]),
+            received=int(received[i]),
+            returned=int(returned[i]),
+            reciprocity=None if np.isnan(reciprocity[i]) else float(reciprocity[i]),
+            net=int(net[i]),
+            freeloader_score=float(freeloader[i]),
+        )
+        for i in range(len(made))
+    ]
+
+
+def chat_reciprocity(matrix: ReciprocityMatrix) -> float | None:
+    """Share of all reposts in the chat that were returned by the same member."""
+    reposts = matrix.reposts
+    total = reposts.sum()
+    if not total:
+        return None
+    return float(reposts.minimum(reposts.T).sum() / total)
+
+
+def top_partners(
+    matrix: ReciprocityMatrix, user_id: int, limit: int = 5
+) -> tuple[list[tuple[int, int]], list[tuple[int, int]]]:
+    """([(user_id, count)] the member reposted for most, [...] who reposted for them most)."""
+    slot = matrix.index_of(user_id)
+    if slot is None:
+        return [], []
+    reposts = matrix.reposts
+
+    def top(vector: sparse.spmatrix) -> list[tuple[int, int]]:
+        vector = vector.tocoo()
+        order = np.argsort(-vector.data, kind="stable")[:limit]
+        slots = vector.col if vector.shape[0] == 1 else vector.row
+        return [(int(matrix.user_ids[slots[i]]), int(vector.data[i])) for i in order]
+
+    return top(reposts.getrow(slot)), top(reposts.getcol(slot))
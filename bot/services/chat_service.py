@@ -1,28 +1,85 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterable
 
 from telegram import Bot, Chat as TgChat, ChatMember
+from telegram.constants import ReactionEmoji
 from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from bot.cache import chat_cache
 from bot.config import get_config
-from db.models import Chat, ChatAdmin
+from bot.tracing import traced
+from db.database import after_commit
+from db.models import Chat, ChatAdmin, ChatHashtag, ChatReactionEmoji
+
+
+# Longest tag chat_hashtags.tag holds.
+MAX_HASHTAG_LENGTH = 64
+_HASHTAG_RE = re.compile(r"\w+")
+
+# The emojis Telegram allows as reactions, keyed without variation selectors so an
+# emoji typed with or without one matches.
+_REACTION_EMOJIS = {emoji.value.replace("\ufe0f", ""): emoji.value for emoji in ReactionEmoji}
+
+
+def normalize_hashtag(tag: str) -> str:
+    """'#Repost@some_chat' -> 'repost' (the form stored in chat_hashtags)."""
+    return tag.strip().lstrip("#").split("@", 1)[0].lower()
+
+
+def is_valid_hashtag(tag: str) -> bool:
+    """Whether a normalized tag can be a Telegram hashtag and fits chat_hashtags."""
+    return len(tag) <= MAX_HASHTAG_LENGTH and _HASHTAG_RE.fullmatch(tag) is not None
+
+
+def normalize_reaction_emoji(text: str) -> str | None:
+    """The reaction emoji `text` is (as Telegram sends it), or None if it is not one."""
+    return _REACTION_EMOJIS.get(text.strip().replace("\ufe0f", ""))
 
 
 @dataclass(frozen=True)
 class EffectiveChatSettings:
-    hashtag: str
-    reaction_emoji: str
+    """
+    What a chat tracks. Also the chat's compiled matcher: a post matches if any of its
+    hashtag entities is in `hashtags`, a reaction if any of its emojis has a multiplier,
+    each a single pass over the message's own tags or emojis.
+    """
+
+    hashtags: frozenset[str]
+    # (emoji, points multiplier) pairs
+    reaction_emojis: tuple[tuple[str, float], ...]
     topic_id: int | None
+    _multipliers: dict[str, float] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "_multipliers", dict(self.reaction_emojis))
+
+    def matches_hashtags(self, hashtags: Iterable[str]) -> bool:
+        return not self.hashtags.isdisjoint(hashtags)
 
+    def reaction_multiplier(self, emojis: Iterable[str]) -> float | None:
+        """Multiplier of the tracked emoji among `emojis` (the largest), or None."""
+        multipliers = [self._multipliers[e] for e in emojis if e in self._multipliers]
+        return max(multipliers) if multipliers else None
 
+
+def _invalidate_on_commit(session: AsyncSession, chat_id: int) -> None:
+    """Drop the chat's cached settings once the change is committed."""
+    after_commit(session, lambda: chat_cache.invalidate_chat(chat_id))
+
+
+@traced
 async def get_chat(session: AsyncSession, chat_id: int) -> Chat | None:
     stmt = select(Chat).where(Chat.telegram_chat_id == chat_id)
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
 
+@traced
 async def require_chat(session: AsyncSession, chat_id: int) -> Chat:
     chat = await get_chat(session, chat_id)
     if chat is None:
@@ -30,6 +87,7 @@ async def require_chat(session: AsyncSession, chat_id: int) -> Chat:
     return chat
 
 
+@traced
 async def create_or_update_chat(
     session: AsyncSession,
     chat_id: int,
@@ -37,9 +95,16 @@ async def create_or_update_chat(
     *,
     topic_id: int | None = None,
 ) -> Chat:
+    _invalidate_on_commit(session, chat_id)
     chat = await get_chat(session, chat_id)
     if chat is None:
-        chat = Chat(telegram_chat_id=chat_id, title=title, topic_id=topic_id)
+        chat = Chat(
+            telegram_chat_id=chat_id,
+            title=title,
+            topic_id=topic_id,
+            hashtags=[],
+            reaction_emojis=[],
+        )
         session.add(chat)
         await session.flush()
         return chat
@@ -53,28 +118,113 @@ async def create_or_update_chat(
     return chat
 
 
+@traced
 async def set_chat_topic(session: AsyncSession, chat_id: int, topic_id: int | None) -> None:
     chat = await require_chat(session, chat_id)
     chat.topic_id = topic_id
     await session.flush()
+    _invalidate_on_commit(session, chat_id)
 
 
-async def get_effective_settings(session: AsyncSession, chat_id: int) -> EffectiveChatSettings:
-    cfg = get_config()
+@traced
+async def set_chat_retention(session: AsyncSession, chat_id: int, days: int | None) -> None:
+    chat = await require_chat(session, chat_id)
+    chat.retention_days = days
+    await session.flush()
+
+
+@traced
+async def set_chat_decay(
+    session: AsyncSession, chat_id: int, rate: float | None, interval_hours: int | None
+) -> None:
+    chat = await require_chat(session, chat_id)
+    chat.decay_rate = rate
+    chat.decay_interval_hours = interval_hours
+    # The first step is due one interval from now.
+    chat.last_decay_at = datetime.utcnow() if rate is not None else None
+    await session.flush()
+
+
+@traced
+async def add_chat_hashtags(session: AsyncSession, chat_id: int, tags: Iterable[str]) -> None:
     chat = await require_chat(session, chat_id)
+    existing = {hashtag.tag for hashtag in chat.hashtags}
+    for tag in {normalize_hashtag(tag) for tag in tags} - existing:
+        chat.hashtags.append(ChatHashtag(tag=tag))
+    await session.flush()
+    _invalidate_on_commit(session, chat_id)
+
+
+@traced
+async def remove_chat_hashtags(session: AsyncSession, chat_id: int, tags: Iterable[str]) -> None:
+    chat = await require_chat(session, chat_id)
+    removed = {normalize_hashtag(tag) for tag in tags}
+    chat.hashtags = [hashtag for hashtag in chat.hashtags if hashtag.tag not in removed]
+    await session.flush()
+    _invalidate_on_commit(session, chat_id)
+
+
+@traced
+async def set_chat_reaction_emoji(
+    session: AsyncSession, chat_id: int, emoji: str, multiplier: float
+) -> None:
+    chat = await require_chat(session, chat_id)
+    for reaction_emoji in chat.reaction_emojis:
+        if reaction_emoji.emoji == emoji:
+            reaction_emoji.multiplier = multiplier
+            break
+    else:
+        chat.reaction_emojis.append(ChatReactionEmoji(emoji=emoji, multiplier=multiplier))
+    await session.flush()
+    _invalidate_on_commit(session, chat_id)
+
+
+@traced
+async def remove_chat_reaction_emoji(session: AsyncSession, chat_id: int, emoji: str) -> None:
+    chat = await require_chat(session, chat_id)
+    chat.reaction_emojis = [e for e in chat.reaction_emojis if e.emoji != emoji]
+    await session.flush()
+    _invalidate_on_commit(session, chat_id)
+
+
+def settings_for_chat(chat: Chat) -> EffectiveChatSettings:
+    """Effective settings; a chat without its own hashtags or emojis uses the defaults."""
+    cfg = get_config()
     return EffectiveChatSettings(
-        hashtag=chat.hashtag or cfg.default_hashtag,
-        reaction_emoji=chat.reaction_emoji or cfg.default_reaction_emoji,
+        hashtags=frozenset(hashtag.tag for hashtag in chat.hashtags)
+        or frozenset([normalize_hashtag(cfg.default_hashtag)]),
+        reaction_emojis=tuple((e.emoji, e.multiplier) for e in chat.reaction_emojis)
+        or ((cfg.default_reaction_emoji, 1.0),),
         topic_id=chat.topic_id,
     )
 
 
+@traced
+async def get_chat_settings(session: AsyncSession, chat_id: int) -> EffectiveChatSettings | None:
+    """Effective settings, or None if the chat is not set up. Served from the cache."""
+    if chat_id in chat_cache.settings:
+        return chat_cache.settings[chat_id]
+    chat = await get_chat(session, chat_id)
+    settings = settings_for_chat(chat) if chat is not None else None
+    chat_cache.settings[chat_id] = settings
+    return settings
+
+
+@traced
+async def get_effective_settings(session: AsyncSession, chat_id: int) -> EffectiveChatSettings:
+    settings = await get_chat_settings(session, chat_id)
+    if settings is None:
+        raise ValueError("Chat is not set up. Run /setup in the group first.")
+    return settings
+
+
+@traced
 async def sync_admins_from_telegram(
     session: AsyncSession, bot: Bot, chat_id: int
 ) -> list[int]:
     """
-    Replace cached admins for this chat with Telegram's current admin list.
-    Returns telegram user ids that are admins.
+    Replace cached admins for this chat with Telegram's current admin list (the
+    in-process set once committed). Returns telegram user ids that are admins.
     """
     admins = await bot.get_chat_administrators(chat_id)
     admin_ids: list[int] = []
@@ -88,9 +238,11 @@ async def sync_admins_from_telegram(
     for telegram_user_id in admin_ids:
         session.add(ChatAdmin(chat_id=chat_id, telegram_user_id=telegram_user_id))
     await session.flush()
+    after_commit(session, lambda: chat_cache.set_admins(chat_id, admin_ids))
     return admin_ids
 
 
+@traced
 async def is_telegram_admin(bot: Bot, chat_id: int, telegram_user_id: int) -> bool:
     """
     Live-check against Telegram. Used for bootstrapping and hybrid fallback.
@@ -100,20 +252,26 @@ async def is_telegram_admin(bot: Bot, chat_id: int, telegram_user_id: int) -> bo
     return member.status in ("administrator", "creator")
 
 
+@traced
 async def is_chat_admin_hybrid(
     session: AsyncSession, bot: Bot, chat_id: int, telegram_user_id: int
 ) -> bool:
     """
     Hybrid check:
-    - Fast path: DB cache
+    - Fast path: in-process admin set, then DB cache
     - Fallback: if not found, live-check Telegram and if admin, sync cache.
     """
-    stmt = select(ChatAdmin).where(
-        ChatAdmin.chat_id == chat_id, ChatAdmin.telegram_user_id == telegram_user_id
-    )
-    result = await session.execute(stmt)
-    if result.scalar_one_or_none() is not None:
-        return True
+    cached_admins = chat_cache.admins.get(chat_id)
+    if cached_admins is not None:
+        if telegram_user_id in cached_admins:
+            return True
+    else:
+        stmt = select(ChatAdmin).where(
+            ChatAdmin.chat_id == chat_id, ChatAdmin.telegram_user_id == telegram_user_id
+        )
+        result = await session.execute(stmt)
+        if result.scalar_one_or_none() is not None:
+            return True
 
     # Live fallback
     if await is_telegram_admin(bot, chat_id, telegram_user_id):
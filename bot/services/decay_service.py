@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import case, func, literal_column, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.services.points_service import record_point_events
+from bot.tracing import traced
+from db.models import Chat, ChatUser
+
+# Decayed points closer to zero than this are set to zero, so a member's balance stops
+# producing ledger events once it has faded out.
+NEGLIGIBLE_POINTS = 0.01
+
+
+def _due(now: datetime) -> list:
+    """Criteria for chats whose next decay is due at `now`."""
+    interval = literal_column("interval '1 hour'") * Chat.decay_interval_hours
+    return [
+        Chat.decay_rate.is_not(None),
+        Chat.decay_interval_hours.is_not(None),
+        or_(Chat.last_decay_at.is_(None), Chat.last_decay_at <= now - interval),
+    ]
+
+
+@traced
+async def chats_due_for_decay(session: AsyncSession, now: datetime) -> list[int]:
+    result = await session.execute(select(Chat.telegram_chat_id).where(*_due(now)))
+    return list(result.scalars())
+
+
+@traced
+async def decay_chat_points(session: AsyncSession, chat_id: int, now: datetime) -> int | None:
+    """
+    Apply one decay step to a chat's points if it is due, in one UPDATE. Returns the
+    number of members whose points changed, or None if the step was not due (e.g.
+    another instance applied it first); each change is written to the ledger.
+    """
+    # Claim the step: the row lock makes a concurrent claim wait and then re-check
+    # last_decay_at, so a step is applied exactly once across instances.
+    result = await session.execute(
+        update(Chat)
+        .where(Chat.telegram_chat_id == chat_id, *_due(now))
+        .values(last_decay_at=now)
+        .returning(Chat.decay_rate)
+        .execution_options(synchronize_session=False)
+    )
+    rate = result.scalar_one_or_none()
+    if rate is None:
+        return None
+
+    table = ChatUser.__table__
+    # Lock the members first so reactions applied meanwhile land before or after the
+    # decay, never between the two scans below.
+    await session.execute(
+        select(table.c.user_id).where(table.c.chat_id == chat_id).with_for_update()
+    )
+    decayed = table.c.points * (1.0 - rate)
+    # A second scan of chat_users sees the points from before this UPDATE.
+    old = table.alias("old")
+    result = await session.execute(
+        update(table)
+        .where(
+            table.c.chat_id == chat_id,
+            table.c.points != 0,
+            old.c.chat_id == table.c.chat_id,
+            old.c.user_id == table.c.user_id,
+        )
+        .values(points=case((func.abs(decayed) < NEGLIGIBLE_POINTS, 0.0), else_=decayed))
+        .returning(table.c.user_id, table.c.points - old.c.points)
+    )
+    events = [
+        {"chat_id": chat_id, "user_id": user_id, "kind": "decay", "delta": delta}
+        for user_id, delta in result
+    ]
+    await record_point_events(session, events)
+    return len(events)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.tracing import traced
+from db.models import Chat, ChatUser, DailyPoints, DigestDelivery, Post, Reaction, User
+
+
+@dataclass(frozen=True)
+class DigestEntry:
+    user_id: int
+    telegram_id: int
+    reposts_made: int
+    reposts_received: int
+    # Net points earned over the week, and the current total.
+    week_points: float
+    points: float
+    # Recent posts by others the member has not reacted to (what /todo lists).
+    owed: int
+
+
+@traced
+async def digest_chats(session: AsyncSession) -> list[tuple[int, str | None]]:
+    result = await session.execute(
+        select(Chat.telegram_chat_id, Chat.title).order_by(Chat.telegram_chat_id)
+    )
+    return [tuple(row) for row in result]
+
+
+@traced
+async def get_digest_entries(
+    session: AsyncSession, chat_id: int, week: date, owed_since: datetime
+) -> list[DigestEntry]:
+    """
+    Digest stats of every member active in the 7 days before `week` (made or
+    received a repost), in one query: weekly totals from daily_points, owed posts
+    as recent posts by others minus those the member reacted to. Members who
+    blocked the bot are left out.
+    """
+    made = func.sum(DailyPoints.reposts_made)
+    received = func.sum(DailyPoints.reposts_received)
+    weekly = (
+        select(
+            DailyPoints.user_id,
+            made.label("made"),
+            received.label("received"),
+            func.sum(DailyPoints.points_gained - DailyPoints.points_lost).label("points"),
+        )
+        .where(
+            DailyPoints.chat_id == chat_id,
+            DailyPoints.day >= week - timedelta(days=7),
+            DailyPoints.day < week,
+        )
+        .group_by(DailyPoints.user_id)
+        .having(made + received > 0)
+        .subquery("weekly")
+    )
+    recent = (Post.chat_id == chat_id) & (Post.created_at >= owed_since)
+    own_posts = (
+        select(Post.user_id, func.count().label("posts"))
+        .where(recent)
+        .group_by(Post.user_id)
+        .subquery("own_posts")
+    )
+    reacted = (
+        select(
+            Reaction.reactor_user_id.label("user_id"),
+            func.count(func.distinct(Reaction.post_id)).label("posts"),
+        )
+        .join(Post, Post.id == Reaction.post_id)
+        .where(recent, Post.user_id != Reaction.reactor_user_id)
+        .group_by(Reaction.reactor_user_id)
+        .subquery("reacted")
+    )
+    recent_posts = select(func.count()).select_from(Post).where(recent).scalar_subquery()
+    owed = (
+        recent_posts
+        - func.coalesce(own_posts.c.posts, 0)
+        - func.coalesce(reacted.c.posts, 0)
+    )
+
+    stmt = (
+        select(
+            User.id,
+            User.telegram_id,
+            weekly.c.made,
+            weekly.c.received,
+            weekly.c.points,
+            ChatUser.points,
+            owed,
+        )
+        .join(weekly, weekly.c.user_id == User.id)
+        .join(ChatUser, (ChatUser.chat_id == chat_id) & (ChatUser.user_id == User.id))
+        .outerjoin(own_posts, own_posts.c.user_id == User.id)
+        .outerjoin(reacted, reacted.c.user_id == User.id)
+        .where(User.dm_blocked_at.is_(None))
+        .order_by(User.id)
+    )
+    result = await session.execute(stmt)
+    return [
+        DigestEntry(
+            user_id=user_id,
+            telegram_id=telegram_id,
+            reposts_made=int(made_count),
+            reposts_received=int(received_count),
+            week_points=float(week_points or 0.0),
+            points=points,
+            owed=max(int(owed_count), 0),
+        )
+        for user_id, telegram_id, made_count, received_count, week_points, points, owed_count
+        in result
+    ]
+
+
+@traced
+async def claim_digests(
+    session: AsyncSession, week: date, chat_id: int, user_ids: list[int]
+) -> set[int]:
+    """Claim the week's digest for these members; returns those not claimed before."""
+    if not user_ids:
+        return set()
+    stmt = (
+        pg_insert(DigestDelivery)
+        .values([{"week": week, "chat_id": chat_id, "user_id": user_id} for user_id in user_ids])
+        .on_conflict_do_nothing()
+        .returning(DigestDelivery.user_id)
+    )
+    result = await session.execute(stmt)
+    return set(result.scalars())
+
+
+@traced
+async def finish_digests(
+    session: AsyncSession,
+    week: date,
+    chat_id: int,
+    sent: list[int],
+    blocked: list[int],
+    failed: list[int],
+) -> None:
+    """
+    Record the outcome of claimed digests. Failed claims are released so a later
+    run that week retries them; blocked users are flagged and skipped from now on.
+    """
+    claims = (DigestDelivery.week == week) & (DigestDelivery.chat_id == chat_id)
+    for status, user_ids in (("sent", sent), ("blocked", blocked)):
+        if user_ids:
+            await session.execute(
+                update(DigestDelivery)
+                .where(claims, DigestDelivery.user_id.in_(user_ids))
+                .values(status=status)
+            )
+    if failed:
+        await session.execute(
+            delete(DigestDelivery).where(claims, DigestDelivery.user_id.in_(failed))
+        )
+    if blocked:
+        await session.execute(
+            update(User).where(User.id.in_(blocked)).values(dm_blocked_at=datetime.utcnow())
+        )
+
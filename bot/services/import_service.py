@@ -0,0 +1,222 @@
+"""
+Bulk weight import from CSV/TSV.
+
+Each row is `user, weight` where user is a numeric Telegram id or a @username.
+Rows are parsed lazily and applied in batches, one upsert into chat_users per batch,
+so a large file is never held in memory.
+"""
+
+from __future__ import annotations
+
+import csv
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, TextIO
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.tracing import traced
+from db.models import ChatUser, User
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 20
+
+
+@dataclass(frozen=True)
+class WeightRow:
+    line: int
+    telegram_id: int | None
+    username: str | None
+    weight: float
+
+    @property
+    def label(self) -> str:
+        return f"@{self.username}" if self.username else str(self.telegram_id)
+
+
+@dataclass
+class ImportReport:
+    dry_run: bool
+    rows: int = 0
+    applied: int = 0
+    created_users: int = 0
+    error_count: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def error(self, line: int, message: str) -> None:
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {message}")
+
+    def summary(self) -> str:
+        verb = "Would set" if self.dry_run else "Set"
+        lines = [f"{verb} {self.applied} of {self.rows} weights."]
+        if self.created_users:
+            lines.append(f"{self.created_users} Telegram ids were not known yet and were added.")
+        if self.error_count:
+            lines.append(f"{self.error_count} rows skipped:")
+            lines.extend(self.errors)
+            if self.error_count > len(self.errors):
+                lines.append(f"... and {self.error_count - len(self.errors)} more")
+        if self.dry_run:
+            lines.append("Dry run: nothing was changed.")
+        return "\n".join(lines)
+
+
+def _dialect(first_line: str) -> str:
+    if "\t" in first_line:
+        return "excel-tab"
+    return "excel"
+
+
+def parse_weight_rows(fh: TextIO, report: ImportReport) -> Iterator[WeightRow]:
+    """Yield valid rows from an open CSV/TSV file; invalid rows go to `report`."""
+    first_line = fh.readline()
+    fh.seek(0)
+    delimiter = ";" if ";" in first_line and "," not in first_line else None
+    reader = (
+        csv.reader(fh, delimiter=delimiter)
+        if delimiter
+        else csv.reader(fh, dialect=_dialect(first_line))
+    )
+
+    for row in reader:
+        line = reader.line_num
+        cells = [cell.strip() for cell in row]
+        if not any(cells) or cells[0].startswith("#"):
+            continue
+        if len(cells) < 2:
+            report.rows += 1
+            report.error(line, "expected `user, weight`")
+            continue
+        user, weight_text = cells[0], cells[1]
+        try:
+            weight = float(weight_text)
+        except ValueError:
+            if line == 1:
+                continue  # header row
+            report.rows += 1
+            report.error(line, f"weight {weight_text!r} is not a number")
+            continue
+
+        report.rows += 1
+        if not weight > 0 or weight == float("inf"):
+            report.error(line, "weight must be a positive number")
+            continue
+        if user.lstrip("-").isdigit():
+            yield WeightRow(line, int(user), None, weight)
+        elif user.lstrip("@"):
+            yield WeightRow(line, None, user.lstrip("@"), weight)
+        else:
+            report.error(line, "missing user")
+
+
+def _batches(rows: Iterable[WeightRow], size: int) -> Iterator[list[WeightRow]]:
+    batch: list[WeightRow] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@traced
+async def _apply_batch(
+    session: AsyncSession, chat_id: int, batch: list[WeightRow], report: ImportReport
+) -> None:
+    telegram_ids = {row.telegram_id for row in batch if row.telegram_id is not None}
+    usernames = {row.username.lower() for row in batch if row.username is not None}
+
+    by_telegram_id: dict[int, int] = {}
+    if telegram_ids:
+        result = await session.execute(
+            select(User.telegram_id, User.id).where(User.telegram_id.in_(telegram_ids))
+        )
+        by_telegram_id = dict(result.all())
+    by_username: dict[str, int] = {}
+    if usernames:
+        # Ascending ids: the newest row, i.e. the most recent holder of a username, wins.
+        result = await session.execute(
+            select(func.lower(User.username), User.id)
+            .where(func.lower(User.username).in_(usernames))
+            .order_by(User.id)
+        )
+        by_username = dict(result.all())
+
+    # A Telegram id is authoritative, so users we have not seen yet can be added.
+    missing = telegram_ids - by_telegram_id.keys()
+    if missing:
+        report.created_users += len(missing)
+        if not report.dry_run:
+            await session.execute(
+                pg_insert(User)
+                .values([{"telegram_id": telegram_id} for telegram_id in missing])
+                .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            )
+            result = await session.execute(
+                select(User.telegram_id, User.id).where(User.telegram_id.in_(missing))
+            )
+            by_telegram_id.update(result.all())
+
+    # users.id -> weight; a later row for the same user overrides an earlier one.
+    weights: dict[int, float] = {}
+    for row in batch:
+        if row.telegram_id is not None:
+            user_id = by_telegram_id.get(row.telegram_id)
+            if user_id is None and report.dry_run:
+                report.applied += 1
+                continue
+        else:
+            user_id = by_username.get(row.username.lower())
+            if user_id is None:
+                report.error(row.line, f"unknown user {row.label}")
+                continue
+        weights[user_id] = row.weight
+        report.applied += 1
+
+    if report.dry_run or not weights:
+        return
+    stmt = pg_insert(ChatUser).values(
+        [
+            {"chat_id": chat_id, "user_id": user_id, "weight": weight}
+            for user_id, weight in weights.items()
+        ]
+    )
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[ChatUser.chat_id, ChatUser.user_id],
+            set_={"weight": stmt.excluded.weight},
+        )
+    )
+
+
+@traced
+async def import_weights(
+    session: AsyncSession,
+    chat_id: int,
+    fh: TextIO,
+    dry_run: bool,
+    batch_size: int = BATCH_SIZE,
+) -> ImportReport:
+    """
+    Apply the weights in `fh` to `chat_id` in the caller's transaction.
+    Valid rows are applied even if other rows have errors; use dry_run to check first.
+    """
+    report = ImportReport(dry_run=dry_run)
+    for batch in _batches(parse_weight_rows(fh, report), batch_size):
+        await _apply_batch(session, chat_id, batch, report)
+    logger.info(
+        "Weight import for chat %s: %s rows, %s applied, %s errors (dry run: %s)",
+        chat_id,
+        report.rows,
+        report.applied,
+        report.error_count,
+        dry_run,
+    )
+    return report
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import partial
+
+from sqlalchemy import (
+    BigInteger,
+    Float,
+    Integer,
+    column,
+    func,
+    insert,
+    select,
+    union_all,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from bot.services.analytics_service import record_reactions
+from bot.tracing import traced
+from db.database import after_commit
+from db.models import ChatUser, DailyPoints, PointEvent, Post, Reaction
+
+
+@dataclass(frozen=True)
+class CreditedReaction:
+    """A newly recorded reaction whose points still have to be applied."""
+
+    reaction_id: int
+    reactor: ChatUser
+    owner: ChatUser
+    # Multiplier of the reaction's emoji.
+    multiplier: float = 1.0
+
+
+@traced
+async def add_points(
+    session: AsyncSession, deltas: dict[tuple[int, int], float]
+) -> dict[tuple[int, int], float]:
+    """
+    Add (chat_id, user_id) -> delta to chat_users.points in one statement and return
+    the new totals.
+
+    The increment happens in SQL (points = points + delta), so concurrent writers such
+    as a running recompute never lose each other's updates.
+    """
+    if not deltas:
+        return {}
+    delta_rows = values(
+        column("chat_id", BigInteger),
+        column("user_id", Integer),
+        column("delta", Float),
+        name="deltas",
+    ).data([(chat_id, user_id, delta) for (chat_id, user_id), delta in deltas.items()])
+    table = ChatUser.__table__
+    result = await session.execute(
+        update(table)
+        .where(table.c.chat_id == delta_rows.c.chat_id, table.c.user_id == delta_rows.c.user_id)
+        .values(points=table.c.points + delta_rows.c.delta)
+        .returning(table.c.chat_id, table.c.user_id, table.c.points)
+    )
+    return {(chat_id, user_id): points for chat_id, user_id, points in result}
+
+
+@traced
+async def record_point_events(session: AsyncSession, events: list[dict]) -> None:
+    """Append rows to the point_events ledger (see PointEvent for the columns)."""
+    if events:
+        await session.execute(insert(PointEvent), events)
+
+
+@traced
+async def add_daily_rollups(
+    session: AsyncSession, day: date, rollups: dict[tuple[int, int], list[float]]
+) -> None:
+    """
+    Add (chat_id, user_id) -> [points_gained, points_lost, reposts_made,
+    reposts_received] to the day's daily_points rows in one upsert.
+    """
+    if not rollups:
+        return
+    stmt = pg_insert(DailyPoints).values(
+        [
+            {
+                "chat_id": chat_id,
+                "day": day,
+                "user_id": user_id,
+                "points_gained": gained,
+                "points_lost": lost,
+                "reposts_made": int(made),
+                "reposts_received": int(received),
+            }
+            for (chat_id, user_id), (gained, lost, made, received) in rollups.items()
+        ]
+    )
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[DailyPoints.chat_id, DailyPoints.day, DailyPoints.user_id],
+            set_={
+                "points_gained": DailyPoints.points_gained + stmt.excluded.points_gained,
+                "points_lost": DailyPoints.points_lost + stmt.excluded.points_lost,
+                "reposts_made": DailyPoints.reposts_made + stmt.excluded.reposts_made,
+                "reposts_received": DailyPoints.reposts_received
+                + stmt.excluded.reposts_received,
+            },
+        )
+    )
+
+
+@traced
+async def apply_reaction_points(
+    session: AsyncSession, credited: list[CreditedReaction]
+) -> list[tuple[float, float]]:
+    """
+    Move points for each reaction and return (reactor_gain, owner_loss) per reaction.
+
+    Reactor gains points based on post owner's weight (they did a repost).
+    Post owner loses points based on reactor's weight (they owe a repost).
+    Both are scaled by the multiplier of the reaction's emoji.
+    """
+    changes: list[tuple[float, float]] = []
+    deltas: dict[tuple[int, int], float] = {}
+    members: dict[tuple[int, int], ChatUser] = {}
+    events: list[dict] = []
+    rollups: dict[tuple[int, int], list[float]] = {}
+    for item in credited:
+        reactor_points_gain = item.multiplier * item.owner.weight
+        owner_points_loss = item.multiplier * item.reactor.weight
+        reactor_key = (item.reactor.chat_id, item.reactor.user_id)
+        owner_key = (item.owner.chat_id, item.owner.user_id)
+        deltas[reactor_key] = deltas.get(reactor_key, 0.0) + reactor_points_gain
+        deltas[owner_key] = deltas.get(owner_key, 0.0) - owner_points_loss
+        members[reactor_key] = item.reactor
+        members[owner_key] = item.owner
+        reactor_rollup = rollups.setdefault(reactor_key, [0.0, 0.0, 0, 0])
+        reactor_rollup[0] += reactor_points_gain
+        reactor_rollup[2] += 1
+        owner_rollup = rollups.setdefault(owner_key, [0.0, 0.0, 0, 0])
+        owner_rollup[1] += owner_points_loss
+        owner_rollup[3] += 1
+        changes.append((reactor_points_gain, owner_points_loss))
+        events.append(
+            {
+                "chat_id": item.reactor.chat_id,
+                "user_id": item.reactor.user_id,
+                "kind": "reaction",
+                "delta": reactor_points_gain,
+                "reaction_id": item.reaction_id,
+                "counterparty_user_id": item.owner.user_id,
+                "weight": item.owner.weight,
+            }
+        )
+        events.append(
+            {
+                "chat_id": item.owner.chat_id,
+                "user_id": item.owner.user_id,
+                "kind": "reaction",
+                "delta": -owner_points_loss,
+                "reaction_id": item.reaction_id,
+                "counterparty_user_id": item.reactor.user_id,
+                "weight": item.reactor.weight,
+            }
+        )
+
+    # Flush pending rows (e.g. newly created members) before updating them in SQL.
+    await session.flush()
+    for key, points in (await add_points(session, deltas)).items():
+        set_committed_value(members[key], "points", points)
+    await record_point_events(session, events)
+    # Reactions are stamped with utcnow (see Reaction.created_at), so are their days.
+    await add_daily_rollups(session, datetime.utcnow().date(), rollups)
+    # The cached matrices only count reactions once they are committed: a rolled back
+    # (and later replayed) reaction must not be counted, let alone twice.
+    by_chat: dict[int, list[tuple[int, int, int]]] = {}
+    for item in credited:
+        by_chat.setdefault(item.reactor.chat_id, []).append(
+            (item.reaction_id, item.reactor.user_id, item.owner.user_id)
+        )
+    for chat_id, reactions in by_chat.items():
+        after_commit(session, partial(record_reactions, chat_id, reactions))
+    return changes
+
+
+@traced
+async def count_chat_reactions(session: AsyncSession, chat_id: int) -> int:
+    result = await session.execute(
+        select(func.count(Reaction.id))
+        .join(Post, Post.id == Reaction.post_id)
+        .where(Post.chat_id == chat_id, Reaction.reactor_user_id != Post.user_id)
+    )
+    return result.scalar_one()
+
+
+@traced
+async def recompute_chat_points(session: AsyncSession, chat_id: int) -> int:
+    """
+    Recompute chat_users.points of a chat from its full reaction history using the
+    members' current weights, in one set-based UPDATE. Returns the number of members
+    whose points changed; each change is written to the ledger as a reweight event.
+
+    Reactions already deleted by retention keep the points they were credited with:
+    their ledger events (reaction_id set to NULL) are added as they are. So are the
+    decay steps applied so far, so a weight change only rescales the reaction-derived
+    part of the points instead of undoing decay.
+    """
+    table = ChatUser.__table__
+
+    # Lock the chat's members first: reactions already being applied commit before we
+    # read the history, and ones that start later add their points on top of ours.
+    await session.execute(
+        select(table.c.user_id).where(table.c.chat_id == chat_id).with_for_update()
+    )
+
+    weights = (
+        select(table.c.user_id, table.c.weight)
+        .where(table.c.chat_id == chat_id)
+        .cte("weights")
+    )
+    credited = (
+        select(
+            Reaction.reactor_user_id.label("reactor_id"),
+            Post.user_id.label("owner_id"),
+            Reaction.multiplier,
+        )
+        .join(Post, Post.id == Reaction.post_id)
+        .where(Post.chat_id == chat_id, Reaction.reactor_user_id != Post.user_id)
+        .cte("credited")
+    )
+    owner_weights = weights.alias("owner_weights")
+    reactor_weights = weights.alias("reactor_weights")
+    # Reactor gains the owner's weight, owner loses the reactor's weight, both scaled by
+    # the reaction's emoji multiplier.
+    gains = select(
+        credited.c.reactor_id.label("user_id"),
+        (func.coalesce(owner_weights.c.weight, 1.0) * credited.c.multiplier).label("delta"),
+    ).outerjoin(owner_weights, owner_weights.c.user_id == credited.c.owner_id)
+    losses = select(
+        credited.c.owner_id.label("user_id"),
+        (-func.coalesce(reactor_weights.c.weight, 1.0) * credited.c.multiplier).label("delta"),
+    ).outerjoin(reactor_weights, reactor_weights.c.user_id == credited.c.reactor_id)
+    archived = select(PointEvent.user_id, PointEvent.delta).where(
+        PointEvent.chat_id == chat_id,
+        PointEvent.kind == "reaction",
+        PointEvent.reaction_id.is_(None),
+    )
+    decayed = select(PointEvent.user_id, PointEvent.delta).where(
+        PointEvent.chat_id == chat_id, PointEvent.kind == "decay"
+    )
+    deltas = union_all(gains, losses, archived, decayed).subquery("deltas")
+    totals = (
+        select(deltas.c.user_id, func.sum(deltas.c.delta).label("points"))
+        .group_by(deltas.c.user_id)
+        .subquery("totals")
+    )
+    # Members without any credited reaction go back to zero.
+    new_points = (
+        select(weights.c.user_id, func.coalesce(totals.c.points, 0.0).label("points"))
+        .outerjoin(totals, totals.c.user_id == weights.c.user_id)
+        .subquery("new_points")
+    )
+    # A second scan of chat_users sees the points from before this UPDATE.
+    old = table.alias("old")
+    result = await session.execute(
+        update(table)
+        .where(
+            table.c.chat_id == chat_id,
+            table.c.user_id == new_points.c.user_id,
+            old.c.chat_id == table.c.chat_id,
+            old.c.user_id == table.c.user_id,
+            table.c.points.is_distinct_from(new_points.c.points),
+        )
+        .values(points=new_points.c.points)
+        .returning(table.c.user_id, new_points.c.points - old.c.points)
+    )
+    adjustments = [
+        {"chat_id": chat_id, "user_id": user_id, "kind": "reweight", "delta": delta}
+        for user_id, delta in result
+    ]
+    await record_point_events(session, adjustments)
+    return len(adjustments)
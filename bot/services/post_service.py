@@ -1,28 +1,102 @@
-from sqlalchemy import select
+from datetime import datetime
+from typing import Sequence
+
+from sqlalchemy import exists, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, selectinload
 
+from bot.cache import chat_cache
+from bot.tracing import traced
+from db.database import after_commit
 from db.models import Post, Reaction, User
 
 
+def cache_posts_on_commit(
+    session: AsyncSession, chat_id: int, posts: Sequence[tuple[int, int | None, datetime]]
+) -> None:
+    """
+    Add new posts, as (message_id, url_hash, created_at), to the chat's tracked-post
+    index and recent links once they are committed: a rolled back post must not make
+    later posts of its link look like duplicates.
+    """
+
+    def add() -> None:
+        chat_cache.add_posts(chat_id, [message_id for message_id, _hash, _at in posts])
+        for message_id, link_hash, created_at in posts:
+            if link_hash is not None:
+                chat_cache.add_link(chat_id, link_hash, message_id, created_at)
+
+    if posts:
+        after_commit(session, add)
+
+
+@traced
 async def create_post(
     session: AsyncSession,
     user: User,
     message_id: int,
     chat_id: int,
     topic_id: int | None = None,
+    url_hash: int | None = None,
 ) -> Post:
     post = Post(
         user_id=user.id,
         message_id=message_id,
         chat_id=chat_id,
         topic_id=topic_id,
+        url_hash=url_hash,
     )
     session.add(post)
     await session.flush()
+    cache_posts_on_commit(session, chat_id, [(message_id, url_hash, post.created_at)])
     return post
 
 
+@traced
+async def find_post_by_url(
+    session: AsyncSession, chat_id: int, url_hash: int, since: datetime
+) -> int | None:
+    """
+    Message id of the chat's first post of the link created since `since`, or None.
+    Recent links are answered from the cache, the rest with one ix_posts_chat_url lookup.
+    """
+    cached = chat_cache.recent_link(chat_id, url_hash, since)
+    if cached is not None:
+        return cached
+    result = await session.execute(
+        select(Post.message_id, Post.created_at)
+        .where(Post.chat_id == chat_id, Post.url_hash == url_hash, Post.created_at >= since)
+        .order_by(Post.created_at)
+        .limit(1)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    message_id, created_at = row
+    chat_cache.add_link(chat_id, url_hash, message_id, created_at)
+    return message_id
+
+
+@traced
+async def recent_url_hashes(
+    session: AsyncSession, chat_id: int, url_hashes: set[int], since: datetime
+) -> set[int]:
+    """Which of the link hashes were posted in the chat since `since`."""
+    if not url_hashes:
+        return set()
+    result = await session.execute(
+        select(Post.url_hash)
+        .where(
+            Post.chat_id == chat_id,
+            Post.url_hash.in_(url_hashes),
+            Post.created_at >= since,
+        )
+        .distinct()
+    )
+    return set(result.scalars())
+
+
+@traced
 async def get_post_by_message(
     session: AsyncSession, message_id: int, chat_id: int
 ) -> Post | None:
@@ -35,8 +109,9 @@ async def get_post_by_message(
     return result.scalar_one_or_none()
 
 
+@traced
 async def add_reaction(
-    session: AsyncSession, post: Post, reactor: User
+    session: AsyncSession, post: Post, reactor: User, multiplier: float = 1.0
 ) -> Reaction | None:
     # Check if reaction already exists
     stmt = select(Reaction).where(
@@ -48,12 +123,13 @@ async def add_reaction(
     if existing is not None:
         return None
 
-    reaction = Reaction(post_id=post.id, reactor_user_id=reactor.id)
+    reaction = Reaction(post_id=post.id, reactor_user_id=reactor.id, multiplier=multiplier)
     session.add(reaction)
     await session.flush()
     return reaction
 
 
+@traced
 async def reaction_exists(
     session: AsyncSession, post_id: int, reactor_user_id: int
 ) -> bool:
@@ -62,3 +138,39 @@ async def reaction_exists(
     )
     result = await session.execute(stmt)
     return result.scalar_one_or_none() is not None
+
+
+@traced
+async def get_unreacted_posts(
+    session: AsyncSession,
+    chat_id: int,
+    user_id: int,
+    since: datetime,
+    before: tuple[datetime, int] | None = None,
+    limit: int = 10,
+) -> list[Post]:
+    """
+    Other members' posts created since `since` that the user has not reacted to,
+    newest first. Pass the (created_at, id) of the last post of a page as `before`
+    to get the next one.
+
+    The posts are a range scan of ix_posts_chat_created bounded by the horizon and
+    the cursor, and each is checked against uq_reaction_post_reactor, so the cost
+    does not depend on how many reactions the user has made.
+    """
+    stmt = (
+        select(Post)
+        .options(joinedload(Post.user))
+        .where(
+            Post.chat_id == chat_id,
+            Post.created_at >= since,
+            Post.user_id != user_id,
+            ~exists().where(Reaction.post_id == Post.id, Reaction.reactor_user_id == user_id),
+        )
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .limit(limit)
+    )
+    if before is not None:
+        stmt = stmt.where(tuple_(Post.created_at, Post.id) < tuple_(*before))
+    result = await session.execute(stmt)
+    return list(result.scalars())
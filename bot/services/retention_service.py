@@ -0,0 +1,178 @@
+"""
+Retention: fold old reactions into per-member counters and delete old rows.
+
+Each function handles one bounded batch so the caller can commit between batches and
+no statement holds locks on a large part of the tables.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import Integer, column, delete, exists, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bot.services.points_service import record_point_events
+from bot.tracing import traced
+from db.models import Chat, ChatUser, PointEvent, Post, Reaction
+
+
+@traced
+async def archive_posts(
+    session: AsyncSession, chat_id: int, cutoff: datetime, batch_size: int
+) -> tuple[int, list[int]]:
+    """
+    Delete up to `batch_size` of the chat's posts whose reactions are all older than
+    `cutoff` (or that have none), together with those reactions, adding the reactions
+    to the members' archived repost counters. Returns (reactions deleted, message ids
+    of the posts deleted).
+
+    A post and its reactions go in the same batch: with the post gone a reaction to it
+    is no longer tracked, while a post kept without the reactions already counted
+    would let a member remove and re-add one and be credited for it again.
+    """
+    # A reaction is never older than its post, so old posts bound the search. The
+    # lock keeps reactions from being added while the post is archived.
+    doomed = (
+        select(Post.id)
+        .where(
+            Post.chat_id == chat_id,
+            Post.created_at < cutoff,
+            ~exists().where(Reaction.post_id == Post.id, Reaction.created_at >= cutoff),
+        )
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    post_ids = list((await session.execute(doomed)).scalars())
+    if not post_ids:
+        return 0, []
+
+    await _archive_unledgered_points(session, chat_id, post_ids)
+    result = await session.execute(
+        delete(Reaction)
+        .where(Reaction.post_id.in_(post_ids), Reaction.post_id == Post.id)
+        .returning(Reaction.reactor_user_id, Post.user_id)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+
+    made: dict[int, int] = {}
+    received: dict[int, int] = {}
+    for reactor_id, owner_id in rows:
+        if reactor_id == owner_id:
+            continue  # self-reactions never count as reposts
+        made[reactor_id] = made.get(reactor_id, 0) + 1
+        received[owner_id] = received.get(owner_id, 0) + 1
+    if made or received:
+        counts = values(
+            column("user_id", Integer),
+            column("made", Integer),
+            column("received", Integer),
+            name="counts",
+        ).data(
+            [
+                (user_id, made.get(user_id, 0), received.get(user_id, 0))
+                for user_id in made.keys() | received.keys()
+            ]
+        )
+        table = ChatUser.__table__
+        await session.execute(
+            update(table)
+            .where(table.c.chat_id == chat_id, table.c.user_id == counts.c.user_id)
+            .values(
+                archived_reposts_made=table.c.archived_reposts_made + counts.c.made,
+                archived_reposts_received=table.c.archived_reposts_received + counts.c.received,
+            )
+        )
+
+    result = await session.execute(
+        delete(Post)
+        .where(Post.id.in_(post_ids))
+        .returning(Post.message_id)
+        .execution_options(synchronize_session=False)
+    )
+    return len(rows), list(result.scalars())
+
+
+@traced
+async def _archive_unledgered_points(
+    session: AsyncSession, chat_id: int, post_ids: list[int]
+) -> None:
+    """
+    Reactions older than the ledger have no events of their own: their points are
+    part of the members' opening balances, and /reweight recomputes them from the
+    reaction rows. Before such reactions are deleted, write their points as archived
+    reaction events (reaction_id NULL, at the current weights, as /reweight would
+    credit them) and take the same amount out of the opening balances, so the ledger
+    sums stay the same and recomputes keep counting them.
+    """
+    result = await session.execute(
+        select(Reaction.reactor_user_id, Post.user_id, Reaction.multiplier)
+        .join(Post, Post.id == Reaction.post_id)
+        .where(
+            Reaction.post_id.in_(post_ids),
+            Reaction.reactor_user_id != Post.user_id,
+            ~exists().where(PointEvent.reaction_id == Reaction.id),
+        )
+    )
+    rows = result.all()
+    if not rows:
+        return
+    member_ids = {user_id for row in rows for user_id in row[:2]}
+    result = await session.execute(
+        select(ChatUser.user_id, ChatUser.weight).where(
+            ChatUser.chat_id == chat_id, ChatUser.user_id.in_(member_ids)
+        )
+    )
+    weights = dict(result.all())
+
+    events = []
+    opening: dict[int, float] = {}
+    for reactor_id, owner_id, multiplier in rows:
+        owner_weight = weights.get(owner_id, 1.0)
+        reactor_weight = weights.get(reactor_id, 1.0)
+        gain = owner_weight * multiplier
+        loss = reactor_weight * multiplier
+        events.append(
+            {
+                "chat_id": chat_id,
+                "user_id": reactor_id,
+                "kind": "reaction",
+                "delta": gain,
+                "counterparty_user_id": owner_id,
+                "weight": owner_weight,
+            }
+        )
+        events.append(
+            {
+                "chat_id": chat_id,
+                "user_id": owner_id,
+                "kind": "reaction",
+                "delta": -loss,
+                "counterparty_user_id": reactor_id,
+                "weight": reactor_weight,
+            }
+        )
+        opening[reactor_id] = opening.get(reactor_id, 0.0) - gain
+        opening[owner_id] = opening.get(owner_id, 0.0) + loss
+    await record_point_events(session, events)
+    await record_point_events(
+        session,
+        [
+            {"chat_id": chat_id, "user_id": user_id, "kind": "opening", "delta": delta}
+            for user_id, delta in opening.items()
+            if delta
+        ],
+    )
+
+
+@traced
+async def chats_with_retention(session: AsyncSession) -> list[tuple[int, int]]:
+    """(chat_id, retention_days) of every chat with a retention policy."""
+    result = await session.execute(
+        select(Chat.telegram_chat_id, Chat.retention_days).where(
+            Chat.retention_days.is_not(None)
+        )
+    )
+    return [(chat_id, days) for chat_id, days in result]
+
@@ -1,9 +1,11 @@
 from dataclasses import dataclass
+from datetime import datetime, timedelta
 
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from db.models import ChatUser, Post, Reaction, User
+from bot.tracing import traced
+from db.models import ChatUser, DailyPoints, Post, Reaction, User
 
 
 @dataclass
@@ -14,6 +16,7 @@ class UserStats:
     weight: float
 
 
+@traced
 async def get_user_stats(session: AsyncSession, chat_id: int, user: User) -> UserStats:
     # Count reposts made (reactions given to others' posts)
     reposts_made_stmt = (
@@ -46,6 +49,10 @@ async def get_user_stats(session: AsyncSession, chat_id: int, user: User) -> Use
     chat_user = cu_result.scalar_one_or_none()
     points = chat_user.points if chat_user else 0.0
     weight = chat_user.weight if chat_user else 1.0
+    if chat_user:
+        # Reposts whose reactions were deleted by retention.
+        reposts_made += chat_user.archived_reposts_made
+        reposts_received += chat_user.archived_reposts_received
 
     return UserStats(
         reposts_made=reposts_made,
@@ -55,6 +62,7 @@ async def get_user_stats(session: AsyncSession, chat_id: int, user: User) -> Use
     )
 
 
+@traced
 async def get_leaderboard(
     session: AsyncSession, chat_id: int, limit: int = 10
 ) -> list[tuple[User, UserStats]]:
@@ -75,3 +83,55 @@ async def get_leaderboard(
         leaderboard.append((user, stats))
 
     return leaderboard
+
+
+@traced
+async def get_window_leaderboard(
+    session: AsyncSession, chat_id: int, days: int, limit: int = 10
+) -> list[tuple[User, UserStats]]:
+    """
+    Leaderboard over the last `days` days (today included), by net points earned in
+    that window. Reads only the daily_points rows of the window.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    net_points = func.sum(DailyPoints.points_gained - DailyPoints.points_lost)
+    window = (
+        select(
+            DailyPoints.user_id,
+            net_points.label("points"),
+            func.sum(DailyPoints.reposts_made).label("reposts_made"),
+            func.sum(DailyPoints.reposts_received).label("reposts_received"),
+        )
+        .where(DailyPoints.chat_id == chat_id, DailyPoints.day >= since)
+        .group_by(DailyPoints.user_id)
+        .order_by(net_points.desc())
+        .limit(limit)
+        .subquery("window")
+    )
+    stmt = (
+        select(
+            User,
+            window.c.points,
+            window.c.reposts_made,
+            window.c.reposts_received,
+            func.coalesce(ChatUser.weight, 1.0),
+        )
+        .join(window, window.c.user_id == User.id)
+        .outerjoin(
+            ChatUser, (ChatUser.chat_id == chat_id) & (ChatUser.user_id == User.id)
+        )
+        .order_by(window.c.points.desc())
+    )
+    result = await session.execute(stmt)
+    return [
+        (
+            user,
+            UserStats(
+                reposts_made=int(made),
+                reposts_received=int(received),
+                points=points,
+                weight=weight,
+            ),
+        )
+        for user, points, made, received, weight in result
+    ]
@@ -0,0 +1,406 @@
+"""
+Tracked events (hashtag posts and reactions) and how they are applied to the database.
+
+Handlers turn updates into events and apply them immediately; when the database is
+unavailable the same events are written to the local journal and applied later by the
+replayer, so applying an event must be idempotent.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from telegram import MessageEntity, Update
+
+from bot.cache import chat_cache
+from bot.config import get_config
+from bot.links import extract_url, url_hash
+from bot.services.chat_service import (
+    EffectiveChatSettings,
+    get_chat_settings,
+    normalize_hashtag,
+)
+from bot.services.points_service import CreditedReaction, apply_reaction_points
+from bot.services.post_service import (
+    add_reaction,
+    cache_posts_on_commit,
+    create_post,
+    find_post_by_url,
+    get_post_by_message,
+    recent_url_hashes,
+)
+from bot.services.user_service import (
+    get_or_create_chat_user,
+    get_or_create_chat_users,
+    get_or_create_chat_users_by_user_id,
+)
+from bot.tracing import traced
+from db.models import Post, Reaction, User
+
+logger = logging.getLogger(__name__)
+
+# Hashtags of journaled events written before events carried their entities.
+HASHTAG_RE = re.compile(r"#(\w+)")
+
+
+@dataclass(frozen=True)
+class PostEvent:
+    chat_id: int
+    message_id: int
+    topic_id: int | None
+    telegram_id: int
+    username: str | None
+    content: str
+    # Normalized hashtag entities of the message (see normalize_hashtag).
+    hashtags: tuple[str, ...] = ()
+
+    kind = "post"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"kind": self.kind, **asdict(self)}
+
+
+@dataclass(frozen=True)
+class ReactionEvent:
+    chat_id: int
+    message_id: int
+    telegram_id: int
+    username: str | None
+    emojis: tuple[str, ...]
+
+    kind = "reaction"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"kind": self.kind, **asdict(self)}
+
+
+TrackedEvent = PostEvent | ReactionEvent
+
+
+@dataclass(frozen=True)
+class DuplicateLink:
+    """A hashtag post repeating a link already posted in the chat within the window."""
+
+    original_message_id: int
+
+
+def event_from_dict(data: dict[str, Any]) -> TrackedEvent:
+    fields = {k: v for k, v in data.items() if k != "kind"}
+    if data["kind"] == PostEvent.kind:
+        hashtags = fields.get("hashtags") or HASHTAG_RE.findall(fields["content"])
+        fields["hashtags"] = tuple(tag.lower() for tag in hashtags)
+        return PostEvent(**fields)
+    if data["kind"] == ReactionEvent.kind:
+        fields["emojis"] = tuple(fields["emojis"])
+        return ReactionEvent(**fields)
+    raise ValueError(f"Unknown event kind: {data['kind']!r}")
+
+
+def post_event_from_update(update: Update) -> PostEvent | None:
+    message = update.message
+    if not message or not message.from_user:
+        return None
+    content = (message.text or message.caption or "").strip()
+    if not content:
+        return None
+    if message.text:
+        entities = message.parse_entities([MessageEntity.HASHTAG])
+    else:
+        entities = message.parse_caption_entities([MessageEntity.HASHTAG])
+    return PostEvent(
+        chat_id=message.chat_id,
+        message_id=message.message_id,
+        topic_id=getattr(message, "message_thread_id", None),
+        telegram_id=message.from_user.id,
+        username=message.from_user.username,
+        content=content,
+        hashtags=tuple(normalize_hashtag(tag) for tag in entities.values()),
+    )
+
+
+def reaction_event_from_update(update: Update) -> ReactionEvent | None:
+    reaction_update = update.message_reaction
+    if not reaction_update or not reaction_update.user:
+        return None
+    # Only regular emoji can match; custom emoji have no `emoji` attribute.
+    emojis = tuple(
+        emoji
+        for emoji in (getattr(r, "emoji", None) for r in reaction_update.new_reaction or [])
+        if emoji
+    )
+    if not emojis:
+        return None
+    return ReactionEvent(
+        chat_id=reaction_update.chat.id,
+        message_id=reaction_update.message_id,
+        telegram_id=reaction_update.user.id,
+        username=reaction_update.user.username,
+        emojis=emojis,
+    )
+
+
+def group_by_chat(events: Sequence[TrackedEvent]) -> dict[int, list[TrackedEvent]]:
+    """Split events by chat, keeping their order within each chat."""
+    groups: dict[int, list[TrackedEvent]] = {}
+    for event in events:
+        groups.setdefault(event.chat_id, []).append(event)
+    return groups
+
+
+def _post_matches(settings: EffectiveChatSettings, event: PostEvent) -> bool:
+    if not settings.matches_hashtags(event.hashtags):
+        return False
+    # Check if we're in the correct topic (if configured)
+    if settings.topic_id is not None and event.topic_id != settings.topic_id:
+        return False
+    return True
+
+
+def _link_hash(event: PostEvent) -> int | None:
+    url = extract_url(event.content)
+    if not url:
+        return None
+    try:
+        return url_hash(url)
+    except ValueError:
+        # Unparseable (e.g. "http://[abc/reel"): tracked as a post without a link.
+        return None
+
+
+def _duplicate_since() -> datetime | None:
+    """Oldest creation time of a post a new one can duplicate; None if disabled."""
+    hours = get_config().duplicate_window_hours
+    return datetime.utcnow() - timedelta(hours=hours) if hours > 0 else None
+
+
+@traced
+async def track_post(
+    session: AsyncSession, event: PostEvent
+) -> tuple[User, Post] | DuplicateLink | None:
+    """
+    Record a hashtag post. Returns None if the chat is not set up, the message does not
+    match the chat's settings, or the post was already recorded, and DuplicateLink if
+    its link was already posted within DUPLICATE_WINDOW_HOURS (nothing is recorded).
+    """
+    settings = await get_chat_settings(session, event.chat_id)
+    if settings is None or not _post_matches(settings, event):
+        return None
+
+    # A miss in the tracked-post index is authoritative; anything else asks the DB.
+    if (
+        chat_cache.post_known(event.chat_id, event.message_id) is not False
+        and await get_post_by_message(session, event.message_id, event.chat_id) is not None
+    ):
+        return None
+
+    link_hash = _link_hash(event)
+    since = _duplicate_since()
+    if link_hash is not None and since is not None:
+        original = await find_post_by_url(session, event.chat_id, link_hash, since)
+        if original is not None:
+            return DuplicateLink(original)
+
+    user, _chat_user = await get_or_create_chat_user(
+        session, event.chat_id, event.telegram_id, event.username
+    )
+    post = await create_post(
+        session, user, event.message_id, event.chat_id, event.topic_id, link_hash
+    )
+    return user, post
+
+
+@traced
+async def track_reaction(session: AsyncSession, event: ReactionEvent) -> bool:
+    """
+    Record a repost confirmation and move points. Returns True if points changed.
+    """
+    settings = await get_chat_settings(session, event.chat_id)
+    if settings is None:
+        return False
+    multiplier = settings.reaction_multiplier(event.emojis)
+    if multiplier is None:
+        return False
+
+    # Most reactions are on messages that are not tracked posts; skip the lookup.
+    if chat_cache.post_known(event.chat_id, event.message_id) is False:
+        return False
+
+    post = await get_post_by_message(session, event.message_id, event.chat_id)
+    if not post:
+        logger.debug(
+            "Post not found for message %s in chat %s", event.message_id, event.chat_id
+        )
+        return False
+
+    reactor_user_row, reactor_chat_user = await get_or_create_chat_user(
+        session, event.chat_id, event.telegram_id, event.username
+    )
+
+    # Don't allow self-reactions
+    if reactor_user_row.telegram_id == post.user.telegram_id:
+        logger.debug("Ignoring self-reaction")
+        return False
+
+    reaction = await add_reaction(session, post, reactor_user_row, multiplier)
+    if reaction is None:
+        logger.debug("Reaction already exists")
+        return False
+
+    post_owner_user_row, post_owner_chat_user = await get_or_create_chat_user(
+        session, event.chat_id, post.user.telegram_id, post.user.username
+    )
+
+    [(reactor_points_gain, owner_points_loss)] = await apply_reaction_points(
+        session,
+        [CreditedReaction(reaction.id, reactor_chat_user, post_owner_chat_user, multiplier)],
+    )
+
+    logger.info(
+        "Reaction recorded: user %s reposted for user %s. "
+        "Reactor gained %.1f, owner lost %.1f",
+        reactor_user_row.telegram_id,
+        post_owner_user_row.telegram_id,
+        reactor_points_gain,
+        owner_points_loss,
+    )
+    return True
+
+
+@traced
+async def track_batch(
+    session: AsyncSession, chat_id: int, events: Sequence[TrackedEvent]
+) -> tuple[int, int]:
+    """
+    Apply many events of one chat with a handful of bulk statements instead of a few
+    queries per event. Same rules and idempotency as track_post/track_reaction.
+    Returns (posts_created, reactions_credited).
+    """
+    settings = await get_chat_settings(session, chat_id)
+    if settings is None:
+        return 0, 0
+
+    post_events = [e for e in events if isinstance(e, PostEvent) and _post_matches(settings, e)]
+    link_hashes = {
+        e.message_id: link_hash for e in post_events if (link_hash := _link_hash(e)) is not None
+    }
+    since = _duplicate_since()
+    if link_hashes and since is not None:
+        # Drop repeats of links posted earlier or earlier in the batch; a replayed
+        # post finds itself, but it is already recorded anyway.
+        seen = await recent_url_hashes(session, chat_id, set(link_hashes.values()), since)
+        unique_events = []
+        for e in post_events:
+            link_hash = link_hashes.get(e.message_id)
+            if link_hash in seen:
+                continue
+            if link_hash is not None:
+                seen.add(link_hash)
+            unique_events.append(e)
+        post_events = unique_events
+    # (event, emoji multiplier) of the reactions with a tracked emoji
+    reaction_events = [
+        (e, multiplier)
+        for e in events
+        if isinstance(e, ReactionEvent)
+        and (multiplier := settings.reaction_multiplier(e.emojis)) is not None
+    ]
+    if not post_events and not reaction_events:
+        return 0, 0
+
+    usernames: dict[int, str | None] = {}
+    for event in (*post_events, *(e for e, _multiplier in reaction_events)):
+        usernames[event.telegram_id] = event.username or usernames.get(event.telegram_id)
+    members = await get_or_create_chat_users(session, chat_id, usernames)
+
+    posts_created = 0
+    if post_events:
+        rows: dict[int, dict[str, Any]] = {}
+        for e in post_events:
+            rows.setdefault(
+                e.message_id,
+                {
+                    "message_id": e.message_id,
+                    "chat_id": chat_id,
+                    "topic_id": e.topic_id,
+                    "user_id": members[e.telegram_id][0].id,
+                    "url_hash": link_hashes.get(e.message_id),
+                },
+            )
+        result = await session.execute(
+            pg_insert(Post)
+            .values(list(rows.values()))
+            .on_conflict_do_nothing(constraint="uq_post_message_chat")
+            .returning(Post.message_id, Post.url_hash, Post.created_at)
+        )
+        created = result.all()
+        cache_posts_on_commit(session, chat_id, created)
+        posts_created = len(created)
+
+    if not reaction_events:
+        return posts_created, 0
+
+    result = await session.execute(
+        select(Post.id, Post.message_id, Post.user_id).where(
+            Post.chat_id == chat_id,
+            Post.message_id.in_({e.message_id for e, _multiplier in reaction_events}),
+        )
+    )
+    posts_by_message = {
+        message_id: (post_id, owner_id) for post_id, message_id, owner_id in result
+    }
+
+    # (post_id, reactor_user_id) -> (owner user id, multiplier), first occurrence wins
+    candidates: dict[tuple[int, int], tuple[int, float]] = {}
+    for event, multiplier in reaction_events:
+        post = posts_by_message.get(event.message_id)
+        if post is None:
+            continue
+        post_id, owner_id = post
+        reactor_id = members[event.telegram_id][0].id
+        if reactor_id == owner_id:
+            continue
+        candidates.setdefault((post_id, reactor_id), (owner_id, multiplier))
+    if not candidates:
+        return posts_created, 0
+
+    result = await session.execute(
+        pg_insert(Reaction)
+        .values(
+            [
+                {"post_id": post_id, "reactor_user_id": reactor_id, "multiplier": multiplier}
+                for (post_id, reactor_id), (_owner_id, multiplier) in candidates.items()
+            ]
+        )
+        .on_conflict_do_nothing(constraint="uq_reaction_post_reactor")
+        .returning(Reaction.id, Reaction.post_id, Reaction.reactor_user_id)
+    )
+    inserted = result.all()
+    if not inserted:
+        return posts_created, 0
+
+    chat_users = await get_or_create_chat_users_by_user_id(
+        session,
+        chat_id,
+        {candidates[(post_id, reactor_id)][0] for _id, post_id, reactor_id in inserted}
+        | {reactor_id for _id, _post_id, reactor_id in inserted},
+    )
+    await apply_reaction_points(
+        session,
+        [
+            CreditedReaction(
+                reaction_id,
+                chat_users[reactor_id],
+                chat_users[candidates[(post_id, reactor_id)][0]],
+                candidates[(post_id, reactor_id)][1],
+            )
+            for reaction_id, post_id, reactor_id in inserted
+        ],
+    )
+    return posts_created, len(inserted)
@@ -1,12 +1,130 @@
-from sqlalchemy import select
+from __future__ import annotations
+
+from collections import OrderedDict
+from functools import partial
+from typing import Iterator
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
+from bot import metrics
+from bot.config import get_config
+from bot.tracing import traced
+from db.database import after_commit
 from db.models import ChatUser, User
 
 
+class UserIdentityCache:
+    """
+    Bounded LRU of telegram_id -> (users.id, last known username).
+
+    The mapping never changes once a user row exists, so a hit lets us hand out a User
+    without a query. Only rows read back from the database are cached; a row created
+    in the current transaction could still be rolled back. For the same reason
+    username changes reach the cache once committed (_put_on_commit).
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._entries: OrderedDict[int, tuple[int, str | None]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, telegram_id: int) -> tuple[int, str | None] | None:
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            metrics.incr("users.identity_cache.miss")
+            return None
+        self._entries.move_to_end(telegram_id)
+        metrics.incr("users.identity_cache.hit")
+        return entry
+
+    def put(self, telegram_id: int, user_id: int, username: str | None) -> None:
+        if self.capacity <= 0:
+            return
+        self._entries[telegram_id] = (user_id, username)
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def forget_username(self, telegram_id: int) -> None:
+        entry = self._entries.get(telegram_id)
+        if entry is not None:
+            self._entries[telegram_id] = (entry[0], None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def items(self) -> Iterator[tuple[int, tuple[int, str | None]]]:
+        """Entries from least to most recently used."""
+        return iter(self._entries.items())
+
+
+_identities: UserIdentityCache | None = None
+
+
+def get_identity_cache() -> UserIdentityCache:
+    global _identities
+    if _identities is None:
+        _identities = UserIdentityCache(get_config().user_cache_size)
+    return _identities
+
+
+async def _cached_user(
+    session: AsyncSession, telegram_id: int, user_id: int, username: str | None
+) -> User:
+    """Attach a User for a known row to the session without loading it."""
+    user = User(id=user_id, telegram_id=telegram_id, username=username)
+    make_transient_to_detached(user)
+    return await session.merge(user, load=False)
+
+
+def _put_on_commit(
+    session: AsyncSession, telegram_id: int, user_id: int, username: str | None
+) -> None:
+    after_commit(session, partial(get_identity_cache().put, telegram_id, user_id, username))
+
+
+async def _release_usernames(session: AsyncSession, claims: dict[int, str]) -> None:
+    """
+    A username belongs to its most recent holder: clear the usernames in `claims`
+    (users.id -> username just seen) from any other user row.
+    """
+    if not claims:
+        return
+    result = await session.execute(
+        update(User)
+        .where(
+            func.lower(User.username).in_({username.lower() for username in claims.values()}),
+            User.id.not_in(list(claims)),
+        )
+        .values(username=None)
+        .returning(User.telegram_id)
+    )
+    identities = get_identity_cache()
+    for telegram_id in result.scalars():
+        after_commit(session, partial(identities.forget_username, telegram_id))
+
+
+@traced
 async def get_or_create_user(
     session: AsyncSession, telegram_id: int, username: str | None = None
 ) -> User:
+    identities = get_identity_cache()
+    cached = identities.get(telegram_id)
+    if cached is not None:
+        user_id, known_username = cached
+        user = await _cached_user(session, telegram_id, user_id, known_username)
+        if username and known_username != username:
+            user.username = username
+            await session.flush()
+            await _release_usernames(session, {user_id: username})
+            _put_on_commit(session, telegram_id, user_id, username)
+        return user
+
     stmt = select(User).where(User.telegram_id == telegram_id)
     result = await session.execute(stmt)
     user = result.scalar_one_or_none()
@@ -15,13 +133,21 @@ async def get_or_create_user(
         user = User(telegram_id=telegram_id, username=username)
         session.add(user)
         await session.flush()
-    elif username and user.username != username:
+        if username:
+            await _release_usernames(session, {user.id: username})
+        return user
+
+    if username and user.username != username:
         user.username = username
         await session.flush()
-
+        await _release_usernames(session, {user.id: username})
+        _put_on_commit(session, telegram_id, user.id, username)
+    else:
+        identities.put(telegram_id, user.id, user.username)
     return user
 
 
+@traced
 async def get_or_create_chat_user(
     session: AsyncSession, chat_id: int, telegram_id: int, username: str | None = None
 ) -> tuple[User, ChatUser]:
@@ -41,6 +167,90 @@ async def get_or_create_chat_user(
     return user, chat_user
 
 
+@traced
+async def get_or_create_chat_users_by_user_id(
+    session: AsyncSession, chat_id: int, user_ids: set[int]
+) -> dict[int, ChatUser]:
+    """Bulk version of the ChatUser half of get_or_create_chat_user, keyed by users.id."""
+    if not user_ids:
+        return {}
+    await session.execute(
+        pg_insert(ChatUser)
+        .values([{"chat_id": chat_id, "user_id": user_id} for user_id in user_ids])
+        .on_conflict_do_nothing(index_elements=[ChatUser.chat_id, ChatUser.user_id])
+    )
+    stmt = select(ChatUser).where(ChatUser.chat_id == chat_id, ChatUser.user_id.in_(user_ids))
+    result = await session.execute(stmt)
+    return {chat_user.user_id: chat_user for chat_user in result.scalars()}
+
+
+@traced
+async def get_or_create_chat_users(
+    session: AsyncSession, chat_id: int, usernames: dict[int, str | None]
+) -> dict[int, tuple[User, ChatUser]]:
+    """
+    Bulk version of get_or_create_chat_user for many users at once.
+    `usernames` maps telegram_id -> latest known username; the result is keyed by
+    telegram_id.
+    """
+    if not usernames:
+        return {}
+
+    identities = get_identity_cache()
+    users: dict[int, User] = {}
+    claims: dict[int, str] = {}
+    unknown: dict[int, str | None] = {}
+    for telegram_id, username in usernames.items():
+        cached = identities.get(telegram_id)
+        if cached is None:
+            unknown[telegram_id] = username
+            continue
+        user_id, known_username = cached
+        user = await _cached_user(session, telegram_id, user_id, known_username)
+        if username and known_username != username:
+            user.username = username
+            claims[user_id] = username
+            _put_on_commit(session, telegram_id, user_id, username)
+        users[telegram_id] = user
+
+    if unknown:
+        result = await session.execute(
+            pg_insert(User)
+            .values(
+                [
+                    {"telegram_id": telegram_id, "username": username}
+                    for telegram_id, username in unknown.items()
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            .returning(User.telegram_id)
+        )
+        created = set(result.scalars())
+        result = await session.execute(select(User).where(User.telegram_id.in_(unknown)))
+        for user in result.scalars():
+            username = unknown[user.telegram_id]
+            if user.telegram_id in created:
+                if username:
+                    claims[user.id] = username
+            elif username and user.username != username:
+                user.username = username
+                claims[user.id] = username
+                _put_on_commit(session, user.telegram_id, user.id, username)
+            else:
+                identities.put(user.telegram_id, user.id, user.username)
+            users[user.telegram_id] = user
+
+    chat_users = await get_or_create_chat_users_by_user_id(
+        session, chat_id, {user.id for user in users.values()}
+    )
+    await session.flush()
+    await _release_usernames(session, claims)
+    return {
+        telegram_id: (user, chat_users[user.id]) for telegram_id, user in users.items()
+    }
+
+
+@traced
 async def get_user_by_telegram_id(
     session: AsyncSession, telegram_id: int
 ) -> User | None:
@@ -49,18 +259,52 @@ async def get_user_by_telegram_id(
     return result.scalar_one_or_none()
 
 
-async def get_user_by_username(session: AsyncSession, username: str) -> User | None:
-    clean_username = username.lstrip("@")
-    stmt = select(User).where(User.username == clean_username)
-    result = await session.execute(stmt)
+@traced
+async def get_users_by_id(session: AsyncSession, user_ids: list[int]) -> dict[int, User]:
+    if not user_ids:
+        return {}
+    result = await session.execute(select(User).where(User.id.in_(user_ids)))
+    return {user.id: user for user in result.scalars()}
+
+
+@traced
+async def get_user_by_username(
+    session: AsyncSession, username: str, chat_id: int | None = None
+) -> User | None:
+    """
+    Case-insensitive lookup (uses ix_users_username_lower). With chat_id, only members
+    of that chat match. If several rows still share a username, the newest row wins.
+    """
+    clean_username = username.lstrip("@").lower()
+    if not clean_username:
+        return None
+    stmt = select(User).where(func.lower(User.username) == clean_username)
+    if chat_id is not None:
+        stmt = stmt.join(
+            ChatUser, (ChatUser.user_id == User.id) & (ChatUser.chat_id == chat_id)
+        )
+    result = await session.execute(stmt.order_by(User.id.desc()).limit(1))
     return result.scalar_one_or_none()
 
 
+@traced
+async def clear_dm_blocked(session: AsyncSession, telegram_id: int) -> bool:
+    """The user (re)started a private chat with the bot; returns whether they were blocked."""
+    result = await session.execute(
+        update(User)
+        .where(User.telegram_id == telegram_id, User.dm_blocked_at.is_not(None))
+        .values(dm_blocked_at=None)
+    )
+    return result.rowcount > 0
+
+
+@traced
 async def set_chat_user_weight(session: AsyncSession, chat_user: ChatUser, weight: float) -> None:
     chat_user.weight = weight
     await session.flush()
 
 
+@traced
 async def update_chat_user_points(
     session: AsyncSession, chat_user: ChatUser, points_delta: float
 ) -> None:
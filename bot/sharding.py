@@ -0,0 +1,43 @@
+"""
+Which chats this process is responsible for.
+
+In multi-process mode (WORKERS > 1, see bot.workers) every chat belongs to exactly one
+worker, picked by shard_of(chat_id). The front sends a chat's updates to that worker
+only, so the worker's in-process caches (bot.cache) stay authoritative for the chats
+it owns, and per-chat jobs (retention, decay) and the warm-up only cover those chats.
+A single process owns every chat.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy import ColumnElement, func, true
+
+_shard = 0
+_workers = 1
+
+
+def shard_of(chat_id: int, workers: int) -> int:
+    # abs() so Python and Postgres (where % keeps the dividend's sign) agree on the
+    # negative ids of groups.
+    return abs(chat_id) % workers
+
+
+def set_shard(shard: int, workers: int) -> None:
+    global _shard, _workers
+    _shard, _workers = shard, workers
+
+
+def is_lead_worker() -> bool:
+    """Whether this process runs the bot-wide jobs (e.g. the weekly digest)."""
+    return _shard == 0
+
+
+def owns_chat(chat_id: int) -> bool:
+    return _workers == 1 or shard_of(chat_id, _workers) == _shard
+
+
+def owned_chats(chat_id_column: ColumnElement[int]) -> ColumnElement[bool]:
+    """SQL condition matching the chats this process owns."""
+    if _workers == 1:
+        return true()
+    return func.abs(chat_id_column) % _workers == _shard
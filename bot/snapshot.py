@@ -0,0 +1,330 @@
+"""
+Snapshot of the in-process caches (bot.cache and the user identity cache) for warm
+restarts.
+
+Written on shutdown and loaded on startup instead of the warm-up queries. The file is
+a small header followed by tagged sections; numeric data is stored as native int64
+arrays aligned to 8 bytes, so loading maps the file and reads the arrays in place.
+
+    header:  magic, version, byte-order mark, created_at,
+             max posts.id, max chat_admins.id, chat_admins count, chats count, max users.id
+    section: tag (4 bytes), padding, length, data padded to 8 bytes
+
+On load the counters in the header are compared with the database: tracked posts
+written after the snapshot are topped up by posts.id, and settings or admin sets are
+dropped if their tables changed. An unknown version or a database that went
+backwards (restored from backup) discards the whole snapshot.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+from array import array
+
+from sqlalchemy import func, select
+
+from bot.cache import PostIndex, chat_cache
+from bot.config import get_config
+from bot.services.chat_service import EffectiveChatSettings
+from bot.services.user_service import get_identity_cache
+from db.database import get_session
+from db.models import Chat, ChatAdmin, Post, User
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RPBSNAP\x00"
+VERSION = 3
+BYTE_ORDER_MARK = 0x0102030405060708
+
+_HEADER = struct.Struct("=8sIqdqqqqq")
+_SECTION = struct.Struct("=4s4xQ")
+
+# Section tags
+_META = b"META"  # JSON: default settings the effective settings were derived from
+_SETTINGS = b"SETS"  # JSON: [[chat_id, [tag, ...], [[emoji, multiplier], ...], topic_id], ...]
+_ADMIN_CHATS = b"ADMC"  # int64 pairs: chat_id, number of admins
+_ADMIN_USERS = b"ADMU"  # int64: admin telegram user ids, grouped by chat
+_POST_CHATS = b"PIDC"  # int64 triples: chat_id, floor, number of message ids
+_POST_IDS = b"PIDM"  # int64: tracked message ids, grouped by chat
+_USER_IDS = b"UIDP"  # int64 pairs: telegram_id, users.id (least recently used first)
+_USERNAMES = b"UIDN"  # JSON: last known usernames, same order as UIDP
+
+
+class SnapshotError(Exception):
+    pass
+
+
+async def _db_counters() -> tuple[int, int, int, int, int]:
+    """(max posts.id, max chat_admins.id, chat_admins count, chats count, max users.id)"""
+    async with get_session() as session:
+        result = await session.execute(
+            select(
+                select(func.coalesce(func.max(Post.id), 0)).scalar_subquery(),
+                select(func.coalesce(func.max(ChatAdmin.id), 0)).scalar_subquery(),
+                select(func.count(ChatAdmin.id)).scalar_subquery(),
+                select(func.count(Chat.telegram_chat_id)).scalar_subquery(),
+                select(func.coalesce(func.max(User.id), 0)).scalar_subquery(),
+            )
+        )
+        return tuple(result.one())
+
+
+def _defaults() -> dict[str, str]:
+    cfg = get_config()
+    return {"hashtag": cfg.default_hashtag, "reaction_emoji": cfg.default_reaction_emoji}
+
+
+def _section(tag: bytes, data: bytes) -> bytes:
+    padding = -len(data) % 8
+    return _SECTION.pack(tag, len(data)) + data + b"\x00" * padding
+
+
+def encode_snapshot(counters: tuple[int, int, int, int, int]) -> bytes:
+    settings = [
+        [chat_id, sorted(s.hashtags), s.reaction_emojis, s.topic_id]
+        for chat_id, s in chat_cache.settings.items()
+        if s is not None
+    ]
+
+    admin_chats = array("q")
+    admin_users = array("q")
+    for chat_id, admin_ids in chat_cache.admins.items():
+        admin_chats.extend((chat_id, len(admin_ids)))
+        admin_users.extend(admin_ids)
+
+    post_chats = array("q")
+    post_ids = array("q")
+    for chat_id, index in chat_cache.posts.items():
+        post_chats.extend((chat_id, index.floor, len(index.message_ids)))
+        post_ids.extend(index.message_ids)
+
+    user_ids = array("q")
+    usernames: list[str | None] = []
+    for telegram_id, (user_id, username) in get_identity_cache().items():
+        user_ids.extend((telegram_id, user_id))
+        usernames.append(username)
+
+    return b"".join(
+        (
+            _HEADER.pack(MAGIC, VERSION, BYTE_ORDER_MARK, time.time(), *counters),
+            _section(_META, json.dumps(_defaults()).encode()),
+            _section(_SETTINGS, json.dumps(settings, ensure_ascii=False).encode()),
+            _section(_ADMIN_CHATS, admin_chats.tobytes()),
+            _section(_ADMIN_USERS, admin_users.tobytes()),
+            _section(_POST_CHATS, post_chats.tobytes()),
+            _section(_POST_IDS, post_ids.tobytes()),
+            _section(_USER_IDS, user_ids.tobytes()),
+            _section(_USERNAMES, json.dumps(usernames, ensure_ascii=False).encode()),
+        )
+    )
+
+
+def decode_snapshot(buffer: memoryview) -> tuple[tuple[int, ...], float, dict[bytes, memoryview]]:
+    """Return (counters, created_at, sections) without copying the section data."""
+    if len(buffer) < _HEADER.size:
+        raise SnapshotError("truncated header")
+    magic, version, bom, created_at, *counters = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise SnapshotError("not a snapshot file")
+    if version != VERSION:
+        raise SnapshotError(f"unsupported version {version}")
+    if bom != BYTE_ORDER_MARK:
+        raise SnapshotError("written on a machine with a different byte order")
+
+    sections: dict[bytes, memoryview] = {}
+    offset = _HEADER.size
+    while offset < len(buffer):
+        if offset + _SECTION.size > len(buffer):
+            raise SnapshotError("truncated section header")
+        tag, length = _SECTION.unpack_from(buffer, offset)
+        offset += _SECTION.size
+        if offset + length > len(buffer):
+            raise SnapshotError(f"truncated section {tag!r}")
+        sections[tag] = buffer[offset : offset + length]
+        offset += length + (-length % 8)
+    return tuple(counters), created_at, sections
+
+
+def _int64s(sections: dict[bytes, memoryview], tag: bytes) -> memoryview:
+    return sections[tag].cast("q")
+
+
+def _settings_from(sections: dict[bytes, memoryview]) -> dict[int, EffectiveChatSettings]:
+    return {
+        chat_id: EffectiveChatSettings(
+            frozenset(hashtags),
+            tuple((emoji, multiplier) for emoji, multiplier in reaction_emojis),
+            topic_id,
+        )
+        for chat_id, hashtags, reaction_emojis, topic_id in json.loads(
+            bytes(sections[_SETTINGS])
+        )
+    }
+
+
+def _admins_from(sections: dict[bytes, memoryview]) -> dict[int, set[int]]:
+    chats = _int64s(sections, _ADMIN_CHATS)
+    users = _int64s(sections, _ADMIN_USERS)
+    admins: dict[int, set[int]] = {}
+    start = 0
+    for i in range(0, len(chats), 2):
+        count = chats[i + 1]
+        admins[chats[i]] = set(users[start : start + count])
+        start += count
+    return admins
+
+
+def _posts_from(sections: dict[bytes, memoryview]) -> dict[int, PostIndex]:
+    chats = _int64s(sections, _POST_CHATS)
+    ids = _int64s(sections, _POST_IDS)
+    posts: dict[int, PostIndex] = {}
+    start = 0
+    for i in range(0, len(chats), 3):
+        count = chats[i + 2]
+        posts[chats[i]] = PostIndex(chats[i + 1], ids[start : start + count])
+        start += count
+    return posts
+
+
+def _users_from(sections: dict[bytes, memoryview]) -> list[tuple[int, int, str | None]]:
+    ids = _int64s(sections, _USER_IDS)
+    usernames = json.loads(bytes(sections[_USERNAMES]))
+    if len(usernames) * 2 != len(ids):
+        raise SnapshotError("user id and username sections do not match")
+    return [(ids[2 * i], ids[2 * i + 1], username) for i, username in enumerate(usernames)]
+
+
+async def write_snapshot(path: str) -> bool:
+    """Write the caches to `path` if they were bulk-loaded. Returns True on success."""
+    if not chat_cache.loaded:
+        logger.info("Chat caches are not fully loaded; not writing a snapshot")
+        return False
+    started = time.monotonic()
+    try:
+        data = encode_snapshot(await _db_counters())
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except Exception:
+        logger.exception("Failed to write cache snapshot to %s", path)
+        return False
+    logger.info(
+        "Cache snapshot written to %s (%d bytes, %.0f ms)",
+        path,
+        len(data),
+        (time.monotonic() - started) * 1000,
+    )
+    return True
+
+
+def read_snapshot(path: str) -> tuple[tuple[int, ...], float, dict, dict, dict, dict, list] | None:
+    """
+    Map and parse the snapshot at `path`. Returns
+    (counters, created_at, defaults, settings, admins, posts, users), or None if missing.
+    """
+    try:
+        fh = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    with fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buffer = memoryview(mm)
+            error = None
+            try:
+                counters, created_at, sections = decode_snapshot(buffer)
+                parsed = (
+                    counters,
+                    created_at,
+                    json.loads(bytes(sections[_META])),
+                    _settings_from(sections),
+                    _admins_from(sections),
+                    _posts_from(sections),
+                    _users_from(sections),
+                )
+            except (SnapshotError, KeyError, ValueError, TypeError, struct.error) as e:
+                error = str(e) or type(e).__name__
+            # Every view into the map has to be gone before it can be closed, including
+            # the ones referenced from a traceback.
+            sections = None
+            buffer.release()
+    if error is not None:
+        raise SnapshotError(error)
+    return parsed
+
+
+async def restore_snapshot(path: str) -> bool:
+    """
+    Install the caches from the snapshot at `path`. Returns False if there is no
+    usable snapshot, in which case the caller should warm up from the database.
+    """
+    started = time.monotonic()
+    chat_cache.begin_load()
+    try:
+        snapshot = read_snapshot(path)
+        if snapshot is None:
+            chat_cache.abort_load()
+            return False
+        counters, created_at, defaults, settings, admins, posts, users = snapshot
+        snap_post_id, snap_admin_id, snap_admin_count, snap_chat_count, snap_user_id = counters
+
+        db_post_id, db_admin_id, db_admin_count, db_chat_count, db_user_id = await _db_counters()
+        if db_post_id < snap_post_id or db_user_id < snap_user_id:
+            raise SnapshotError("database is older than the snapshot")
+        if db_chat_count != snap_chat_count or defaults != _defaults():
+            logger.info("Chats changed since the snapshot; settings will be loaded lazily")
+            settings = {}
+        if (db_admin_id, db_admin_count) != (snap_admin_id, snap_admin_count):
+            logger.info("Chat admins changed since the snapshot; admins will be loaded lazily")
+            admins = {}
+
+        topped_up = 0
+        if db_post_id > snap_post_id:
+            async with get_session() as session:
+                result = await session.stream(
+                    select(Post.chat_id, Post.message_id).where(Post.id > snap_post_id)
+                )
+                async for chat_id, message_id in result:
+                    index = posts.get(chat_id)
+                    if index is not None:
+                        index.message_ids.add(message_id)
+                    topped_up += 1
+    except SnapshotError as e:
+        chat_cache.abort_load()
+        logger.warning("Ignoring cache snapshot %s: %s", path, e)
+        return False
+    except Exception:
+        chat_cache.abort_load()
+        logger.exception("Failed to restore cache snapshot %s", path)
+        return False
+    except BaseException:
+        chat_cache.abort_load()
+        raise
+
+    chat_cache.install(settings, admins, posts)
+    identities = get_identity_cache()
+    for telegram_id, user_id, username in users:
+        identities.put(telegram_id, user_id, username)
+    logger.info(
+        "Caches restored from snapshot taken %.0f s ago "
+        "(%d chats, %d post indexes, %d posts topped up, %d users) in %.0f ms",
+        time.time() - created_at,
+        len(settings),
+        len(posts),
+        topped_up,
+        len(identities),
+        (time.monotonic() - started) * 1000,
+    )
+    return True
@@ -0,0 +1,245 @@
+"""
+Lightweight in-process tracing.
+
+One trace is started per incoming update (see bot.application.BotApplication); service
+calls, SQL statements and Bot API requests made while handling it become child spans.
+Finished spans are exported as JSON lines by a background thread so the event loop
+never blocks on file IO.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+from telegram.request import HTTPXRequest
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        end_ns = self.end_ns or time.time_ns()
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class JsonlSpanExporter:
+    """Appends finished spans to a JSONL file from a daemon thread."""
+
+    _STOP = object()
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="span-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self._path, "a", encoding="utf-8") as fh:
+            while True:
+                item = self._queue.get()
+                if item is self._STOP:
+                    break
+                lines = [json.dumps(item.to_dict(), default=str)]
+                # Drain whatever else is queued so we write in batches.
+                stop = False
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        stop = True
+                        break
+                    lines.append(json.dumps(item.to_dict(), default=str))
+                fh.write("\n".join(lines) + "\n")
+                fh.flush()
+                if stop:
+                    break
+
+
+class Tracer:
+    def __init__(self, sample_rate: float, exporter: JsonlSpanExporter | None) -> None:
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None and self.sample_rate > 0.0
+
+    def should_sample(self) -> bool:
+        if not self.enabled:
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def finish(self, span: Span) -> None:
+        span.end_ns = time.time_ns()
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+
+_tracer = Tracer(0.0, None)
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def configure_tracing(sample_rate: float, export_path: str) -> None:
+    global _tracer
+    exporter = JsonlSpanExporter(export_path) if sample_rate > 0.0 else None
+    _tracer = Tracer(sample_rate, exporter)
+    if exporter is not None:
+        logger.info("Tracing enabled (sample rate %.3f) -> %s", sample_rate, export_path)
+
+
+def shutdown_tracing() -> None:
+    if _tracer.exporter is not None:
+        _tracer.exporter.shutdown()
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def begin_span(name: str, **attributes: Any) -> Span | None:
+    """
+    Open a child of the current span without making it current.
+    Used for leaf spans whose start/end happen in separate callbacks (SQL events).
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return None
+    return Span(
+        name=name,
+        trace_id=parent.trace_id,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+
+
+def end_span(span: Span | None, error: BaseException | None = None) -> None:
+    if span is None:
+        return
+    if error is not None:
+        span.error = f"{type(error).__name__}: {error}"
+    _tracer.finish(span)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """Start a root span, subject to sampling. Yields None when not sampled."""
+    if not _tracer.should_sample():
+        yield None
+        return
+
+    span = Span(
+        name=name,
+        trace_id=secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=None,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _current_span.reset(token)
+        _tracer.finish(span)
+
+
+@contextmanager
+def start_span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """Start a child span of the current span; a no-op outside a sampled trace."""
+    span = begin_span(name, **attributes)
+    if span is None:
+        yield None
+        return
+
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _current_span.reset(token)
+        _tracer.finish(span)
+
+
+def traced(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Wrap an async service function in a child span named after its module and name."""
+    module = func.__module__.rsplit(".", 1)[-1]
+    name = f"{module}.{func.__name__}"
+
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> T:
+        if _current_span.get() is None:
+            return await func(*args, **kwargs)
+        with start_span(name):
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+class TracedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest that records a span for every Bot API call."""
+
+    async def do_request(self, url: str, method: str, *args: Any, **kwargs: Any):
+        span = begin_span(f"bot_api.{url.rsplit('/', 1)[-1]}", http_method=method)
+        try:
+            status, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception as exc:
+            end_span(span, exc)
+            raise
+        if span is not None:
+            span.attributes["status_code"] = status
+        end_span(span)
+        return status, payload
@@ -0,0 +1,118 @@
+"""
+Startup warm-up of the in-process chat caches (bot.cache).
+
+Runs as a background task from post_init so polling starts immediately; until it
+finishes, lookups simply fall through to the database.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+from sqlalchemy import func, select
+
+from bot.cache import PostIndex, chat_cache
+from bot.services.chat_service import EffectiveChatSettings, settings_for_chat
+from bot.sharding import owned_chats
+from db.database import get_session
+from db.models import Chat, ChatAdmin, Post
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK = 5_000
+
+
+async def load_chat_state(
+    posts_per_chat: int,
+) -> tuple[dict[int, EffectiveChatSettings], dict[int, set[int]], dict[int, PostIndex]]:
+    started = time.monotonic()
+    settings: dict[int, EffectiveChatSettings] = {}
+    admins: dict[int, set[int]] = {}
+    post_ids: dict[int, list[int]] = {}
+
+    async with get_session() as session:
+        result = await session.stream_scalars(
+            select(Chat)
+            .where(owned_chats(Chat.telegram_chat_id))
+            .execution_options(yield_per=STREAM_CHUNK)
+        )
+        async for chat in result:
+            settings[chat.telegram_chat_id] = settings_for_chat(chat)
+        logger.info(
+            "Warm-up: %s chat settings loaded (%.1f s)", len(settings), time.monotonic() - started
+        )
+
+        result = await session.stream(
+            select(ChatAdmin.chat_id, ChatAdmin.telegram_user_id)
+            .where(owned_chats(ChatAdmin.chat_id))
+            .execution_options(yield_per=STREAM_CHUNK)
+        )
+        admin_count = 0
+        async for chat_id, telegram_user_id in result:
+            admins.setdefault(chat_id, set()).add(telegram_user_id)
+            admin_count += 1
+        logger.info(
+            "Warm-up: %s admins in %s chats loaded (%.1f s)",
+            admin_count,
+            len(admins),
+            time.monotonic() - started,
+        )
+
+        # The newest `posts_per_chat` tracked message ids of every chat.
+        ranked = (
+            select(
+                Post.chat_id,
+                Post.message_id,
+                func.row_number()
+                .over(partition_by=Post.chat_id, order_by=Post.message_id.desc())
+                .label("rank"),
+            )
+            .where(owned_chats(Post.chat_id))
+            .subquery()
+        )
+        result = await session.stream(
+            select(ranked.c.chat_id, ranked.c.message_id)
+            .where(ranked.c.rank <= posts_per_chat)
+            .execution_options(yield_per=STREAM_CHUNK)
+        )
+        post_count = 0
+        async for chat_id, message_id in result:
+            post_ids.setdefault(chat_id, []).append(message_id)
+            post_count += 1
+        logger.info(
+            "Warm-up: %s tracked posts loaded (%.1f s)", post_count, time.monotonic() - started
+        )
+
+    posts: dict[int, PostIndex] = {}
+    for chat_id in settings:
+        ids = post_ids.get(chat_id, [])
+        # If the chat has more posts than we loaded, only ids above the oldest loaded one
+        # are covered; otherwise every post of the chat is in the index.
+        floor = min(ids) if len(ids) >= posts_per_chat else 0
+        posts[chat_id] = PostIndex(floor, ids)
+    return settings, admins, posts
+
+
+async def warm_up(timeout: float, posts_per_chat: int) -> None:
+    started = time.monotonic()
+    chat_cache.begin_load()
+    try:
+        settings, admins, posts = await asyncio.wait_for(
+            load_chat_state(posts_per_chat), timeout
+        )
+    except asyncio.TimeoutError:
+        chat_cache.abort_load()
+        logger.warning("Warm-up timed out after %.0f s; caches will fill lazily", timeout)
+        return
+    except Exception:
+        chat_cache.abort_load()
+        logger.exception("Warm-up failed; caches will fill lazily")
+        return
+    except asyncio.CancelledError:
+        chat_cache.abort_load()
+        raise
+
+    chat_cache.install(settings, admins, posts)
+    logger.info("Warm-up complete in %.1f s", time.monotonic() - started)
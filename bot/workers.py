@@ -0,0 +1,407 @@
+"""
+Multi-process mode (WORKERS > 1).
+
+A front process polls Telegram and routes every update by chat (bot.sharding) to one
+of WORKERS worker processes over multiprocessing queues. Each worker runs the regular
+Application without an updater and owns its chats: their caches, their per-chat jobs
+and their ordering (a worker processes its inbox sequentially, so a chat's updates are
+handled in the order Telegram delivered them).
+
+After downtime the front fetches Telegram's backlog page by page (as bot.catchup does)
+and marks those pages as backlog: each worker applies its share of a page in bulk with
+process_backlog_page and acknowledges it as a whole.
+
+Workers acknowledge every update they processed. When a worker dies, the front starts
+a replacement for the same shard with a fresh inbox and hands it everything the dead
+worker had not acknowledged, followed by the updates that arrived meanwhile. Chats are
+not moved to other workers during the restart: that would break cache ownership and
+ordering, and a restart takes seconds. While any shard has MAX_OUTSTANDING updates
+unacknowledged the front stops polling, leaving the backlog with Telegram.
+
+As with single-process polling, updates are confirmed to Telegram once fetched, so
+updates still outstanding when the front itself is killed are lost.
+
+Worker-local files (journal, deduplicator state, cache snapshot, trace export) get the
+shard number appended to their path. Before lowering WORKERS, let the journals of the
+workers going away drain (they replay as soon as the database is reachable).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable, Iterable
+
+from telegram import Bot, Update
+from telegram.error import RetryAfter, TelegramError
+
+from bot.catchup import PAGE_SIZE, process_backlog_page
+from bot.config import Config, get_config, set_config
+from bot.http_client import build_requests
+from bot.journal import get_journal
+from bot.logging_config import configure_logging, stop_logging
+from bot.sharding import set_shard, shard_of
+from bot.tracing import configure_tracing
+
+logger = logging.getLogger(__name__)
+
+POLL_TIMEOUT = 10
+# Unacknowledged updates per shard above which polling pauses.
+MAX_OUTSTANDING = 5000
+SUPERVISE_INTERVAL = 1.0
+# Seconds before restarting a worker that keeps dying, doubling up to the maximum.
+RESTART_BACKOFF = 1.0
+MAX_RESTART_BACKOFF = 60.0
+SHUTDOWN_TIMEOUT = 30.0
+
+# Inbox messages are (backlog, update JSON strings) with backlog True for startup
+# backlog pages (None asks the worker to stop); outbox messages are
+# ("ready", shard, pid) and ("ack", shard, last update_id).
+WorkerTarget = Callable[[int, int, Any, Any], None]
+
+
+@dataclass
+class _Shard:
+    index: int
+    inbox: Any = None
+    process: BaseProcess | None = None
+    # Routed but not acknowledged yet, in update order: update_id -> JSON.
+    outstanding: OrderedDict[int, str] = field(default_factory=OrderedDict)
+    failures: int = 0
+    restart_at: float = 0.0
+
+
+class Router:
+    """Routes updates to worker processes by chat and restarts workers that die."""
+
+    def __init__(self, workers: int, target: WorkerTarget) -> None:
+        self._ctx = multiprocessing.get_context("spawn")
+        self._target = target
+        self.outbox = self._ctx.Queue()
+        self.shards = [_Shard(index) for index in range(workers)]
+        self.ready: set[int] = set()
+
+    def start(self) -> None:
+        for shard in self.shards:
+            self._spawn(shard)
+
+    def _spawn(self, shard: _Shard) -> None:
+        if shard.inbox is not None:
+            # The dead worker may have died holding the queue's read lock.
+            shard.inbox.cancel_join_thread()
+            shard.inbox.close()
+        shard.inbox = self._ctx.Queue()
+        shard.process = self._ctx.Process(
+            target=self._target,
+            args=(shard.index, len(self.shards), shard.inbox, self.outbox),
+            name=f"worker-{shard.index}",
+        )
+        shard.process.start()
+        if shard.outstanding:
+            # Redelivered one by one: part of a backlog page may already be applied.
+            shard.inbox.put((False, list(shard.outstanding.values())))
+
+    def route(self, updates: Iterable[tuple[int, int | None, str]], backlog: bool = False) -> None:
+        """
+        Send (update_id, chat_id, update JSON) to the workers owning the chats; with
+        `backlog` each worker applies its share as a catch-up batch.
+        """
+        batches: dict[int, list[str]] = {}
+        for update_id, chat_id, payload in updates:
+            index = shard_of(chat_id, len(self.shards)) if chat_id is not None else 0
+            self.shards[index].outstanding[update_id] = payload
+            batches.setdefault(index, []).append(payload)
+        for index, payloads in batches.items():
+            self.shards[index].inbox.put((backlog, payloads))
+
+    def handle(self, message: tuple[str, int, int]) -> None:
+        kind, index, value = message
+        shard = self.shards[index]
+        if kind == "ready":
+            shard.failures = 0
+            self.ready.add(index)
+            logger.info("Worker %s ready (pid %s)", index, value)
+        elif kind == "ack":
+            outstanding = shard.outstanding
+            while outstanding and next(iter(outstanding)) <= value:
+                outstanding.popitem(last=False)
+
+    def supervise(self) -> None:
+        """Restart dead workers (with backoff if they keep dying)."""
+        now = time.monotonic()
+        for shard in self.shards:
+            if shard.process is None or shard.process.is_alive():
+                continue
+            if shard.restart_at == 0.0:
+                delay = min(RESTART_BACKOFF * 2**shard.failures, MAX_RESTART_BACKOFF)
+                shard.failures += 1
+                shard.restart_at = now + delay
+                self.ready.discard(shard.index)
+                logger.error(
+                    "Worker %s exited with code %s; restarting in %.0f s "
+                    "(%s updates outstanding)",
+                    shard.index,
+                    shard.process.exitcode,
+                    delay,
+                    len(shard.outstanding),
+                )
+            elif now >= shard.restart_at:
+                shard.restart_at = 0.0
+                self._spawn(shard)
+
+    @property
+    def backlog(self) -> int:
+        """Largest number of unacknowledged updates of any shard."""
+        return max(len(shard.outstanding) for shard in self.shards)
+
+    def receive(self, timeout: float) -> list[tuple[str, int, int]]:
+        """Pending worker messages, waiting up to `timeout` for the first one."""
+        messages = []
+        try:
+            messages.append(self.outbox.get(timeout=timeout))
+            while True:
+                messages.append(self.outbox.get_nowait())
+        except queue.Empty:
+            pass
+        return messages
+
+    def stop(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        for shard in self.shards:
+            if shard.process is not None and shard.process.is_alive():
+                shard.inbox.put(None)
+        deadline = time.monotonic() + timeout
+        for shard in self.shards:
+            if shard.process is None:
+                continue
+            shard.process.join(max(deadline - time.monotonic(), 0))
+            if shard.process.is_alive():
+                logger.warning("Worker %s did not stop in time; terminating it", shard.index)
+                shard.process.terminate()
+                shard.process.join()
+            shard.process = None
+        # Acks sent while stopping.
+        for message in self.receive(timeout=0):
+            self.handle(message)
+        lost = sum(len(shard.outstanding) for shard in self.shards)
+        if lost:
+            logger.warning("%s routed updates were not processed before shutdown", lost)
+
+
+def _worker_config(config: Config, shard: int) -> Config:
+    def own(path: str, suffix: str = "") -> str:
+        return f"{path}.{shard}{suffix}" if path else path
+
+    return replace(
+        config,
+        journal_path=own(config.journal_path),
+        dedup_state_path=own(config.dedup_state_path),
+        # A snapshot only fits the chat -> worker mapping it was written under.
+        snapshot_path=own(config.snapshot_path, f"-of-{config.workers}"),
+        trace_export_path=own(config.trace_export_path),
+    )
+
+
+async def serve_worker(application: Any, shard: int, inbox: Any, outbox: Any) -> None:
+    """Process the updates arriving on `inbox` until told to stop."""
+    loop = asyncio.get_running_loop()
+    outbox.put(("ready", shard, os.getpid()))
+    while True:
+        # Blocking read in a thread so jobs keep running on the loop meanwhile.
+        message = await loop.run_in_executor(None, inbox.get)
+        if message is None:
+            return
+        backlog, payloads = message
+        updates = [Update.de_json(json.loads(payload), application.bot) for payload in payloads]
+        if backlog:
+            try:
+                await process_backlog_page(application, updates)
+                outbox.put(("ack", shard, updates[-1].update_id))
+                continue
+            except Exception:
+                # Go through the page one by one instead. Only updates whose batch
+                # committed are marked as seen (bot.catchup), so the deduplicator skips
+                # exactly those.
+                logger.exception("Worker %s failed to apply a backlog page", shard)
+        for update in updates:
+            try:
+                await application.process_update(update)
+            except Exception:
+                # Never let one update crash the worker (it would be redelivered).
+                logger.exception("Worker %s failed to process an update", shard)
+            outbox.put(("ack", shard, update.update_id))
+
+
+async def _run_worker(shard: int, inbox: Any, outbox: Any) -> None:
+    from bot.main import build_application
+
+    config = get_config()
+    application = build_application(config, polling=False)
+    await application.initialize()
+    try:
+        if application.post_init is not None:
+            await application.post_init(application)
+        # Events journaled during an outage are older than anything routed to us.
+        journal = get_journal()
+        if journal.pending:
+            await journal.replay(config.journal_replay_batch)
+        await application.start()
+        try:
+            await serve_worker(application, shard, inbox, outbox)
+        finally:
+            await application.stop()
+    finally:
+        await application.shutdown()
+        if application.post_shutdown is not None:
+            await application.post_shutdown(application)
+
+
+def worker_main(shard: int, workers: int, inbox: Any, outbox: Any) -> None:
+    """Entry point of a worker process."""
+    # Ctrl+C reaches the whole process group; the front tells workers when to stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    set_shard(shard, workers)
+    config = _worker_config(get_config(), shard)
+    set_config(config)
+    configure_logging(config.log_format, config.log_level, config.log_sample_rates)
+    configure_tracing(config.trace_sample_rate, config.trace_export_path)
+    if config.use_uvloop:
+        from bot.main import install_uvloop
+
+        install_uvloop()
+    try:
+        asyncio.run(_run_worker(shard, inbox, outbox))
+    finally:
+        stop_logging()
+
+
+async def _poll(router: Router, config: Config, allowed_updates: list[str]) -> None:
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopping.set)
+
+    async def supervise() -> None:
+        while not stopping.is_set():
+            messages = await loop.run_in_executor(None, router.receive, SUPERVISE_INTERVAL)
+            for message in messages:
+                router.handle(message)
+            router.supervise()
+
+    request, get_updates_request = build_requests(config)
+    bot = Bot(config.bot_token, request=request, get_updates_request=get_updates_request)
+    supervisor = asyncio.create_task(supervise())
+    stop_wait = asyncio.create_task(stopping.wait())
+    offset: int | None = None
+    async with bot:
+        if config.catchup_threshold > 0:
+            offset = await _route_backlog(
+                bot, router, stopping, config.catchup_threshold, allowed_updates
+            )
+        while not stopping.is_set():
+            if router.backlog >= MAX_OUTSTANDING:
+                await asyncio.sleep(0.1)
+                continue
+            poll = asyncio.create_task(
+                bot.get_updates(
+                    offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates
+                )
+            )
+            await asyncio.wait({poll, stop_wait}, return_when=asyncio.FIRST_COMPLETED)
+            if not poll.done():
+                # Nothing fetched by a cancelled call is confirmed, so nothing is lost.
+                poll.cancel()
+                break
+            try:
+                updates = poll.result()
+            except RetryAfter as e:
+                await asyncio.sleep(float(e.retry_after))
+                continue
+            except TelegramError as e:
+                logger.warning("getUpdates failed: %s", e)
+                await asyncio.sleep(1.0)
+                continue
+            if not updates:
+                continue
+            _route(router, updates)
+            offset = updates[-1].update_id + 1
+
+        if offset is not None:
+            # Confirm the last batch so it is not fetched again after a restart.
+            try:
+                await bot.get_updates(offset=offset, limit=1, timeout=0)
+            except TelegramError as e:
+                logger.warning("Could not confirm the last updates: %s", e)
+    await supervisor
+
+
+def _route(router: Router, updates: Iterable[Update], backlog: bool = False) -> None:
+    router.route(
+        (
+            (
+                update.update_id,
+                update.effective_chat.id if update.effective_chat else None,
+                update.to_json(),
+            )
+            for update in updates
+        ),
+        backlog,
+    )
+
+
+async def _route_backlog(
+    bot: Bot,
+    router: Router,
+    stopping: asyncio.Event,
+    threshold: int,
+    allowed_updates: list[str],
+) -> int | None:
+    """
+    Route a startup backlog to the workers as catch-up pages (see bot.catchup) until
+    fewer than `threshold` updates remain. Returns the offset to poll from.
+    """
+    threshold = min(threshold, PAGE_SIZE)
+    started = time.monotonic()
+    offset: int | None = None
+    total = 0
+    while not stopping.is_set():
+        while router.backlog >= MAX_OUTSTANDING and not stopping.is_set():
+            await asyncio.sleep(0.1)
+        try:
+            updates = await bot.get_updates(
+                offset=offset, limit=PAGE_SIZE, timeout=0, allowed_updates=allowed_updates
+            )
+        except TelegramError as e:
+            logger.warning("getUpdates failed during catch-up: %s", e)
+            break
+        if len(updates) < threshold:
+            # Left to regular polling (fetched again, as they are not confirmed yet).
+            break
+        if total == 0:
+            logger.info("Update backlog detected, routing it to the workers in batches")
+        _route(router, updates, backlog=True)
+        total += len(updates)
+        offset = updates[-1].update_id + 1
+    if total:
+        logger.info(
+            "Routed a backlog of %s updates in %.1f s", total, time.monotonic() - started
+        )
+    return offset
+
+
+def run_front(config: Config, allowed_updates: list[str]) -> None:
+    """Start the workers and poll Telegram for them until SIGINT/SIGTERM."""
+    router = Router(config.workers, worker_main)
+    router.start()
+    try:
+        asyncio.run(_poll(router, config, allowed_updates))
+    finally:
+        router.stop()
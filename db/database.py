@@ -1,28 +1,104 @@
+import asyncio
+import logging
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable
 
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event, exc, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session
 
 from bot.config import get_config
+from bot.tracing import begin_span, end_span
 from db.models import Base
 
+logger = logging.getLogger(__name__)
+
 _engine = None
 _async_session_maker = None
+_read_engine = None
+_read_session_maker = None
+
+# Monotonic deadline until which the database is considered down (circuit breaker).
+_db_down_until = 0.0
+
+# Read replica health as of the last lag check (valid until the deadline); None before
+# the first check.
+_replica_ok: bool | None = None
+_replica_checked_until = 0.0
+_replica_check_lock = asyncio.Lock()
+
+# Seconds the replica is behind the primary; 0 when it has replayed everything it
+# received (an idle primary writes nothing, so the last replay can be old). That only
+# holds while it is streaming from the primary: otherwise NULL, however long ago it
+# stopped. A healthy idle connection hears from the primary at least every half
+# wal_receiver_timeout. Reading pg_stat_wal_receiver needs pg_read_all_stats.
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming' "
+    "AND now() - last_msg_receipt_time < greatest("
+    "current_setting('wal_receiver_timeout')::interval, interval '1 minute')) THEN NULL "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def _create_engine(db_url: str) -> AsyncEngine:
+    config = get_config()
+    # Convert to async driver URL
+    if db_url.startswith("postgresql://"):
+        db_url = db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    engine = create_async_engine(
+        db_url,
+        echo=False,
+        pool_timeout=config.db_pool_timeout,
+        connect_args={"timeout": config.db_connect_timeout},
+    )
+    _instrument_engine(engine)
+    return engine
 
 
 def get_async_engine():
     global _engine
     if _engine is None:
-        config = get_config()
-        # Convert to async driver URL
-        db_url = config.database_url
-        if db_url.startswith("postgresql://"):
-            db_url = db_url.replace("postgresql://", "postgresql+asyncpg://", 1)
-        _engine = create_async_engine(db_url, echo=False)
+        _engine = _create_engine(get_config().database_url)
     return _engine
 
 
+def get_read_engine() -> AsyncEngine | None:
+    """Engine of the read replica (DATABASE_READ_URL), or None without one."""
+    global _read_engine
+    if _read_engine is None and get_config().database_read_url:
+        _read_engine = _create_engine(get_config().database_read_url)
+    return _read_engine
+
+
+def _instrument_engine(engine: AsyncEngine) -> None:
+    """Record a tracing span for every SQL statement executed on this engine."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        span = begin_span("sql", statement=statement[:200], executemany=executemany)
+        if span is not None and context is not None:
+            context._trace_span = span
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        end_span(getattr(context, "_trace_span", None))
+
+    @event.listens_for(engine.sync_engine, "handle_error")
+    def _handle_error(exception_context):
+        context = exception_context.execution_context
+        end_span(
+            getattr(context, "_trace_span", None), exception_context.original_exception
+        )
+
+
 def get_session_maker() -> async_sessionmaker[AsyncSession]:
     global _async_session_maker
     if _async_session_maker is None:
@@ -45,6 +121,113 @@ async def get_session() -> AsyncGenerator[AsyncSession, None]:
             raise
 
 
+def after_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """
+    Run `callback` once the session's transaction has committed; it is dropped if the
+    transaction rolls back. For in-process state that must only reflect committed data
+    (caches), so no reader can pick up rows that may still roll back.
+    """
+    session.sync_session.info.setdefault("after_commit", []).append(callback)
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session: Session) -> None:
+    for callback in session.info.pop("after_commit", ()):
+        callback()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_after_commit(session: Session, previous_transaction) -> None:
+    session.info.pop("after_commit", None)
+
+
+async def _check_replica() -> bool:
+    """Whether the replica is reachable and within READ_REPLICA_MAX_LAG; cached briefly."""
+    global _replica_ok, _replica_checked_until
+    async with _replica_check_lock:
+        if time.monotonic() < _replica_checked_until:
+            return _replica_ok
+        config = get_config()
+        try:
+            async with get_read_engine().connect() as conn:
+                lag = (await conn.execute(REPLICA_LAG_SQL)).scalar()
+        except Exception as e:
+            if _replica_ok is not False:
+                logger.warning("Read replica unavailable, reading from the primary: %s", e)
+            _replica_ok = False
+            _replica_checked_until = time.monotonic() + config.db_unavailable_cooldown
+            return False
+
+        ok = lag is not None and lag <= config.read_replica_max_lag
+        if ok != _replica_ok:
+            if ok:
+                logger.info("Read replica in use (lag %.1f s)", lag)
+            elif lag is None:
+                logger.warning(
+                    "Read replica is not streaming from the primary, reading from the primary"
+                )
+            else:
+                logger.warning("Read replica lags by %s s, reading from the primary", lag)
+        _replica_ok = ok
+        _replica_checked_until = time.monotonic() + config.read_replica_check_interval
+        return ok
+
+
+@asynccontextmanager
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for read-only work that tolerates data up to READ_REPLICA_MAX_LAG seconds
+    old (stats, leaderboards, exports). Uses the read replica when one is configured,
+    reachable and recent enough, the primary otherwise. Nothing is committed: the
+    session is closed (rolled back) on exit.
+    """
+    global _read_session_maker, _replica_checked_until
+    if get_read_engine() is None or not await _check_replica():
+        session_maker = get_session_maker()
+    else:
+        if _read_session_maker is None:
+            _read_session_maker = async_sessionmaker(
+                get_read_engine(), class_=AsyncSession, expire_on_commit=False
+            )
+        session_maker = _read_session_maker
+    async with session_maker() as session:
+        try:
+            yield session
+        except Exception as e:
+            if session_maker is _read_session_maker and is_db_unavailable_error(e):
+                # Recheck the replica before the next read instead of after the interval.
+                _replica_checked_until = 0.0
+            raise
+
+
+def is_db_unavailable_error(error: BaseException) -> bool:
+    """Whether an exception means the database could not be reached (vs. a query error)."""
+    if isinstance(error, exc.DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(
+        error,
+        (
+            exc.OperationalError,
+            exc.InterfaceError,
+            exc.TimeoutError,  # connection pool exhausted
+            OSError,
+            asyncio.TimeoutError,
+        ),
+    )
+
+
+def mark_db_unavailable(cooldown: float | None = None) -> None:
+    """Skip database work for a while so handlers fail fast instead of timing out."""
+    global _db_down_until
+    if cooldown is None:
+        cooldown = get_config().db_unavailable_cooldown
+    _db_down_until = time.monotonic() + cooldown
+
+
+def db_available() -> bool:
+    return time.monotonic() >= _db_down_until
+
+
 async def init_db():
     """
     Startup hook.
@@ -58,7 +241,11 @@ async def init_db():
 
 
 async def close_db():
-    global _engine
+    global _engine, _read_engine, _read_session_maker
     if _engine is not None:
         await _engine.dispose()
         _engine = None
+    if _read_engine is not None:
+        await _read_engine.dispose()
+        _read_engine = None
+        _read_session_maker = None
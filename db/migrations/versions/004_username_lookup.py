@@ -0,0 +1,53 @@
+"""Case-insensitive username lookup index on users
+
+Revision ID: 004_username_lookup
+Revises: 003_remove_user_points_weight
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "004_username_lookup"
+down_revision: Union[str, None] = "003_remove_user_points_weight"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # A username belongs to its most recent holder; the bot clears it from other rows
+    # when it sees it move. Rows written before that have no history, so keep the
+    # username on the newest row only.
+    op.execute(
+        """
+        UPDATE users SET username = NULL
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY lower(username) ORDER BY id DESC
+                ) AS rn
+                FROM users
+                WHERE username IS NOT NULL
+            ) ranked
+            WHERE ranked.rn > 1
+        )
+        """
+    )
+    # users is global across chats and can be large; don't block writes while building.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_users_username_lower",
+            "users",
+            [sa.text("lower(username)")],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_users_username_lower", table_name="users", postgresql_concurrently=True
+        )
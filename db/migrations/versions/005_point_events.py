@@ -0,0 +1,58 @@
+"""Append-only point ledger (point_events) seeded with opening balances
+
+Revision ID: 005_point_events
+Revises: 004_username_lookup
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "005_point_events"
+down_revision: Union[str, None] = "004_username_lookup"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "point_events",
+        sa.Column("id", sa.BigInteger(), nullable=False),
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("delta", sa.Float(), nullable=False),
+        sa.Column("reaction_id", sa.Integer(), nullable=True),
+        sa.Column("counterparty_user_id", sa.Integer(), nullable=True),
+        sa.Column("weight", sa.Float(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["reaction_id"], ["reactions.id"], ondelete="SET NULL"),
+        sa.ForeignKeyConstraint(["counterparty_user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_point_events_chat_user", "point_events", ["chat_id", "user_id"])
+
+    # History before the ledger is not itemized: start every member at their current
+    # balance so the ledger projects to the stored points.
+    op.execute(
+        """
+        INSERT INTO point_events (chat_id, user_id, kind, delta)
+        SELECT chat_id, user_id, 'opening', points
+        FROM chat_users
+        WHERE points <> 0
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_point_events_chat_user", table_name="point_events")
+    op.drop_table("point_events")
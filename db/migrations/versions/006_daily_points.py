@@ -0,0 +1,82 @@
+"""Daily per-member rollups (daily_points), backfilled from reactions
+
+Revision ID: 006_daily_points
+Revises: 005_point_events
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "006_daily_points"
+down_revision: Union[str, None] = "005_point_events"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Reactions aggregated per statement during the backfill.
+BACKFILL_BATCH = 50_000
+
+# Weights used for past reactions are not recorded, so the backfill uses the
+# members' current weights (as /reweight does).
+BACKFILL_SQL = sa.text(
+    """
+    INSERT INTO daily_points
+        (chat_id, day, user_id, points_gained, points_lost, reposts_made, reposts_received)
+    SELECT chat_id, day, user_id, sum(gained), sum(lost), sum(made), sum(received)
+    FROM (
+        SELECT p.chat_id, r.created_at::date AS day, r.reactor_user_id AS user_id,
+               coalesce(owner.weight, 1.0) AS gained, 0.0 AS lost, 1 AS made, 0 AS received
+        FROM reactions r
+        JOIN posts p ON p.id = r.post_id
+        LEFT JOIN chat_users owner
+               ON owner.chat_id = p.chat_id AND owner.user_id = p.user_id
+        WHERE r.id >= :lo AND r.id < :hi AND r.reactor_user_id <> p.user_id
+        UNION ALL
+        SELECT p.chat_id, r.created_at::date, p.user_id,
+               0.0, coalesce(reactor.weight, 1.0), 0, 1
+        FROM reactions r
+        JOIN posts p ON p.id = r.post_id
+        LEFT JOIN chat_users reactor
+               ON reactor.chat_id = p.chat_id AND reactor.user_id = r.reactor_user_id
+        WHERE r.id >= :lo AND r.id < :hi AND r.reactor_user_id <> p.user_id
+    ) AS credited
+    GROUP BY chat_id, day, user_id
+    ON CONFLICT (chat_id, day, user_id) DO UPDATE SET
+        points_gained = daily_points.points_gained + EXCLUDED.points_gained,
+        points_lost = daily_points.points_lost + EXCLUDED.points_lost,
+        reposts_made = daily_points.reposts_made + EXCLUDED.reposts_made,
+        reposts_received = daily_points.reposts_received + EXCLUDED.reposts_received
+    """
+)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "daily_points",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("points_gained", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("points_lost", sa.Float(), nullable=False, server_default=sa.text("0")),
+        sa.Column("reposts_made", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column(
+            "reposts_received", sa.Integer(), nullable=False, server_default=sa.text("0")
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("chat_id", "day", "user_id"),
+    )
+
+    bind = op.get_bind()
+    lo, hi = bind.execute(sa.text("SELECT min(id), max(id) FROM reactions")).one()
+    if lo is None:
+        return
+    while lo <= hi:
+        bind.execute(BACKFILL_SQL, {"lo": lo, "hi": lo + BACKFILL_BATCH})
+        lo += BACKFILL_BATCH
+
+
+def downgrade() -> None:
+    op.drop_table("daily_points")
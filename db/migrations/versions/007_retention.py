@@ -0,0 +1,67 @@
+"""Per-chat retention of posts and reactions
+
+Revision ID: 007_retention
+Revises: 006_daily_points
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "007_retention"
+down_revision: Union[str, None] = "006_daily_points"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("chats", sa.Column("retention_days", sa.Integer(), nullable=True))
+    op.add_column(
+        "chat_users",
+        sa.Column(
+            "archived_reposts_made",
+            sa.Integer(),
+            nullable=False,
+            server_default=sa.text("0"),
+        ),
+    )
+    op.add_column(
+        "chat_users",
+        sa.Column(
+            "archived_reposts_received",
+            sa.Integer(),
+            nullable=False,
+            server_default=sa.text("0"),
+        ),
+    )
+    # Retention walks a chat's posts by age.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_posts_chat_created",
+            "posts",
+            ["chat_id", "created_at"],
+            postgresql_concurrently=True,
+        )
+        # Deleting reactions sets point_events.reaction_id to NULL; without an index
+        # every deleted reaction would scan the whole ledger.
+        op.create_index(
+            "ix_point_events_reaction",
+            "point_events",
+            ["reaction_id"],
+            postgresql_where=sa.text("reaction_id IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_point_events_reaction", table_name="point_events", postgresql_concurrently=True
+        )
+        op.drop_index("ix_posts_chat_created", table_name="posts", postgresql_concurrently=True)
+    op.drop_column("chat_users", "archived_reposts_received")
+    op.drop_column("chat_users", "archived_reposts_made")
+    op.drop_column("chats", "retention_days")
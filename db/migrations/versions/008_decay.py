@@ -0,0 +1,29 @@
+"""Per-chat points decay settings
+
+Revision ID: 008_decay
+Revises: 007_retention
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "008_decay"
+down_revision: Union[str, None] = "007_retention"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("chats", sa.Column("decay_rate", sa.Float(), nullable=True))
+    op.add_column("chats", sa.Column("decay_interval_hours", sa.Integer(), nullable=True))
+    op.add_column("chats", sa.Column("last_decay_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("chats", "last_decay_at")
+    op.drop_column("chats", "decay_interval_hours")
+    op.drop_column("chats", "decay_rate")
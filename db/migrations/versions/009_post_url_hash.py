@@ -0,0 +1,36 @@
+"""Store a hash of each post's canonical link for duplicate detection
+
+Revision ID: 009_post_url_hash
+Revises: 008_decay
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "009_post_url_hash"
+down_revision: Union[str, None] = "008_decay"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing posts keep NULL: only message ids were stored, not their text.
+    op.add_column("posts", sa.Column("url_hash", sa.BigInteger(), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_posts_chat_url",
+            "posts",
+            ["chat_id", "url_hash", "created_at"],
+            postgresql_where=sa.text("url_hash IS NOT NULL"),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_posts_chat_url", table_name="posts", postgresql_concurrently=True)
+    op.drop_column("posts", "url_hash")
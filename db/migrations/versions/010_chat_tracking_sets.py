@@ -0,0 +1,84 @@
+"""Per-chat sets of hashtags and reaction emojis
+
+Revision ID: 010_chat_tracking_sets
+Revises: 009_post_url_hash
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "010_chat_tracking_sets"
+down_revision: Union[str, None] = "009_post_url_hash"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "chat_hashtags",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("tag", sa.String(length=64), nullable=False),
+        sa.ForeignKeyConstraint(["chat_id"], ["chats.telegram_chat_id"]),
+        sa.PrimaryKeyConstraint("chat_id", "tag"),
+    )
+    op.create_table(
+        "chat_reaction_emojis",
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("emoji", sa.String(length=32), nullable=False),
+        sa.Column("multiplier", sa.Float(), nullable=False, server_default=sa.text("1.0")),
+        sa.ForeignKeyConstraint(["chat_id"], ["chats.telegram_chat_id"]),
+        sa.PrimaryKeyConstraint("chat_id", "emoji"),
+    )
+    # Carry over the single-value overrides; chats without one keep the env defaults.
+    op.execute(
+        """
+        INSERT INTO chat_hashtags (chat_id, tag)
+        SELECT telegram_chat_id, lower(ltrim(hashtag, '#'))
+        FROM chats
+        WHERE ltrim(coalesce(hashtag, ''), '#') <> ''
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO chat_reaction_emojis (chat_id, emoji, multiplier)
+        SELECT telegram_chat_id, reaction_emoji, 1.0
+        FROM chats
+        WHERE coalesce(reaction_emoji, '') <> ''
+        """
+    )
+    op.drop_column("chats", "hashtag")
+    op.drop_column("chats", "reaction_emoji")
+
+    # A constant default only touches the catalog, not the existing rows.
+    op.add_column(
+        "reactions",
+        sa.Column("multiplier", sa.Float(), nullable=False, server_default=sa.text("1.0")),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("reactions", "multiplier")
+
+    op.add_column("chats", sa.Column("hashtag", sa.String(length=64), nullable=True))
+    op.add_column("chats", sa.Column("reaction_emoji", sa.String(length=32), nullable=True))
+    # Only one value per chat fits; keep the first of each set.
+    op.execute(
+        """
+        UPDATE chats SET hashtag = '#' || t.tag
+        FROM (SELECT chat_id, min(tag) AS tag FROM chat_hashtags GROUP BY chat_id) t
+        WHERE chats.telegram_chat_id = t.chat_id
+        """
+    )
+    op.execute(
+        """
+        UPDATE chats SET reaction_emoji = e.emoji
+        FROM (SELECT chat_id, min(emoji) AS emoji FROM chat_reaction_emojis GROUP BY chat_id) e
+        WHERE chats.telegram_chat_id = e.chat_id
+        """
+    )
+    op.drop_table("chat_reaction_emojis")
+    op.drop_table("chat_hashtags")
@@ -0,0 +1,36 @@
+"""Weekly digest deliveries and blocked DMs
+
+Revision ID: 011_digest
+Revises: 010_chat_tracking_sets
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "011_digest"
+down_revision: Union[str, None] = "010_chat_tracking_sets"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("dm_blocked_at", sa.DateTime(), nullable=True))
+    op.create_table(
+        "digest_deliveries",
+        sa.Column("week", sa.Date(), nullable=False),
+        sa.Column("chat_id", sa.BigInteger(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=8), nullable=False, server_default="claimed"),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("week", "chat_id", "user_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("digest_deliveries")
+    op.drop_column("users", "dm_blocked_at")
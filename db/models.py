@@ -1,12 +1,16 @@
-from datetime import datetime
+from datetime import date, datetime
 
 from sqlalchemy import (
     BigInteger,
+    Date,
     DateTime,
     Float,
     ForeignKey,
+    Index,
+    Integer,
     String,
     UniqueConstraint,
+    func,
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -24,9 +28,13 @@ class Chat(Base):
     title: Mapped[str | None] = mapped_column(String(255), nullable=True)
 
     # Per-chat settings (optional overrides; fall back to env defaults when NULL)
-    hashtag: Mapped[str | None] = mapped_column(String(64), nullable=True)
-    reaction_emoji: Mapped[str | None] = mapped_column(String(32), nullable=True)
     topic_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    # Posts and reactions older than this are archived and deleted; NULL keeps them.
+    retention_days: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Points shrink by decay_rate (a fraction) every decay_interval_hours; NULL disables.
+    decay_rate: Mapped[float | None] = mapped_column(Float, nullable=True)
+    decay_interval_hours: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    last_decay_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, nullable=False
@@ -38,6 +46,47 @@ class Chat(Base):
     users: Mapped[list["ChatUser"]] = relationship(
         "ChatUser", back_populates="chat", cascade="all, delete-orphan"
     )
+    # Tracked hashtags and reaction emojis; an empty set uses the env default. Loaded
+    # with the chat since the effective settings are derived from them.
+    hashtags: Mapped[list["ChatHashtag"]] = relationship(
+        "ChatHashtag",
+        back_populates="chat",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+        order_by="ChatHashtag.tag",
+    )
+    reaction_emojis: Mapped[list["ChatReactionEmoji"]] = relationship(
+        "ChatReactionEmoji",
+        back_populates="chat",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+        order_by="ChatReactionEmoji.emoji",
+    )
+
+
+class ChatHashtag(Base):
+    __tablename__ = "chat_hashtags"
+
+    chat_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey("chats.telegram_chat_id"), primary_key=True
+    )
+    # Lowercase, without the leading '#'.
+    tag: Mapped[str] = mapped_column(String(64), primary_key=True)
+
+    chat: Mapped["Chat"] = relationship("Chat", back_populates="hashtags")
+
+
+class ChatReactionEmoji(Base):
+    __tablename__ = "chat_reaction_emojis"
+
+    chat_id: Mapped[int] = mapped_column(
+        BigInteger, ForeignKey("chats.telegram_chat_id"), primary_key=True
+    )
+    emoji: Mapped[str] = mapped_column(String(32), primary_key=True)
+    # Scales the points moved by a reaction with this emoji.
+    multiplier: Mapped[float] = mapped_column(Float, default=1.0, nullable=False)
+
+    chat: Mapped["Chat"] = relationship("Chat", back_populates="reaction_emojis")
 
 
 class ChatAdmin(Base):
@@ -71,6 +120,9 @@ class ChatUser(Base):
     # Points and weight are chat-scoped.
     points: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
     weight: Mapped[float] = mapped_column(Float, default=1.0, nullable=False)
+    # Reposts whose reactions were removed by retention.
+    archived_reposts_made: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    archived_reposts_received: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
 
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, nullable=False
@@ -86,6 +138,9 @@ class User(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
     username: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # Set when a DM failed because the user blocked the bot (or never started it);
+    # cleared by /start. Such users get no weekly digest.
+    dm_blocked_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, nullable=False
     )
@@ -96,6 +151,10 @@ class User(Base):
     )
 
 
+# Case-insensitive username lookup (/setweight @name).
+Index("ix_users_username_lower", func.lower(User.username))
+
+
 class Post(Base):
     __tablename__ = "posts"
 
@@ -104,12 +163,22 @@ class Post(Base):
     chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     topic_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    # Hash of the canonical form of the first link in the post (see bot.links).
+    url_hash: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, nullable=False
     )
 
     __table_args__ = (
         UniqueConstraint("message_id", "chat_id", name="uq_post_message_chat"),
+        Index("ix_posts_chat_created", "chat_id", "created_at"),
+        Index(
+            "ix_posts_chat_url",
+            "chat_id",
+            "url_hash",
+            "created_at",
+            postgresql_where=url_hash.is_not(None),
+        ),
     )
 
     user: Mapped["User"] = relationship("User", back_populates="posts")
@@ -126,6 +195,8 @@ class Reaction(Base):
     reactor_user_id: Mapped[int] = mapped_column(
         ForeignKey("users.id"), nullable=False
     )
+    # Multiplier of the emoji that confirmed the repost (see ChatReactionEmoji).
+    multiplier: Mapped[float] = mapped_column(Float, default=1.0, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, default=datetime.utcnow, nullable=False
     )
@@ -138,3 +209,75 @@ class Reaction(Base):
     reactor: Mapped["User"] = relationship(
         "User", back_populates="reactions", foreign_keys=[reactor_user_id]
     )
+
+
+class PointEvent(Base):
+    """
+    Append-only ledger of point changes; chat_users.points is its projection.
+    """
+
+    __tablename__ = "point_events"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    # reaction | opening | reweight | decay
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    delta: Mapped[float] = mapped_column(Float, nullable=False)
+    # For reaction events: the reaction, the other side of it and the weight applied.
+    reaction_id: Mapped[int | None] = mapped_column(
+        ForeignKey("reactions.id", ondelete="SET NULL"), nullable=True
+    )
+    counterparty_user_id: Mapped[int | None] = mapped_column(
+        ForeignKey("users.id"), nullable=True
+    )
+    weight: Mapped[float | None] = mapped_column(Float, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False
+    )
+
+    __table_args__ = (
+        Index("ix_point_events_chat_user", "chat_id", "user_id"),
+        # Deleting a reaction nulls its events' reaction_id (retention).
+        Index(
+            "ix_point_events_reaction",
+            "reaction_id",
+            postgresql_where=reaction_id.is_not(None),
+        ),
+    )
+
+
+class DailyPoints(Base):
+    """
+    Per-day rollup of reactions per chat member, maintained with every credited
+    reaction. Backs the weekly/monthly leaderboards.
+    """
+
+    __tablename__ = "daily_points"
+
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    points_gained: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    points_lost: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    reposts_made: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    reposts_received: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class DigestDelivery(Base):
+    """
+    Weekly digest DMs, claimed per member before sending so a run resumed after a
+    restart skips everyone already handled that week.
+    """
+
+    __tablename__ = "digest_deliveries"
+
+    # Day the digest run started (its week is the 7 days before).
+    week: Mapped[date] = mapped_column(Date, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+    # claimed -> sent | blocked; claims whose send failed otherwise are deleted.
+    status: Mapped[str] = mapped_column(String(8), default="claimed", nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=datetime.utcnow, nullable=False
+    )